@@ -2,6 +2,7 @@ import json
 from django.contrib import admin
 from django.utils.html import format_html
 from .models import ScrapedReel, Location, LocationRevision, ReelFrame
+from .comment_utils import build_normalized_comments
 
 @admin.register(Location)
 class LocationAdmin(admin.ModelAdmin):
@@ -89,6 +90,11 @@ class ScrapedReelAdmin(admin.ModelAdmin):
         }),
     )
 
+    def save_model(self, request, obj, form, change):
+        if 'comments_dump' in form.changed_data:
+            obj.normalized_comments = build_normalized_comments(obj.comments_dump)
+        super().save_model(request, obj, form, change)
+
     def pretty_ai_summary(self, obj):
         if obj.ai_summary:
             return format_html('<div style="background-color: #f4f6f8; padding: 15px; border-left: 4px solid #4CAF50;">{}</div>', obj.ai_summary)
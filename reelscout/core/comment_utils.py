@@ -0,0 +1,50 @@
+import re
+
+_SCORE_PREFIX_RE = re.compile(r'^\[SCORE:\s*\d+\]\s*\([^)]+\)\s*', flags=re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r"\s+")
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9\s]")
+
+
+def normalize_geo_label(value):
+    text = str(value or "").strip().lower()
+    if not text:
+        return ""
+    text = _NON_ALNUM_RE.sub(" ", text)
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    return text
+
+
+def clean_comment_text(raw_comment):
+    if isinstance(raw_comment, dict):
+        text = str(raw_comment.get("text", "")).strip()
+    else:
+        text = str(raw_comment or "").strip()
+    if text.lower() == "[object object]":
+        return ""
+
+    # Remove ranking metadata like: [SCORE: 12] (2d)
+    text = _SCORE_PREFIX_RE.sub("", text)
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    return text
+
+
+def build_normalized_comments(comments_dump):
+    """
+    Precompute cleaned text, geo-normalized text and token set for each comment.
+    Stored on ScrapedReel.normalized_comments so readers skip the regex work.
+    """
+    if not isinstance(comments_dump, list):
+        return []
+
+    entries = []
+    for raw_comment in comments_dump:
+        text = clean_comment_text(raw_comment)
+        if not text:
+            continue
+        normalized = normalize_geo_label(text)
+        entries.append({
+            "text": text,
+            "normalized": normalized,
+            "tokens": sorted(set(normalized.split())),
+        })
+    return entries
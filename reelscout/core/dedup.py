@@ -0,0 +1,318 @@
+# dedup.py
+"""
+Offline duplicate detection for the Location table.
+
+Candidates are blocked by spatial grid cell and by rare character n-grams of
+normalized names, so only plausible pairs are scored. Pairs are scored with
+name similarity, distance and category; clear matches merge directly, and only
+the ambiguous band is sent to the LLM.
+"""
+import math
+from collections import defaultdict
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Location, LocationRevision, ScrapedReel
+from .services import (
+    _clean_text_value,
+    _merge_aliases,
+    _merge_dynamic_data,
+    _normalize_location_name,
+    haversine_distance,
+)
+
+METERS_PER_DEGREE_LAT = 111_320
+
+NAME_WEIGHT = 0.6
+DISTANCE_WEIGHT = 0.3
+CATEGORY_WEIGHT = 0.1
+
+
+@dataclass
+class CandidatePair:
+    left: Location
+    right: Location
+    score: float
+    name_score: float
+    distance: float = None
+    decision: str = "reject"  # "merge", "review", "reject"
+    llm_verdict: bool = None
+
+
+@dataclass
+class MergePlan:
+    canonical: Location
+    duplicates: list = field(default_factory=list)
+
+
+def _name_variants(location):
+    variants = [location.name]
+    if isinstance(location.alternate_names, list):
+        variants.extend(location.alternate_names)
+    normalized = []
+    seen = set()
+    for variant in variants:
+        norm = _normalize_location_name(variant)
+        if norm and norm not in seen:
+            seen.add(norm)
+            normalized.append(norm)
+    return normalized
+
+
+def _char_ngrams(text, n=3):
+    compact = f" {text} "
+    return {compact[i:i + n] for i in range(max(len(compact) - n + 1, 0))}
+
+
+def _coords(location):
+    if location.latitude is None or location.longitude is None:
+        return None
+    return float(location.latitude), float(location.longitude)
+
+
+def _grid_cell(lat, lon, cell_m):
+    lat_step = cell_m / METERS_PER_DEGREE_LAT
+    lon_step = cell_m / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+    return int(math.floor(lat / lat_step)), int(math.floor(lon / lon_step))
+
+
+def build_candidate_pairs(locations, variants, grid_size_m=500, max_ngram_block=50):
+    """Return the set of (id, id) pairs that share a grid neighbourhood or a rare name n-gram."""
+    pairs = set()
+
+    # 1) Spatial blocking: same or adjacent grid cell.
+    cells = defaultdict(list)
+    for location in locations:
+        coords = _coords(location)
+        if coords:
+            cells[_grid_cell(coords[0], coords[1], grid_size_m)].append(location.id)
+
+    for (row, col), ids in cells.items():
+        neighbours = []
+        for d_row in (-1, 0, 1):
+            for d_col in (-1, 0, 1):
+                neighbours.extend(cells.get((row + d_row, col + d_col), []))
+        for left_id in ids:
+            for right_id in neighbours:
+                if left_id < right_id:
+                    pairs.add((left_id, right_id))
+
+    # 2) Name blocking: share a trigram that is rare enough to be informative.
+    blocks = defaultdict(set)
+    for location in locations:
+        for variant in variants[location.id]:
+            for gram in _char_ngrams(variant):
+                blocks[gram].add(location.id)
+
+    shared_grams = defaultdict(int)
+    for ids in blocks.values():
+        if len(ids) < 2 or len(ids) > max_ngram_block:
+            continue
+        ordered = sorted(ids)
+        for i, left_id in enumerate(ordered):
+            for right_id in ordered[i + 1:]:
+                shared_grams[(left_id, right_id)] += 1
+
+    for pair, count in shared_grams.items():
+        if count >= 2:
+            pairs.add(pair)
+
+    return pairs
+
+
+def _name_similarity(left_variants, right_variants):
+    best = 0.0
+    for left in left_variants:
+        for right in right_variants:
+            if left == right:
+                return 1.0
+            score = SequenceMatcher(None, left, right).ratio()
+            if (left in right or right in left) and min(len(left), len(right)) >= 8:
+                score = max(score, 0.90)
+            best = max(best, score)
+    return best
+
+
+def _category_score(left, right):
+    left_value = str(left.category or "").strip().lower()
+    right_value = str(right.category or "").strip().lower()
+    unknown = {"", "uncategorized", "other"}
+    if left_value in unknown or right_value in unknown:
+        return 0.5
+    return 1.0 if left_value == right_value else 0.0
+
+
+def score_pair(left, right, left_variants, right_variants, max_distance_m=2000):
+    name_score = _name_similarity(left_variants, right_variants)
+
+    distance = None
+    left_coords, right_coords = _coords(left), _coords(right)
+    if left_coords and right_coords:
+        distance = haversine_distance(*left_coords, *right_coords)
+
+    if distance is None:
+        # No spatial evidence: rely on name and category only.
+        total = (name_score * NAME_WEIGHT + _category_score(left, right) * CATEGORY_WEIGHT) / (
+            NAME_WEIGHT + CATEGORY_WEIGHT
+        )
+    elif distance > max_distance_m:
+        total = 0.0
+    else:
+        distance_score = 1.0 - (distance / max_distance_m)
+        total = (
+            name_score * NAME_WEIGHT
+            + distance_score * DISTANCE_WEIGHT
+            + _category_score(left, right) * CATEGORY_WEIGHT
+        )
+
+    left_district = str(left.district or "").strip().lower()
+    right_district = str(right.district or "").strip().lower()
+    if left_district and right_district and left_district != right_district:
+        total *= 0.8
+
+    return CandidatePair(left=left, right=right, score=round(total, 4), name_score=round(name_score, 4), distance=distance)
+
+
+def find_duplicate_pairs(
+    grid_size_m=500,
+    max_distance_m=2000,
+    merge_threshold=0.9,
+    review_threshold=0.7,
+):
+    locations = list(Location.objects.all())
+    by_id = {location.id: location for location in locations}
+    variants = {location.id: _name_variants(location) for location in locations}
+
+    scored = []
+    for left_id, right_id in build_candidate_pairs(locations, variants, grid_size_m=grid_size_m):
+        pair = score_pair(
+            by_id[left_id],
+            by_id[right_id],
+            variants[left_id],
+            variants[right_id],
+            max_distance_m=max_distance_m,
+        )
+        if pair.score >= merge_threshold:
+            pair.decision = "merge"
+        elif pair.score >= review_threshold:
+            pair.decision = "review"
+        else:
+            continue
+        scored.append(pair)
+
+    scored.sort(key=lambda item: item.score, reverse=True)
+    return scored
+
+
+def verify_ambiguous_pairs(pairs, ai_service, batch_size=10):
+    """Ask the LLM about "review" pairs in batches and record its verdict."""
+    ambiguous = [pair for pair in pairs if pair.decision == "review"]
+    for start in range(0, len(ambiguous), batch_size):
+        batch = ambiguous[start:start + batch_size]
+        verdicts = ai_service.verify_location_merges_batch(batch)
+        for pair, verdict in zip(batch, verdicts):
+            pair.llm_verdict = verdict
+            pair.decision = "merge" if verdict else "reject"
+    return ambiguous
+
+
+def build_merge_plans(pairs):
+    """Union confirmed pairs into clusters and pick the location with the most reels as canonical."""
+    parent = {}
+
+    def find(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    locations = {}
+    for pair in pairs:
+        if pair.decision != "merge":
+            continue
+        locations[pair.left.id] = pair.left
+        locations[pair.right.id] = pair.right
+        parent[find(pair.left.id)] = find(pair.right.id)
+
+    clusters = defaultdict(list)
+    for location_id, location in locations.items():
+        clusters[find(location_id)].append(location)
+
+    reel_counts = {}
+    if locations:
+        reel_counts = dict(
+            ScrapedReel.objects.filter(location_id__in=list(locations))
+            .values("location_id")
+            .annotate(total=Count("id"))
+            .values_list("location_id", "total")
+        )
+
+    plans = []
+    for members in clusters.values():
+        members.sort(key=lambda loc: (-reel_counts.get(loc.id, 0), loc.id))
+        plans.append(MergePlan(canonical=members[0], duplicates=members[1:]))
+    return plans
+
+
+def _merge_nearby_places(current, incoming):
+    merged = list(current or [])
+    seen = {str(place.get("name", "")).strip().lower() for place in merged if isinstance(place, dict)}
+    for place in incoming or []:
+        if not isinstance(place, dict):
+            continue
+        key = str(place.get("name", "")).strip().lower()
+        if key and key not in seen:
+            seen.add(key)
+            merged.append(place)
+    return merged
+
+
+def _reindex_reels(reel_ids):
+    # queryset.update() skips post_save, so refresh the moved reels' index entries here.
+    from core.rag.index_updater import add_reel_to_index
+
+    for reel in ScrapedReel.objects.filter(id__in=reel_ids, is_processed=True).select_related("location"):
+        add_reel_to_index(reel)
+
+
+@transaction.atomic
+def apply_merge_plan(plan):
+    canonical = Location.objects.select_for_update().get(id=plan.canonical.id)
+
+    for duplicate in plan.duplicates:
+        duplicate = Location.objects.select_for_update().get(id=duplicate.id)
+
+        moved_reel_ids = list(ScrapedReel.objects.filter(location=duplicate).values_list("id", flat=True))
+        # Stamp updated_at so resident reel BM25 indexes in other processes re-read them.
+        ScrapedReel.objects.filter(location=duplicate).update(location=canonical, updated_at=timezone.now())
+        transaction.on_commit(lambda ids=moved_reel_ids: _reindex_reels(ids))
+        LocationRevision.objects.filter(location=duplicate).update(location=canonical)
+
+        canonical.alternate_names = _merge_aliases(
+            canonical.alternate_names,
+            [duplicate.name] + list(duplicate.alternate_names or []),
+            canonical_name=canonical.name,
+        )
+        # Canonical values win; the duplicate only fills gaps.
+        canonical.general_info = _merge_dynamic_data(duplicate.general_info, canonical.general_info)
+        canonical.known_facts = _merge_dynamic_data(duplicate.known_facts, canonical.known_facts)
+        canonical.nearby_places = _merge_nearby_places(canonical.nearby_places, duplicate.nearby_places)
+
+        for field_name in ("district", "specific_area"):
+            if not _clean_text_value(getattr(canonical, field_name)):
+                setattr(canonical, field_name, getattr(duplicate, field_name))
+        if (not canonical.category) or canonical.category.strip().lower() == "uncategorized":
+            canonical.category = duplicate.category or canonical.category
+        if canonical.latitude is None and canonical.longitude is None:
+            canonical.latitude = duplicate.latitude
+            canonical.longitude = duplicate.longitude
+
+        duplicate.delete()
+
+    canonical.save()
+    return canonical
@@ -1,10 +1,10 @@
 import os
 import time
 import json
-import re
 import google.generativeai as genai
 from django.conf import settings
 from PIL import Image
+from .comment_utils import clean_comment_text
 
 class GeminiService:
     def __init__(self):
@@ -17,19 +17,19 @@ class GeminiService:
         self.model = genai.GenerativeModel('gemini-3-flash-preview')
 
     def _extract_comment_text(self, raw_comment):
-        if isinstance(raw_comment, dict):
-            text = str(raw_comment.get("text", "")).strip()
-        else:
-            text = str(raw_comment or "").strip()
-        if text.lower() == "[object object]":
-            return ""
-
-        # Remove ranking metadata like: [SCORE: 12] (2d)
-        text = re.sub(r'^\[SCORE:\s*\d+\]\s*\([^)]+\)\s*', "", text, flags=re.IGNORECASE)
-        text = re.sub(r"\s+", " ", text).strip()
-        return text
-
-    def _build_comments_context(self, comments_dump, limit=15):
+        return clean_comment_text(raw_comment)
+
+    def _build_comments_context(self, reel, limit=15):
+        # Prefer the texts cleaned when the comments were saved.
+        if reel.normalized_comments:
+            cleaned = [
+                f"- {entry['text']}"
+                for entry in reel.normalized_comments[:limit]
+                if isinstance(entry, dict) and entry.get("text")
+            ]
+            return "\n".join(cleaned) if cleaned else "No comments available."
+
+        comments_dump = reel.comments_dump
         if not isinstance(comments_dump, list) or not comments_dump:
             return "No comments available."
 
@@ -105,6 +105,46 @@ class GeminiService:
             print(f"⚠️ Merge Verification Error: {e}")
             return False
 
+    def verify_location_merges_batch(self, pairs):
+        """Asks Gemini about several candidate duplicate pairs in one call. Returns one bool per pair."""
+        print(f"🕵️ AI VERIFICATION: Checking {len(pairs)} candidate duplicate pairs...")
+
+        blocks = []
+        for number, pair in enumerate(pairs, start=1):
+            distance_text = f"{pair.distance:.1f} meters apart" if pair.distance is not None else "distance unknown"
+            blocks.append(f"""
+        PAIR {number} ({distance_text}):
+        - A: {pair.left.name} | Category: {pair.left.category} | District: {pair.left.district} | Aliases: {pair.left.alternate_names}
+        - B: {pair.right.name} | Category: {pair.right.category} | District: {pair.right.district} | Aliases: {pair.right.alternate_names}""")
+
+        prompt = f"""
+        You are an expert geographical AI data deduplication agent.
+        For each numbered pair below, determine if A and B are the EXACT SAME point of interest.
+        {"".join(blocks)}
+
+        RULES:
+        - Answer "YES" only if they describe the exact same place (even if one is a nickname or misspelling).
+        - Answer "NO" if they are distinct, separate places (e.g., a specific cafe near a beach, or two different waterfalls on the same trail).
+
+        Respond with ONLY a JSON array of "YES"/"NO" strings, one per pair, in order. Example: ["YES", "NO"]
+        """
+
+        try:
+            response = self.model.generate_content(
+                prompt,
+                generation_config=genai.types.GenerationConfig(temperature=0.1)
+            )
+            raw_text = response.text.replace("```json", "").replace("```", "").strip()
+            answers = json.loads(raw_text)
+            if not isinstance(answers, list) or len(answers) != len(pairs):
+                print("⚠️ Merge Verification Error: answer count does not match pair count")
+                return [False] * len(pairs)
+            return [str(answer).strip().upper() == "YES" for answer in answers]
+
+        except Exception as e:
+            print(f"⚠️ Merge Verification Error: {e}")
+            return [False] * len(pairs)
+
     def analyze_reel(self, reel, audio_path=None):
         print(f"🧠 Gemini is analyzing {reel.short_code}...")
 
@@ -127,7 +167,7 @@ class GeminiService:
             print("⚠️ No audio path provided to GeminiService.")
 
         # 3. Process Comments
-        comments_text = self._build_comments_context(reel.comments_dump)
+        comments_text = self._build_comments_context(reel)
 
         prompt = f"""
         You are a highly intelligent Malayalam travel data extraction expert.
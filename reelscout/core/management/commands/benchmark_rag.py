@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.rag.benchmarks import SUITES
+from core.rag.index_factory import BACKENDS
+from core.rag.model_loader import EMBEDDING_BACKENDS
+
+
+class Command(BaseCommand):
+    help = "Run synthetic benchmarks for the RAG retrieval stack (suites live in core.rag.benchmarks)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--suite", choices=list(SUITES), default="text-index")
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+        parser.add_argument("--dimension", type=int, default=384)
+        parser.add_argument("--queries", type=int, default=100)
+        parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+        parser.add_argument("--per-worker", type=int, default=50, help="Entries each ingest worker adds.")
+        parser.add_argument("--batch-size", type=int, default=16, help="WAL flush batch size for the ingest suite.")
+        parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+        parser.add_argument("--k", type=int, default=10, help="Neighbours per query for the backends suite.")
+        parser.add_argument("--repeats", type=int, default=5, help="Process launches per step for the startup suite.")
+        parser.add_argument(
+            "--eval-file",
+            default=str(settings.BASE_DIR / "core" / "rag" / "eval" / "retrieval_queries.json"),
+            help="JSON list of {query, expected_locations} for the retrieval-eval suite.",
+        )
+        parser.add_argument("--max-reels", type=int, default=10_000, help="Processed reels used by the chunking suite.")
+        parser.add_argument("--locations", type=int, default=100_000, help="Synthetic locations for the gazetteer suite.")
+        parser.add_argument(
+            "--embedding-backends",
+            nargs="+",
+            choices=EMBEDDING_BACKENDS,
+            default=list(EMBEDDING_BACKENDS),
+            help="Embedder backends compared against torch by the embedder-backends suite.",
+        )
+        parser.add_argument(
+            "--query-text",
+            nargs="+",
+            default=["best waterfalls in Idukki", "beaches near Kochi", "tea estates in Munnar"],
+            help="Chat queries for the chat-queries, streaming and async-chat suites.",
+        )
+
+    def handle(self, *args, **options):
+        SUITES[options["suite"]](self.stdout, options)
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.models import ReelFrame, ScrapedReel
+from core.rag.chunking import chunked_mode, reel_id_of
+from core.rag.index_writer import frame_writer, text_writer
+
+
+class Command(BaseCommand):
+    help = "Fold pending index writes and drop vectors whose reel or frame no longer exists."
+
+    def handle(self, *args, **options):
+        live_reels = set(ScrapedReel.objects.filter(is_processed=True).values_list("id", flat=True))
+        if chunked_mode():
+            # Entries are chunk ids; keep every chunk whose reel is still live.
+            text_writer.flush()
+            live_entries = [entry_id for entry_id in text_writer.store.ids() if reel_id_of(entry_id) in live_reels]
+        else:
+            live_entries = live_reels
+        before, after = text_writer.compact(live_entries)
+        self.stdout.write(f"Text index: {before} -> {after} vectors")
+
+        live_frames = ReelFrame.objects.values_list("id", flat=True)
+        before, after = frame_writer.compact(live_frames)
+        self.stdout.write(f"Frame index: {before} -> {after} vectors")
+
+        self.stdout.write(self.style.SUCCESS("RAG indexes compacted."))
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+
+from core.dedup import apply_merge_plan, build_merge_plans, find_duplicate_pairs, verify_ambiguous_pairs
+
+
+class Command(BaseCommand):
+    help = "Find and merge duplicate Location rows across the whole table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report the merge plan without writing anything.")
+        parser.add_argument("--skip-llm", action="store_true", help="Do not ask the LLM about ambiguous pairs.")
+        parser.add_argument("--llm-batch-size", type=int, default=10)
+        parser.add_argument("--grid-size-m", type=float, default=500, help="Spatial blocking cell size in meters.")
+        parser.add_argument("--max-distance-m", type=float, default=2000, help="Pairs further apart never merge.")
+        parser.add_argument("--merge-threshold", type=float, default=0.9, help="Score at or above which pairs merge without the LLM.")
+        parser.add_argument("--review-threshold", type=float, default=0.7, help="Score at or above which pairs are sent to the LLM.")
+
+    def handle(self, *args, **options):
+        pairs = find_duplicate_pairs(
+            grid_size_m=options["grid_size_m"],
+            max_distance_m=options["max_distance_m"],
+            merge_threshold=options["merge_threshold"],
+            review_threshold=options["review_threshold"],
+        )
+
+        auto_count = sum(1 for pair in pairs if pair.decision == "merge")
+        review_count = sum(1 for pair in pairs if pair.decision == "review")
+        self.stdout.write(f"Scored candidate pairs: {auto_count} confident, {review_count} ambiguous")
+
+        if review_count and not options["skip_llm"]:
+            from core.gemini_service import GeminiService
+
+            verify_ambiguous_pairs(pairs, GeminiService(), batch_size=options["llm_batch_size"])
+
+        for pair in pairs:
+            distance = f"{pair.distance:.0f}m" if pair.distance is not None else "n/a"
+            verdict = "" if pair.llm_verdict is None else f" llm={'YES' if pair.llm_verdict else 'NO'}"
+            self.stdout.write(
+                f"  [{pair.decision:6}] {pair.score:.3f} name={pair.name_score:.3f} dist={distance}{verdict}  "
+                f"'{pair.left.name}' <-> '{pair.right.name}'"
+            )
+
+        plans = build_merge_plans(pairs)
+        if not plans:
+            self.stdout.write(self.style.SUCCESS("No duplicate locations to merge."))
+            return
+
+        self.stdout.write(f"Merge plan ({len(plans)} clusters):")
+        for plan in plans:
+            names = ", ".join(f"'{duplicate.name}'" for duplicate in plan.duplicates)
+            self.stdout.write(f"  '{plan.canonical.name}' <= {names}")
+
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING("Dry run: no changes written."))
+            return
+
+        merged = 0
+        for plan in plans:
+            apply_merge_plan(plan)
+            merged += len(plan.duplicates)
+
+        self.stdout.write(self.style.SUCCESS(f"Merged {merged} duplicate locations into {len(plans)} canonical entries."))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from core.rag import rebuild
+from .rebuild_rag_index import add_rebuild_arguments
+
+
+class Command(BaseCommand):
+    help = "Rebuild the CLIP frame index from all stored frames, in batches, resumable."
+
+    def add_arguments(self, parser):
+        add_rebuild_arguments(parser)
+        parser.add_argument("--workers", type=int, default=rebuild.DEFAULT_WORKERS, help="Image decoding threads.")
+
+    def _progress(self, done, total, rate):
+        eta = (total - done) / rate if rate and total > done else 0
+        self.stdout.write(f"\r  {done}/{total} frames  {rate:7.1f} frames/s  eta {eta:5.0f}s", ending="")
+        self.stdout.flush()
+
+    def handle(self, *args, **options):
+        count = rebuild.rebuild_frame_index(
+            batch_size=options["batch_size"],
+            chunk_size=options["chunk_size"],
+            workers=options["workers"],
+            resume=options["resume"],
+            checkpoint_every=options["checkpoint_every"],
+            progress=self._progress,
+            backend=options["backend"],
+        )
+        self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS(f"Frame index rebuilt with {count} vectors."))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from core.rag import rebuild
+from core.rag.index_factory import BACKENDS
+
+
+def add_rebuild_arguments(parser):
+    parser.add_argument("--batch-size", type=int, default=rebuild.DEFAULT_BATCH_SIZE, help="Items per encode call.")
+    parser.add_argument("--chunk-size", type=int, default=rebuild.DEFAULT_CHUNK_SIZE, help="Rows fetched per DB round trip.")
+    parser.add_argument(
+        "--checkpoint-every", type=int, default=rebuild.DEFAULT_CHECKPOINT_EVERY, help="Batches between checkpoints."
+    )
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted rebuild from its checkpoint.")
+    parser.add_argument(
+        "--backend",
+        choices=("auto",) + BACKENDS,
+        default=None,
+        help="Index backend; defaults to RAG_INDEX_BACKEND (auto picks by corpus size).",
+    )
+
+
+class Command(BaseCommand):
+    help = "Rebuild the text RAG index from all processed reels, in batches, resumable."
+
+    def add_arguments(self, parser):
+        add_rebuild_arguments(parser)
+
+    def _progress(self, done, total, rate):
+        eta = (total - done) / rate if rate and total > done else 0
+        self.stdout.write(f"\r  {done}/{total} reels  {rate:7.1f} reels/s  eta {eta:5.0f}s", ending="")
+        self.stdout.flush()
+
+    def handle(self, *args, **options):
+        count = rebuild.rebuild_text_index(
+            batch_size=options["batch_size"],
+            chunk_size=options["chunk_size"],
+            resume=options["resume"],
+            checkpoint_every=options["checkpoint_every"],
+            progress=self._progress,
+            backend=options["backend"],
+        )
+        self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS(f"Text index rebuilt with {count} vectors."))
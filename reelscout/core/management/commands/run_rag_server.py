@@ -0,0 +1,99 @@
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+from core.rag.rag_server import DEFAULT_PORT, encode_array, rag_client
+
+
+class RagRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send(404, {"error": "not found"})
+            return
+        self._send(200, {"status": "ok", "uptime_s": round(time.monotonic() - self.server.started, 1)})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send(400, {"error": "invalid JSON"})
+            return
+
+        try:
+            if self.path == "/search":
+                result = self._search(payload)
+            elif self.path == "/embed":
+                result = self._embed(payload)
+            else:
+                self._send(404, {"error": "not found"})
+                return
+        except (KeyError, ValueError) as e:
+            self._send(400, {"error": str(e)})
+            return
+        except Exception as e:
+            print(f"❌ RAG server error on {self.path}: {e}")
+            self._send(500, {"error": str(e)})
+            return
+        self._send(200, result)
+
+    def _search(self, payload):
+        from core.rag.frame_retriever import frame_index_hits
+        from core.rag.retriever import text_index_hits
+
+        search = {"text": text_index_hits, "frame": frame_index_hits}.get(payload["index"])
+        if search is None:
+            raise ValueError(f"Unknown index: {payload['index']}")
+        reel_ids = payload.get("reel_ids")
+        hits = search(payload["query"], int(payload["k"]), set(reel_ids) if reel_ids is not None else None)
+        return {"hits": [[distance, meta] for distance, meta in hits]}
+
+    def _embed(self, payload):
+        from core.rag.embedder import embed_texts
+        from core.rag.image_embedder import embed_image_texts
+
+        embed = {"text": embed_texts, "clip_text": embed_image_texts}.get(payload["model"])
+        if embed is None:
+            raise ValueError(f"Unknown model: {payload['model']}")
+        return {"vectors": encode_array(embed(payload["texts"]))}
+
+
+class Command(BaseCommand):
+    help = "Serve embeddings and index searches to the web workers on this machine (set RAG_SERVER_URL in the workers)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1", help="Bind address; keep it local, there is no auth.")
+        parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+
+    def handle(self, *args, **options):
+        from core.rag.warmup import warm_up
+
+        # This process owns the models and indexes; never forward to itself.
+        rag_client.serving = True
+        warm_up()
+
+        server = ThreadingHTTPServer((options["host"], options["port"]), RagRequestHandler)
+        server.daemon_threads = True
+        server.started = time.monotonic()
+        self.stdout.write(self.style.SUCCESS(f"RAG server listening on http://{options['host']}:{options['port']}"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,78 @@
+# Generated by Django 4.2.27 on 2026-10-19 00:00
+
+import re
+
+from django.db import migrations, models
+
+# Copied from core.comment_utils as of this migration, so the backfill does not
+# change when that module does.
+_SCORE_PREFIX_RE = re.compile(r'^\[SCORE:\s*\d+\]\s*\([^)]+\)\s*', flags=re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r"\s+")
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9\s]")
+
+
+def normalize_geo_label(value):
+    text = str(value or "").strip().lower()
+    if not text:
+        return ""
+    text = _NON_ALNUM_RE.sub(" ", text)
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    return text
+
+
+def clean_comment_text(raw_comment):
+    if isinstance(raw_comment, dict):
+        text = str(raw_comment.get("text", "")).strip()
+    else:
+        text = str(raw_comment or "").strip()
+    if text.lower() == "[object object]":
+        return ""
+
+    text = _SCORE_PREFIX_RE.sub("", text)
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    return text
+
+
+def build_normalized_comments(comments_dump):
+    if not isinstance(comments_dump, list):
+        return []
+
+    entries = []
+    for raw_comment in comments_dump:
+        text = clean_comment_text(raw_comment)
+        if not text:
+            continue
+        normalized = normalize_geo_label(text)
+        entries.append({
+            "text": text,
+            "normalized": normalized,
+            "tokens": sorted(set(normalized.split())),
+        })
+    return entries
+
+
+def backfill_normalized_comments(apps, schema_editor):
+    ScrapedReel = apps.get_model("core", "ScrapedReel")
+    for reel in ScrapedReel.objects.only("id", "comments_dump").iterator():
+        reel.normalized_comments = build_normalized_comments(reel.comments_dump)
+        reel.save(update_fields=["normalized_comments"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_scrapedreel_extracted_district_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="scrapedreel",
+            name="normalized_comments",
+            field=models.JSONField(
+                blank=True,
+                default=list,
+                help_text="Precomputed from comments_dump. Schema: [{'text': '...', 'normalized': '...', 'tokens': ['...']}]",
+            ),
+        ),
+        migrations.RunPython(backfill_normalized_comments, migrations.RunPython.noop),
+    ]
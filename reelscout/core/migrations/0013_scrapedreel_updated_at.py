@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_scrapedreel_normalized_comments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapedreel',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -59,6 +59,11 @@ class ScrapedReel(models.Model):
     transcript_text = models.TextField(null=True, blank=True)
     # Updated schema representation for accurate time tracking
     comments_dump = models.JSONField(default=list, blank=True, null=True, help_text="Schema: [{'text': '...', 'likes': 0, 'date': '...'}]")
+    normalized_comments = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="Precomputed from comments_dump. Schema: [{'text': '...', 'normalized': '...', 'tokens': ['...']}]"
+    )
 
     # 4. METADATA
     author_handle = models.CharField(max_length=100, null=True, blank=True)
@@ -92,6 +97,7 @@ class ScrapedReel(models.Model):
     # 7. STATUS
     is_processed = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     location = models.ForeignKey(
         Location,
@@ -1,59 +1,48 @@
-import os
-import faiss
-import pickle
-import numpy as np
-
 from core.models import ReelFrame
-from .image_embedder import embed_image
-
-
-FRAME_INDEX_PATH = "frame_index.faiss"
-FRAME_META_PATH = "frame_metadata.pkl"
+from .embedding_cache import embedding_cache
+from .image_embedder import embed_loaded_images, load_image
+from .index_writer import frame_writer
 
 
 def add_frames_to_index(reel):
 
-    frames = ReelFrame.objects.filter(reel=reel)
+    frames = list(ReelFrame.objects.filter(reel=reel))
 
-    if not frames.exists():
+    if not frames:
         print("⚠ No frames found for reel")
         return
 
-    vectors = []
+    loaded = []
+    metadata = []
 
     for frame in frames:
 
-        path = frame.image.path
-
-        vec = embed_image(path)
-
-        vectors.append(vec)
-
-    vectors = np.array(vectors).astype("float32")
+        digest, image = load_image(frame.image.path)
 
-    # Check if the frame index exists before trying to read it
-    if not os.path.exists(FRAME_INDEX_PATH):
-        print(f"⚠️ {FRAME_INDEX_PATH} not found. Creating a new frame index...")
-        dimension = vectors.shape[1]
-        index = faiss.IndexFlatL2(dimension)
-        metadata = []
-    else:
-        index = faiss.read_index(FRAME_INDEX_PATH)
-        with open(FRAME_META_PATH, "rb") as f:
-            metadata = pickle.load(f)
+        if image is None:
+            print(f"⚠ Skipping frame {frame.id}: image missing or unreadable")
+            continue
 
-    index.add(vectors)
+        loaded.append((frame, digest, image))
 
-    faiss.write_index(index, FRAME_INDEX_PATH)
-
-    # Add metadata for every frame we just processed
-    for frame in frames:
+        # Add metadata for every frame we just processed
         metadata.append({
             "reel_id": reel.id,
-            "frame_id": frame.id
+            "frame_id": frame.id,
+            "timestamp": frame.timestamp
         })
 
-    with open(FRAME_META_PATH, "wb") as f:
-        pickle.dump(metadata, f)
+    if not loaded:
+        return
+
+    before = embedding_cache.stats()
+
+    vectors = embed_loaded_images([digest for _, digest, _ in loaded], [image for _, _, image in loaded])
+
+    frame_writer.upsert([frame.id for frame, _, _ in loaded], vectors, metadata)
 
-    print(f"🎞 Frames for reel {reel.short_code} added to frame index")
\ No newline at end of file
+    after = embedding_cache.stats()
+    print(
+        f"🎞 Frames for reel {reel.short_code} added to frame index "
+        f"({after['reused'] - before['reused']} cached, {after['computed'] - before['computed']} embedded)"
+    )
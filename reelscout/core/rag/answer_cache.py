@@ -0,0 +1,179 @@
+# answer_cache.py
+"""
+In-process cache of generated chat answers.
+
+run_rag still retrieves for every query (that is cheap next to the Groq call),
+then looks the answer up by (normalized query, conversation history, context
+fingerprint). The fingerprint covers the ids and updated_at of the context
+reels and the ids and last_updated of the context locations, so an answer is
+only reused when it would be generated from the same data.
+
+With RAG_ANSWER_CACHE_SIMILARITY > 0, a paraphrase ("waterfalls in idukki?"
+vs "best idukki waterfalls") reuses an entry with the same history and context
+fingerprint whose query embedding is at least that cosine-similar.
+
+Entries expire after RAG_ANSWER_CACHE_TTL seconds, the least recently used
+are evicted past RAG_ANSWER_CACHE_SIZE, and saving or deleting a contributing
+Location or ScrapedReel drops them (see core/signals.py). Changes made by
+other processes change the fingerprint instead, so they miss the cache too.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from .query_cache import normalize_query
+
+
+def _stamp(value):
+    return value.isoformat() if value else ""
+
+
+def context_fingerprint(reels, locations):
+    parts = sorted(f"r{reel.id}@{_stamp(reel.updated_at)}" for reel in reels)
+    parts += sorted(f"l{location.id}@{_stamp(location.last_updated)}" for location in locations)
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def history_digest(history):
+    return hashlib.sha256("\n".join(str(line) for line in history or []).encode("utf-8")).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("answer", "scope", "vector", "reel_ids", "location_ids", "expires_at")
+
+    def __init__(self, answer, scope, vector, reel_ids, location_ids, expires_at):
+        self.answer = answer
+        self.scope = scope
+        self.vector = vector
+        self.reel_ids = reel_ids
+        self.location_ids = location_ids
+        self.expires_at = expires_at
+
+
+class AnswerCache:
+
+    def __init__(self, max_entries=None, ttl=None, similarity=None):
+        self.max_entries = max_entries or getattr(settings, "RAG_ANSWER_CACHE_SIZE", 512)
+        self.ttl = ttl if ttl is not None else getattr(settings, "RAG_ANSWER_CACHE_TTL", 3600)
+        self.similarity = similarity if similarity is not None else getattr(settings, "RAG_ANSWER_CACHE_SIMILARITY", 0.0)
+        self._entries = OrderedDict()
+        # (history digest, context fingerprint) -> keys, for paraphrase lookups.
+        self._by_scope = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.paraphrase_hits = 0
+        self.misses = 0
+
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def _drop_locked(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._by_scope.get(entry.scope)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_scope[entry.scope]
+
+    def _similar_locked(self, scope, vector, now):
+        best_key, best_score = None, self.similarity
+        for key in list(self._by_scope.get(scope, ())):
+            entry = self._entries[key]
+            if entry.expires_at <= now:
+                self._drop_locked(key)
+                continue
+            if entry.vector is None:
+                continue
+            score = float(np.dot(entry.vector, vector))
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def get(self, query, history, reels, locations, query_vector=None):
+        """
+        Return the cached answer dict for this query and context, or None.
+        query_vector (normalized) enables the paraphrase lookup.
+        """
+        scope = (history_digest(history), context_fingerprint(reels, locations))
+        key = (normalize_query(query),) + scope
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                self._drop_locked(key)
+                entry = None
+
+            if entry is None and self.similarity > 0 and query_vector is not None:
+                similar = self._similar_locked(scope, query_vector, now)
+                if similar is not None:
+                    key, entry = similar, self._entries[similar]
+                    self.paraphrase_hits += 1
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry.answer
+
+    def put(self, query, history, reels, locations, answer, query_vector=None):
+        scope = (history_digest(history), context_fingerprint(reels, locations))
+        key = (normalize_query(query),) + scope
+        entry = _Entry(
+            answer,
+            scope,
+            query_vector,
+            frozenset(reel.id for reel in reels),
+            frozenset(location.id for location in locations),
+            time.monotonic() + self.ttl,
+        )
+
+        with self._lock:
+            self._drop_locked(key)
+            self._entries[key] = entry
+            self._by_scope.setdefault(scope, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop_locked(next(iter(self._entries)))
+
+    def invalidate(self, reel_id=None, location_id=None):
+        """Drop every entry whose context included the reel or location."""
+        with self._lock:
+            stale = [
+                key for key, entry in self._entries.items()
+                if (reel_id is not None and reel_id in entry.reel_ids)
+                or (location_id is not None and location_id in entry.location_ids)
+            ]
+            for key in stale:
+                self._drop_locked(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_scope.clear()
+            self.hits = 0
+            self.paraphrase_hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "paraphrase_hits": self.paraphrase_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size": len(self._entries),
+                "max_size": self.max_entries,
+                "ttl_s": self.ttl,
+            }
+
+
+answer_cache = AnswerCache()
@@ -0,0 +1,131 @@
+# answer_stream.py
+"""
+Incremental extraction of the "answer" string from the model's JSON reply.
+
+The chat prompt asks for {"answer": "...", "recommended_locations": [...]}.
+When the reply is streamed, AnswerStreamParser is fed the content deltas as
+they arrive and returns the newly decoded answer text after each one, so the
+chat stream can forward answer tokens long before the JSON is complete. JSON
+escapes (including \\uXXXX and surrogate pairs) may be split across deltas.
+
+Only a top-level "answer" key is followed; the same key inside
+recommended_locations, or the word answer inside another string, is ignored.
+text() returns everything fed so far for the final json.loads.
+"""
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class AnswerStreamParser:
+
+    def __init__(self, key="answer"):
+        self.key = key
+        self.found = False
+        self.finished = False
+        self._raw = []
+        self._state = "scan"
+        self._depth = 0
+        self._expect_key = False
+        self._in_string = False
+        self._string_escape = False
+        self._string_chars = []
+        self._pending_key = None
+        self._unicode = ""
+        self._high_surrogate = None
+
+    def text(self):
+        return "".join(self._raw)
+
+    def feed(self, chunk):
+        """Consume one content delta and return the answer text it completed (may be "")."""
+        self._raw.append(chunk)
+        if self.finished:
+            return ""
+        out = []
+        for char in chunk:
+            if self._state == "scan":
+                self._scan(char)
+            elif self._state == "before_value":
+                if char.isspace():
+                    continue
+                if char == '"':
+                    self._state = "value"
+                    self.found = True
+                else:
+                    # A non-string answer; nothing to stream, the final parse handles it.
+                    self._state = "scan"
+                    self._scan(char)
+            elif self._state == "value":
+                if char == "\\":
+                    self._state = "escape"
+                elif char == '"':
+                    self._state = "done"
+                    self.finished = True
+                    break
+                else:
+                    self._emit(out, char)
+            elif self._state == "escape":
+                if char == "u":
+                    self._unicode = ""
+                    self._state = "unicode"
+                else:
+                    self._emit(out, _ESCAPES.get(char, char))
+                    self._state = "value"
+            elif self._state == "unicode":
+                self._unicode += char
+                if len(self._unicode) == 4:
+                    self._state = "value"
+                    try:
+                        self._emit_code_point(out, int(self._unicode, 16))
+                    except ValueError:
+                        pass
+        return "".join(out)
+
+    def _emit(self, out, char):
+        if self._high_surrogate is not None:
+            # A lone high surrogate cannot be printed; drop it.
+            self._high_surrogate = None
+        out.append(char)
+
+    def _emit_code_point(self, out, code):
+        if 0xD800 <= code < 0xDC00:
+            self._high_surrogate = code
+            return
+        if 0xDC00 <= code < 0xE000:
+            if self._high_surrogate is not None:
+                code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+                self._high_surrogate = None
+                out.append(chr(code))
+            return
+        self._emit(out, chr(code))
+
+    def _scan(self, char):
+        if self._in_string:
+            if self._string_escape:
+                self._string_escape = False
+                self._string_chars.append(char)
+            elif char == "\\":
+                self._string_escape = True
+            elif char == '"':
+                self._in_string = False
+                if self._expect_key:
+                    self._pending_key = "".join(self._string_chars)
+                    self._expect_key = False
+            else:
+                self._string_chars.append(char)
+            return
+
+        if char == '"':
+            self._in_string = True
+            self._string_chars = []
+        elif char in "{[":
+            self._depth += 1
+            self._expect_key = char == "{" and self._depth == 1
+        elif char in "}]":
+            self._depth -= 1
+        elif char == "," and self._depth == 1:
+            self._expect_key = True
+        elif char == ":" and self._depth == 1:
+            if self._pending_key == self.key:
+                self._state = "before_value"
+            self._pending_key = None
@@ -0,0 +1,83 @@
+# async_utils.py
+"""
+Helpers for the async chat path (arun_rag, afused_search).
+
+FAISS searches, embedding and BM25 scoring are CPU work that mostly releases
+the GIL, and the in-memory gazetteer/BM25 holders may hit the database when
+they (re)load, which Django forbids inside the event loop. in_thread runs such
+a retrieval leg on the default executor so several legs, and several chat
+sessions, proceed at once.
+
+Django closes a request's database connection when the request finishes, but
+only on the thread that served it. Executor threads are not request threads,
+so in_thread releases their connection after each leg, the same way Django
+does at the end of a request.
+
+iterate_in_thread does the same for a sync generator, e.g. a streamed chat
+answer: Django 4.2 consumes a sync StreamingHttpResponse iterator under ASGI
+by collecting it into a list first, so an SSE stream would arrive in one piece.
+"""
+import asyncio
+import threading
+
+from django.db import close_old_connections
+
+
+def _run_leg(fn, args, kwargs):
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def in_thread(fn, *args, **kwargs):
+    """await fn(*args, **kwargs) run on a worker thread."""
+    return await asyncio.to_thread(_run_leg, fn, args, kwargs)
+
+
+async def iterate_in_thread(iterable):
+    """
+    Iterate a sync iterable on a worker thread, yielding each item as soon as
+    it is produced. Closing the async iterator (e.g. when the client
+    disconnects) stops the worker before its next item.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stopped = threading.Event()
+    finished = object()
+
+    def put(item, error=None):
+        if not stopped.is_set():
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+            except RuntimeError:  # the event loop has already closed
+                stopped.set()
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if stopped.is_set():
+                    break
+                put(item)
+        except Exception as e:
+            put(finished, e)
+        else:
+            put(finished)
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+            close_old_connections()
+
+    loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is finished:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
@@ -0,0 +1,124 @@
+# batcher.py
+"""
+Micro-batching executor for embedding calls from concurrent request threads.
+
+Each chat request embeds one short query. Encoding them one at a time wastes
+the model's batch efficiency and makes threads contend on the same model, so
+MicroBatcher queues single items, lets a worker thread collect whatever
+arrives within max_wait_ms (up to max_batch_size items), encodes them with one
+call and resolves each caller's future with its own row.
+
+A lone request waits at most max_wait_ms before its batch of one runs.
+"""
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+
+from django.conf import settings
+
+# Queue-time samples kept for the percentiles in stats().
+QUEUE_SAMPLES = 1000
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+class MicroBatcher:
+
+    def __init__(self, encode_batch, max_batch_size=None, max_wait_ms=None, name="batcher"):
+        """encode_batch(items) must return one result per item, in order."""
+        self.encode_batch = encode_batch
+        self.max_batch_size = max(1, max_batch_size or getattr(settings, "RAG_EMBED_MAX_BATCH", 32))
+        if max_wait_ms is None:
+            max_wait_ms = getattr(settings, "RAG_EMBED_MAX_WAIT_MS", 3.0)
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self._queue = queue.Queue()
+        self._worker = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._queue_ms = deque(maxlen=QUEUE_SAMPLES)
+        self._encode_ms = deque(maxlen=QUEUE_SAMPLES)
+
+    def _ensure_worker(self):
+        # Threads do not survive a fork; a forked worker process starts its own.
+        if self._worker is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._worker is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._worker = threading.Thread(target=self._run, name=f"{self.name}-worker", daemon=True)
+            self._pid = os.getpid()
+            self._worker.start()
+
+    def submit(self, item):
+        """Queue one item; the returned Future resolves to its encoded row."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def encode(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            live = [(item, future) for item, future, _ in batch if future.set_running_or_notify_cancel()]
+            if live:
+                try:
+                    results = self.encode_batch([item for item, _ in live])
+                except Exception as e:
+                    for _, future in live:
+                        future.set_exception(e)
+                else:
+                    for (_, future), result in zip(live, results):
+                        future.set_result(result)
+            finished = time.perf_counter()
+
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] += 1
+                self._queue_ms.extend((started - queued_at) * 1000 for _, _, queued_at in batch)
+                self._encode_ms.append((finished - started) * 1000)
+
+    def stats(self):
+        with self._stats_lock:
+            batches = sum(self._batch_sizes.values())
+            items = sum(size * count for size, count in self._batch_sizes.items())
+            return {
+                "batches": batches,
+                "items": items,
+                "mean_batch_size": round(items / batches, 2) if batches else 0.0,
+                "batch_sizes": dict(sorted(self._batch_sizes.items())),
+                "queue_ms_p50": round(_percentile(self._queue_ms, 50), 3),
+                "queue_ms_p99": round(_percentile(self._queue_ms, 99), 3),
+                "encode_ms_p50": round(_percentile(self._encode_ms, 50), 3),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+
+def batching_enabled():
+    return getattr(settings, "RAG_EMBED_BATCHING", True)
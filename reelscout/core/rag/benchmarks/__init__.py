@@ -0,0 +1,27 @@
+"""
+Synthetic and data-backed benchmarks for the RAG retrieval stack, run through
+manage.py benchmark_rag --suite <name>. Each suite is a function
+(out, options) that writes its report lines to out; options are the parsed
+command arguments.
+"""
+from . import chat, embedding, indexes, retrieval
+
+SUITES = {
+    "text-index": indexes.bench_text_index,
+    "ingest": indexes.bench_ingest,
+    "metadata": indexes.bench_metadata,
+    "backends": indexes.bench_backends,
+    "startup": indexes.bench_startup,
+    "chat-queries": retrieval.bench_chat_queries,
+    "gazetteer": retrieval.bench_gazetteer,
+    "locations": retrieval.bench_locations,
+    "retrieval-eval": retrieval.bench_retrieval_eval,
+    "chunking": retrieval.bench_chunking,
+    "filtered": indexes.bench_filtered,
+    "quantized": indexes.bench_quantized,
+    "embedder-backends": embedding.bench_embedder_backends,
+    "batching": embedding.bench_batching,
+    "rag-server": embedding.bench_rag_server,
+    "streaming": chat.bench_streaming,
+    "async-chat": chat.bench_async_chat,
+}
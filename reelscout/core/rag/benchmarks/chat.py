@@ -0,0 +1,89 @@
+"""Chat suites: streamed vs. blocking answers, and sync vs. async chat sessions."""
+import time
+
+from .common import percentile, report
+
+
+def bench_streaming(out, options):
+    """Time until the user sees answer text: /api/chat/ (run_rag) vs. /api/chat/stream/ (stream_rag)."""
+    from ..answer_cache import answer_cache
+    from ..rag_pipeline import run_rag, stream_rag
+
+    for query in options["query_text"]:
+        blocking, context, first_token, done = [], [], [], []
+        for _ in range(options["repeats"]):
+            # Both paths must reach the LLM.
+            answer_cache.clear()
+            start = time.perf_counter()
+            run_rag(query)
+            blocking.append((time.perf_counter() - start) * 1000)
+
+            answer_cache.clear()
+            start = time.perf_counter()
+            first = None
+            for event in stream_rag(query):
+                elapsed = (time.perf_counter() - start) * 1000
+                if event["type"] == "context":
+                    context.append(elapsed)
+                elif event["type"] == "token" and first is None:
+                    first = elapsed
+            first_token.append(first if first is not None else elapsed)
+            done.append(elapsed)
+
+        out.write(f"{query}:")
+        report(out, "chat (first text = done)", blocking)
+        report(out, "stream: context event", context)
+        report(out, "stream: first token", first_token)
+        report(out, "stream: done", done)
+
+
+def bench_async_chat(out, options):
+    """Concurrent chat sessions in one process: run_rag on a thread each vs. arun_rag on one event loop."""
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    from ..answer_cache import answer_cache
+    from ..rag_pipeline import arun_rag, run_rag
+
+    queries = options["query_text"]
+
+    for sessions in options["workers"]:
+        out.write(f"{sessions} sessions x {len(queries)} queries:")
+
+        latencies = []
+
+        def sync_session(_):
+            for query in queries:
+                start = time.perf_counter()
+                run_rag(query)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        answer_cache.clear()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            list(pool.map(sync_session, range(sessions)))
+        elapsed = time.perf_counter() - start
+        out.write(
+            f"  {'run_rag, thread per session':<28} {len(latencies) / elapsed:6.2f} chats/s  "
+            f"p50={percentile(latencies, 50):8.1f}ms  p99={percentile(latencies, 99):8.1f}ms"
+        )
+
+        latencies = []
+
+        async def async_session():
+            for query in queries:
+                start = time.perf_counter()
+                await arun_rag(query)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        async def run_sessions():
+            await asyncio.gather(*(async_session() for _ in range(sessions)))
+
+        answer_cache.clear()
+        start = time.perf_counter()
+        asyncio.run(run_sessions())
+        elapsed = time.perf_counter() - start
+        out.write(
+            f"  {'arun_rag, one event loop':<28} {len(latencies) / elapsed:6.2f} chats/s  "
+            f"p50={percentile(latencies, 50):8.1f}ms  p99={percentile(latencies, 99):8.1f}ms"
+        )
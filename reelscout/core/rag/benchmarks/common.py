@@ -0,0 +1,66 @@
+"""Shared helpers for the benchmark suites: synthetic vectors, timing and memory readings."""
+import os
+import time
+
+import faiss
+import numpy as np
+
+# Keeps the synthetic base corpus ids clear of the ids the ingest workers add.
+BASE_ID_OFFSET = 10_000_000
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    position = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[position]
+
+
+def random_vectors(count, dimension, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((count, dimension)).astype("float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def clustered_vectors(count, dimension, clusters=256, seed=0):
+    """Normalized vectors around random centroids; closer to real embeddings than pure noise."""
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((clusters, dimension)).astype("float32")
+    vectors = centroids[rng.integers(0, clusters, count)] + 0.5 * rng.standard_normal((count, dimension)).astype("float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def process_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return 0.0
+
+
+def timed(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(out, label, samples):
+    """One p50/p99 latency line."""
+    out.write(
+        f"  {label:<28} p50={percentile(samples, 50):8.2f}ms  p99={percentile(samples, 99):8.2f}ms"
+    )
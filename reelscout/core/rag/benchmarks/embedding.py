@@ -0,0 +1,190 @@
+"""Embedding suites: backend parity, micro-batching and the shared RAG server."""
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+from django.conf import settings
+
+from ..model_loader import PARITY_MIN_COSINE
+from .common import percentile, process_rss_mb, timed
+
+
+# Run by each worker process of the rag-server suite; prints one JSON line.
+_SEARCH_WORKER = """
+import json, os, sys, time
+import django
+django.setup()
+from core.rag.frame_retriever import search_frames
+from core.rag.retriever import semantic_search
+queries = json.loads(sys.argv[1])
+latencies = []
+for query in queries:
+    start = time.perf_counter()
+    semantic_search(query, k=10)
+    search_frames(query, k=5)
+    latencies.append((time.perf_counter() - start) * 1000)
+with open("/proc/self/statm") as f:
+    rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+print(json.dumps({"rss_mb": rss, "latencies": latencies}))
+"""
+
+
+def bench_embedder_backends(out, options):
+    """Cosine parity with PyTorch and per-core throughput of each embedder backend (MiniLM and CLIP)."""
+    import torch
+
+    from core.models import ReelFrame, ScrapedReel
+    from .. import embedder, image_embedder
+    from ..document_builder import build_reel_document
+    from ..model_loader import load_model
+
+    with open(options["eval_file"], encoding="utf-8") as f:
+        queries = [case["query"] for case in json.load(f)]
+    reels = ScrapedReel.objects.filter(is_processed=True).select_related("location").order_by("id")
+    documents = [build_reel_document(reel) for reel in reels[: options["queries"]]] or queries
+    images = [
+        image for _, image in (
+            image_embedder.load_image(frame.image.path)
+            for frame in ReelFrame.objects.order_by("id")[: options["queries"]]
+        )
+        if image is not None
+    ]
+    threads = torch.get_num_threads()
+    out.write(
+        f"{len(queries)} queries, {len(documents)} documents, {len(images)} frames, {threads} torch threads"
+    )
+
+    def unit(vectors):
+        vectors = np.asarray(vectors, dtype="float32")
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    cases = (
+        (embedder.MODEL_NAME, True, (("query", queries), ("document", documents))),
+        (image_embedder.MODEL_NAME, False, (("text", queries), ("image", images))),
+    )
+    for model_name, onnx_capable, inputs in cases:
+        reference = load_model(model_name, backend="torch")
+        expected = {kind: unit(reference.encode(items, batch_size=32)) for kind, items in inputs if items}
+        out.write(f"{model_name}:")
+
+        for backend in options["embedding_backends"]:
+            model = reference if backend == "torch" else load_model(model_name, backend=backend, onnx_capable=onnx_capable)
+            for kind, items in inputs:
+                if not items:
+                    continue
+                start = time.perf_counter()
+                vectors = unit(model.encode(items, batch_size=32))
+                batch_s = time.perf_counter() - start
+                cosines = np.einsum("ij,ij->i", vectors, expected[kind])
+
+                item_iter = iter(range(10 ** 9))
+                samples = timed(lambda: model.encode([items[next(item_iter) % len(items)]]), min(len(items), 50))
+                per_core = len(items) / batch_s / threads
+                flag = "✅" if cosines.mean() >= PARITY_MIN_COSINE else "⚠️"
+                out.write(
+                    f"  {flag} {backend:<5} {kind:<8} cos mean={cosines.mean():.4f} min={cosines.min():.4f}  "
+                    f"batched={per_core:8.1f}/s/core  single p50={percentile(samples, 50):7.2f}ms"
+                )
+
+
+def bench_batching(out, options):
+    """Concurrent query embedding: one encode call per thread vs. the shared micro-batcher."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    from ..batcher import MicroBatcher
+    from ..embedder import embed_texts, get_model
+
+    model = get_model()
+    model.encode("warm up")
+
+    def direct(text):
+        return model.encode(text, normalize_embeddings=True)
+
+    for workers in options["workers"]:
+        texts = [f"query {i} about waterfalls and beaches in kerala" for i in range(workers * options["per_worker"])]
+        batcher = MicroBatcher(lambda items: embed_texts(items, batch_size=len(items)), name="bench-embed")
+        out.write(f"{workers} threads x {options['per_worker']} queries:")
+
+        for label, encode in (("per-thread encode (before)", direct), ("micro-batched (after)", batcher.encode)):
+            latencies = []
+
+            def timed_encode(text):
+                start = time.perf_counter()
+                encode(text)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(timed_encode, texts))
+            elapsed = time.perf_counter() - start
+            out.write(
+                f"  {label:<28} {len(texts) / elapsed:8.1f} q/s  p50={percentile(latencies, 50):7.2f}ms  "
+                f"p99={percentile(latencies, 99):7.2f}ms"
+            )
+
+        stats = batcher.stats()
+        out.write(
+            f"  {'':<28} mean batch={stats['mean_batch_size']}  queue p50={stats['queue_ms_p50']}ms  "
+            f"p99={stats['queue_ms_p99']}ms"
+        )
+
+
+def bench_rag_server(out, options):
+    """Total RSS and search p99 for N worker processes: each loading its own models/indexes vs. one RAG server."""
+    import requests
+
+    manage_py = str(settings.BASE_DIR / "manage.py")
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "reelscout.settings"))
+    env.pop("RAG_SERVER_URL", None)
+    with open(options["eval_file"], encoding="utf-8") as f:
+        queries = [case["query"] for case in json.load(f)]
+    queries = (queries * (options["per_worker"] // max(len(queries), 1) + 1))[: options["per_worker"]]
+    port = 8799
+
+    def run_workers(count, worker_env):
+        processes = [
+            subprocess.Popen(
+                [sys.executable, "-c", _SEARCH_WORKER, json.dumps(queries)],
+                env=worker_env, cwd=settings.BASE_DIR, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+            )
+            for _ in range(count)
+        ]
+        results = [json.loads(process.communicate()[0].strip().splitlines()[-1]) for process in processes]
+        # The first query of each worker pays model/index loading; report steady state.
+        latencies = [value for result in results for value in result["latencies"][1:]]
+        return sum(result["rss_mb"] for result in results), latencies
+
+    for workers in options["workers"]:
+        out.write(f"{workers} workers x {len(queries)} searches:")
+
+        rss, latencies = run_workers(workers, env)
+        out.write(
+            f"  {'in-process (before)':<22} total rss={rss:9.1f}MB  p50={percentile(latencies, 50):7.2f}ms  "
+            f"p99={percentile(latencies, 99):7.2f}ms"
+        )
+
+        server = subprocess.Popen(
+            [sys.executable, manage_py, "run_rag_server", "--port", str(port)],
+            env=env, cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            url = f"http://127.0.0.1:{port}"
+            for _ in range(600):
+                try:
+                    if requests.get(f"{url}/health", timeout=1).ok:
+                        break
+                except requests.RequestException:
+                    pass
+                time.sleep(0.5)
+            rss, latencies = run_workers(workers, dict(env, RAG_SERVER_URL=url))
+            server_rss = process_rss_mb(server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+        out.write(
+            f"  {'rag server (after)':<22} total rss={rss + server_rss:9.1f}MB  p50={percentile(latencies, 50):7.2f}ms  "
+            f"p99={percentile(latencies, 99):7.2f}ms  (server {server_rss:.1f}MB)"
+        )
@@ -0,0 +1,399 @@
+"""Index suites: resident loading, WAL ingest, metadata storage, backends, startup, filtered and quantized search."""
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+import faiss
+import numpy as np
+from django.conf import settings
+
+from ..index_factory import QUANTIZED_BACKENDS, build_index
+from ..index_store import IndexHolder, IndexSnapshot, read_wal, wal_path, write_index_atomic, write_metadata_atomic
+from ..index_writer import IndexWriter, new_id_index
+from ..metadata_store import TEXT_COLUMNS, MetadataStore
+from ..vector_store import VectorStore
+from .common import BASE_ID_OFFSET, clustered_vectors, percentile, random_vectors, report, rss_mb, timed
+
+
+def _legacy_ingest_worker(args):
+    """The pre-WAL add_reel_to_index: read the whole index + pickle, append one, rewrite both."""
+    index_path, meta_path, worker, count, dimension = args
+    vectors = random_vectors(count, dimension, seed=worker + 10)
+    for i in range(count):
+        try:
+            index = faiss.read_index(index_path)
+            with open(meta_path, "rb") as f:
+                metadata = pickle.load(f)
+        except Exception:
+            # Torn file from a concurrent writer; this entry is lost.
+            continue
+        index.add(vectors[i:i + 1])
+        metadata.append({"reel_id": worker * count + i})
+        faiss.write_index(index, index_path)
+        with open(meta_path, "wb") as f:
+            pickle.dump(metadata, f)
+
+
+def _wal_ingest_worker(args):
+    index_path, store_path, worker, count, dimension, batch_size = args
+    writer = IndexWriter(
+        index_path, MetadataStore(store_path, TEXT_COLUMNS), id_key="reel_id", batch_size=batch_size, max_delay=3600
+    )
+    vectors = random_vectors(count, dimension, seed=worker + 10)
+    for i in range(count):
+        entry_id = worker * count + i
+        writer.upsert([entry_id], [vectors[i]], [{"reel_id": entry_id}])
+
+
+def bench_text_index(out, options):
+    """Per-query latency: re-reading index + metadata every query vs. a resident IndexHolder."""
+    dimension = options["dimension"]
+    queries = random_vectors(options["queries"], dimension, seed=1)
+
+    for size in options["sizes"]:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index_path = os.path.join(tmp_dir, "bench.faiss")
+            meta_path = os.path.join(tmp_dir, "bench.pkl")
+
+            index = faiss.IndexFlatL2(dimension)
+            index.add(random_vectors(size, dimension))
+            write_index_atomic(index, index_path)
+            write_metadata_atomic(
+                [{"reel_id": i, "short_code": f"reel{i}", "location": None} for i in range(size)],
+                meta_path,
+            )
+
+            query_iter = iter(range(len(queries)))
+
+            def reload_per_query():
+                position = next(query_iter) % len(queries)
+                loaded = faiss.read_index(index_path)
+                with open(meta_path, "rb") as f:
+                    pickle.load(f)
+                loaded.search(queries[position:position + 1], 10)
+
+            store = MetadataStore(os.path.join(tmp_dir, "unused.sqlite3"), TEXT_COLUMNS)
+            holder = IndexHolder(index_path, store, legacy_meta_path=meta_path)
+            holder.get()
+            resident_iter = iter(range(len(queries)))
+
+            def resident():
+                position = next(resident_iter) % len(queries)
+                snapshot = holder.get()
+                snapshot.index.search(queries[position:position + 1], 10)
+
+            out.write(f"{size} vectors x {dimension}d:")
+            report(out, "reload per query (before)", timed(reload_per_query, len(queries)))
+            report(out, "resident holder (after)", timed(resident, len(queries)))
+
+
+def bench_ingest(out, options):
+    """Ingest throughput and lost writes with N concurrent workers, per-entry rewrite vs. WAL writer."""
+    dimension = options["dimension"]
+    per_worker = options["per_worker"]
+
+    for base_size in options["sizes"]:
+        for workers in options["workers"]:
+            out.write(f"{base_size} existing vectors, {workers} workers x {per_worker} entries:")
+            expected = base_size + workers * per_worker
+
+            for label in ("rewrite per entry (before)", "WAL + batched flush (after)"):
+                with tempfile.TemporaryDirectory() as tmp_dir:
+                    index_path = os.path.join(tmp_dir, "bench.faiss")
+                    meta_path = os.path.join(tmp_dir, "bench.pkl")
+
+                    base_vectors = random_vectors(base_size, dimension)
+                    base_ids = [BASE_ID_OFFSET + i for i in range(base_size)]
+
+                    if label.startswith("rewrite"):
+                        index = faiss.IndexFlatL2(dimension)
+                        index.add(base_vectors)
+                        write_index_atomic(index, index_path)
+                        write_metadata_atomic([{"reel_id": entry_id} for entry_id in base_ids], meta_path)
+                        jobs = [(index_path, meta_path, w, per_worker, dimension) for w in range(workers)]
+                        worker_fn = _legacy_ingest_worker
+                    else:
+                        store_path = os.path.join(tmp_dir, "bench.sqlite3")
+                        index = new_id_index(dimension)
+                        index.add_with_ids(base_vectors, np.array(base_ids, dtype="int64"))
+                        write_index_atomic(index, index_path)
+                        MetadataStore(store_path, TEXT_COLUMNS).apply(
+                            upserts={entry_id: {"reel_id": entry_id} for entry_id in base_ids}, replace_all=True
+                        )
+                        jobs = [
+                            (index_path, store_path, w, per_worker, dimension, options["batch_size"])
+                            for w in range(workers)
+                        ]
+                        worker_fn = _wal_ingest_worker
+
+                    start = time.perf_counter()
+                    with Pool(workers) as pool:
+                        pool.map(worker_fn, jobs)
+                    elapsed = time.perf_counter() - start
+
+                    stored = faiss.read_index(index_path).ntotal + len(read_wal(wal_path(index_path)))
+                    out.write(
+                        f"  {label:<28} {workers * per_worker / elapsed:8.1f} entries/s  "
+                        f"stored={stored}/{expected} lost={expected - stored}"
+                    )
+
+
+def bench_metadata(out, options):
+    """Load time, RSS and lookup latency: pickled metadata list vs. the SQLite metadata store."""
+    lookups = options["queries"]
+
+    for size in options["sizes"]:
+        rng = np.random.default_rng(2)
+        probe_ids = [int(i) for i in rng.integers(0, size, lookups)]
+        rows = {i: {"reel_id": i, "short_code": f"reel{i:08d}", "location": f"Location {i % 5000}"} for i in range(size)}
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pickle_path = os.path.join(tmp_dir, "bench.pkl")
+            store_path = os.path.join(tmp_dir, "bench.sqlite3")
+            write_metadata_atomic(list(rows.values()), pickle_path)
+            MetadataStore(store_path, TEXT_COLUMNS).apply(upserts=rows, replace_all=True)
+            del rows
+
+            out.write(f"{size} metadata entries:")
+
+            rss_before = rss_mb()
+            start = time.perf_counter()
+            store = MetadataStore(store_path, TEXT_COLUMNS)
+            store.get(0)
+            load_ms = (time.perf_counter() - start) * 1000
+            samples = timed(lambda: store.get_many(probe_ids[:10]), lookups)
+            out.write(
+                f"  {'sqlite store (after)':<28} open={load_ms:9.2f}ms  rss=+{rss_mb() - rss_before:7.1f}MB  "
+                f"lookup10 p50={percentile(samples, 50):.3f}ms"
+            )
+
+            rss_before = rss_mb()
+            start = time.perf_counter()
+            with open(pickle_path, "rb") as f:
+                metadata = pickle.load(f)
+            load_ms = (time.perf_counter() - start) * 1000
+            samples = timed(lambda: [metadata[i] for i in probe_ids[:10]], lookups)
+            out.write(
+                f"  {'pickled list (before)':<28} open={load_ms:9.2f}ms  rss=+{rss_mb() - rss_before:7.1f}MB  "
+                f"lookup10 p50={percentile(samples, 50):.3f}ms"
+            )
+            # Free the list before the next size.
+            metadata = None
+
+
+def bench_backends(out, options):
+    """Recall@k against exact search, query latency, build time and size for each index backend."""
+    dimension = options["dimension"]
+    k = options["k"]
+
+    for size in options["sizes"]:
+        corpus = clustered_vectors(size, dimension)
+        queries = clustered_vectors(options["queries"], dimension, seed=1)
+        ids = np.arange(size, dtype="int64")
+
+        exact = faiss.IndexFlatL2(dimension)
+        exact.add(corpus)
+        _, truth = exact.search(queries, k)
+
+        out.write(f"{size} vectors x {dimension}d, recall@{k}:")
+
+        for backend in options["backends"]:
+            start = time.perf_counter()
+            index = build_index(corpus, ids, backend)
+            build_s = time.perf_counter() - start
+            size_mb = len(faiss.serialize_index(index)) / (1024 * 1024)
+
+            _, found = index.search(queries, k)
+            recall = np.mean([len(set(found[i]) & set(truth[i])) / k for i in range(len(queries))])
+
+            query_iter = iter(range(len(queries)))
+
+            def single_query():
+                position = next(query_iter) % len(queries)
+                index.search(queries[position:position + 1], k)
+
+            samples = timed(single_query, len(queries))
+            out.write(
+                f"  {backend:<8} recall={recall:.3f}  p50={percentile(samples, 50):7.3f}ms  "
+                f"p99={percentile(samples, 99):7.3f}ms  build={build_s:7.2f}s  size={size_mb:8.1f}MB"
+            )
+
+
+def bench_startup(out, options):
+    """Wall time of fresh processes: manage.py check (lazy models) vs. forcing the models to load."""
+    manage_py = str(settings.BASE_DIR / "manage.py")
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "reelscout.settings"))
+    setup = "import django; django.setup(); import core.views; "
+
+    steps = (
+        ("manage.py check", [sys.executable, manage_py, "check"]),
+        ("import views (lazy)", [sys.executable, "-c", setup]),
+        (
+            "import views + load models",
+            [
+                sys.executable,
+                "-c",
+                setup + "from core.rag import embedder, image_embedder; "
+                "embedder.get_model(); image_embedder.get_model()",
+            ],
+        ),
+    )
+
+    out.write(f"Fresh process wall time over {options['repeats']} runs:")
+    for label, command in steps:
+        def launch():
+            subprocess.run(command, env=env, cwd=settings.BASE_DIR, check=True, capture_output=True)
+
+        report(out, label, timed(launch, options["repeats"]))
+
+
+def bench_filtered(out, options):
+    """District-filtered search: global top k filtered in Python vs. top k computed inside the subset."""
+    dimension = options["dimension"]
+    k = options["k"]
+    # One large district, one medium, one niche; the rest spread evenly.
+    shares = {"large": 0.30, "medium": 0.05, "niche": 0.002}
+
+    for size in options["sizes"]:
+        corpus = clustered_vectors(size, dimension)
+        queries = clustered_vectors(options["queries"], dimension, seed=1)
+        ids = np.arange(size, dtype="int64")
+        rng = np.random.default_rng(3)
+        draw = rng.random(size)
+        districts = {}
+        start = 0.0
+        for name, share in shares.items():
+            districts[name] = set(ids[(draw >= start) & (draw < start + share)].tolist())
+            start += share
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = MetadataStore(os.path.join(tmp_dir, "bench.sqlite3"), TEXT_COLUMNS)
+            store.apply(upserts={int(i): {"reel_id": int(i)} for i in ids}, replace_all=True)
+
+            for backend in options["backends"]:
+                snapshot = IndexSnapshot(build_index(corpus, ids, backend), store, version=None)
+                out.write(f"{size} vectors, {backend}, k={k}:")
+
+                for name, members in districts.items():
+                    member_ids = np.array(sorted(members), dtype="int64")
+                    subset = corpus[member_ids]
+                    truth = [
+                        set(member_ids[np.argsort(((subset - query) ** 2).sum(axis=1))[:k]].tolist())
+                        for query in queries
+                    ]
+
+                    def results(query_position, filtered):
+                        query = queries[query_position:query_position + 1]
+                        if filtered:
+                            return [meta["reel_id"] for _, meta in snapshot.search(query, k, reel_ids=members)]
+                        return [meta["reel_id"] for _, meta in snapshot.search(query, k) if meta["reel_id"] in members]
+
+                    for label, filtered in (("post-filter (before)", False), ("pre-filter (after)", True)):
+                        found = [results(position, filtered) for position in range(len(queries))]
+                        returned = np.mean([len(hits) for hits in found])
+                        recall = np.mean([len(set(hits) & truth[i]) / min(k, len(members)) for i, hits in enumerate(found)])
+                        query_iter = iter(range(10 ** 9))
+                        samples = timed(lambda: results(next(query_iter) % len(queries), filtered), len(queries))
+                        out.write(
+                            f"  {name:<6} ({len(members):7d}) {label:<20} returned={returned:5.1f}  recall={recall:.3f}  "
+                            f"p50={percentile(samples, 50):7.3f}ms  p99={percentile(samples, 99):7.3f}ms"
+                        )
+
+
+def bench_quantized(out, options):
+    """Resident size, latency and recall@k of quantized indexes, with and without exact re-ranking, vs. float32."""
+    dimension = options["dimension"]
+    k = options["k"]
+    backends = ["flat"] + [backend for backend in options["backends"] if backend in QUANTIZED_BACKENDS]
+
+    for size in options["sizes"]:
+        corpus = clustered_vectors(size, dimension)
+        queries = clustered_vectors(options["queries"], dimension, seed=1)
+        ids = np.arange(size, dtype="int64")
+
+        exact = faiss.IndexFlatL2(dimension)
+        exact.add(corpus)
+        _, truth = exact.search(queries, k)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = MetadataStore(os.path.join(tmp_dir, "bench.sqlite3"), TEXT_COLUMNS)
+            store.apply(upserts={int(i): {"reel_id": int(i)} for i in ids}, replace_all=True)
+            vectors = VectorStore(os.path.join(tmp_dir, "vectors.sqlite3"))
+            vectors.apply(upserts=zip(ids, corpus), replace_all=True)
+
+            out.write(f"{size} vectors x {dimension}d, recall@{k} against float32 exact search:")
+
+            for backend in backends:
+                index = build_index(corpus, ids, backend)
+                size_mb = len(faiss.serialize_index(index)) / (1024 * 1024)
+                variants = [("", IndexSnapshot(index, store, version=None))]
+                if backend in QUANTIZED_BACKENDS:
+                    variants.append(("+rerank", IndexSnapshot(index, store, version=None, vectors=vectors)))
+
+                for suffix, snapshot in variants:
+
+                    def top_ids(position):
+                        query = queries[position:position + 1]
+                        return [meta["reel_id"] for _, meta in snapshot.search(query, k)]
+
+                    recall = np.mean([len(set(top_ids(i)) & set(truth[i])) / k for i in range(len(queries))])
+                    query_iter = iter(range(10 ** 9))
+                    samples = timed(lambda: top_ids(next(query_iter) % len(queries)), len(queries))
+                    out.write(
+                        f"  {backend + suffix:<14} resident={size_mb:8.1f}MB  recall={recall:.3f}  "
+                        f"p50={percentile(samples, 50):7.3f}ms  p99={percentile(samples, 99):7.3f}ms"
+                    )
+
+        _quantized_churn(out, corpus, queries, ids, backends, k)
+
+
+def _quantized_churn(out, corpus, queries, ids, backends, k):
+    """Recall@k through the writer after upserting and removing 1% of the ids, pending and folded."""
+    churn = max(1, len(ids) // 100)
+    rng = np.random.default_rng(2)
+    picked = rng.choice(ids, 2 * churn, replace=False)
+    upserted, removed = picked[:churn], picked[churn:]
+    # Same seed, so the new vectors come from the corpus clusters the quantizers were trained on.
+    moved = clustered_vectors(len(ids) + churn, corpus.shape[1])[-churn:]
+
+    current = corpus.copy()
+    current[upserted] = moved
+    live = np.setdiff1d(ids, removed)
+    exact = new_id_index(corpus.shape[1])
+    exact.add_with_ids(current[live], live)
+    _, truth = exact.search(queries, k)
+
+    out.write(f"  after upserting {churn} and removing {churn} vectors, recall@{k}:")
+    for backend in backends:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index_path = os.path.join(tmp_dir, "bench.faiss")
+            store = MetadataStore(os.path.join(tmp_dir, "bench.sqlite3"), TEXT_COLUMNS)
+            vectors = VectorStore(os.path.join(tmp_dir, "vectors.sqlite3"))
+            writer = IndexWriter(index_path, store, id_key="reel_id", batch_size=10 ** 9, max_delay=1e9,
+                                 vector_store=vectors)
+            holder = IndexHolder(index_path, store, vector_store=vectors)
+
+            source = new_id_index(corpus.shape[1])
+            source.add_with_ids(corpus, ids)
+            writer.replace(
+                build_index(corpus, ids, backend), {int(i): {"reel_id": int(i)} for i in ids},
+                started_at=time.time(), source=source,
+            )
+            writer.upsert(upserted.tolist(), moved, [{"reel_id": int(i)} for i in upserted])
+            writer.remove(removed.tolist())
+
+            for stage in ("pending", "flushed"):
+                if stage == "flushed":
+                    writer.flush()
+                holder.invalidate()
+                snapshot = holder.get()
+                found = [
+                    [meta["reel_id"] for _, meta in snapshot.search(queries[i:i + 1], k)] for i in range(len(queries))
+                ]
+                recall = np.mean([len(set(hits) & set(truth[i])) / k for i, hits in enumerate(found)])
+                stale = sum(len(set(hits) & set(removed.tolist())) for hits in found)
+                out.write(f"    {backend:<8} {stage:<8} recall={recall:.3f}  removed ids returned={stale}")
@@ -0,0 +1,246 @@
+"""Retrieval suites: chat query counts, location detection and scoring, retrieval quality and chunking."""
+import json
+import time
+
+import faiss
+import numpy as np
+
+from .common import percentile, report, rss_mb, timed
+
+
+def bench_chat_queries(out, options):
+    """SQL queries and latency of the chat retrieval path (everything in run_rag before the LLM call)."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from ..rag_pipeline import _latest_reel_per_location, _select_relevant_locations
+    from ..retriever import hybrid_search
+
+    for query in options["query_text"]:
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            reels = hybrid_search(query)
+            locations = _select_relevant_locations(query, reels)
+            _latest_reel_per_location(locations)
+            # What the chat view reads when building cards.
+            [(reel.location.name, reel.location.district) for reel in reels if reel.location]
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+        out.write(
+            f"  {query[:28]:<28} queries={len(captured.captured_queries):3d}  "
+            f"reels={len(reels)}  locations={len(locations)}  {elapsed_ms:8.1f}ms"
+        )
+
+
+def bench_gazetteer(out, options):
+    """Location detection: scanning every row per query vs. the Aho-Corasick gazetteer."""
+    from ..gazetteer import Gazetteer
+
+    rng = np.random.default_rng(3)
+    syllables = ["ka", "ra", "la", "mu", "nna", "pa", "thi", "ko", "vi", "ya", "du", "kki", "ttu", "zha", "me"]
+
+    def word(parts):
+        return "".join(syllables[i] for i in rng.integers(0, len(syllables), parts))
+
+    districts = [word(3) for _ in range(14)]
+    rows = [
+        (i, f"{word(3)} {word(2)} {i}", districts[i % len(districts)], [f"{word(4)} {i}"], "Waterfall")
+        for i in range(options["locations"])
+    ]
+    queries = [f"how is the water at {rows[int(i)][1]} this week" for i in rng.integers(0, len(rows), options["queries"])]
+    queries += [f"best places to visit in {district}" for district in districts[:5]]
+
+    def naive(query):
+        query = query.lower()
+        for location_id, name, district, _, _ in rows:
+            if name and name.lower() in query:
+                return location_id
+            if district and district.lower() in query:
+                return location_id
+        return None
+
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    gazetteer = Gazetteer(rows)
+    build_s = time.perf_counter() - start
+
+    out.write(
+        f"{len(rows)} locations: gazetteer build={build_s:.2f}s rss=+{rss_mb() - rss_before:.1f}MB"
+    )
+
+    query_iter = iter(range(10 ** 9))
+    report(out, "scan every row (before)", timed(lambda: naive(queries[next(query_iter) % len(queries)]), len(queries)))
+    query_iter = iter(range(10 ** 9))
+    report(out, 
+        "aho-corasick (after)", timed(lambda: gazetteer.detect(queries[next(query_iter) % len(queries)]), len(queries))
+    )
+
+
+def bench_locations(out, options):
+    """Relevant-location scoring: str()-blob scan of every row vs. the BM25 inverted index."""
+    from types import SimpleNamespace
+
+    from ..bm25 import BM25Index, tokenize
+    from ..location_index import location_terms
+
+    rng = np.random.default_rng(4)
+    vocabulary = [f"term{i}" for i in range(20_000)]
+    categories = ["Waterfall", "Beach", "Cafe", "Viewpoint", "Temple", "Dam", "Hill Station"]
+    districts = [f"district{i}" for i in range(14)]
+
+    def words(count):
+        return " ".join(vocabulary[i] for i in rng.integers(0, len(vocabulary), count))
+
+    locations = [
+        SimpleNamespace(
+            id=i,
+            name=f"{words(2)} {i}",
+            alternate_names=[words(2)],
+            district=districts[i % len(districts)],
+            specific_area=words(1),
+            category=categories[i % len(categories)],
+            general_info={"vibe": words(6), "best_time": words(3)},
+            known_facts={"entry_fee": words(2), "timing": words(2)},
+            nearby_places=[{"name": words(2), "type": "Cafe", "distance": "2 km"}],
+        )
+        for i in range(options["locations"])
+    ]
+    queries = [f"{words(2)} {districts[int(rng.integers(0, len(districts)))]} waterfall" for _ in range(options["queries"])]
+
+    def scan(query):
+        query_text = query.lower()
+        query_tokens = [token for token in query_text.split() if len(token) >= 3]
+        scored = []
+        for location in locations:
+            blob = " ".join(
+                [str(location.general_info), str(location.known_facts), str(location.nearby_places)]
+            ).lower()
+            score = sum(1 for token in query_tokens if token in blob)
+            for field in [location.name, location.district, location.specific_area, location.category]:
+                value = str(field).lower()
+                if value in query_text:
+                    score += 8
+                elif any(token in value for token in query_tokens):
+                    score += 2
+            if score:
+                scored.append((score, location.id))
+        return sorted(scored, reverse=True)[:8]
+
+    start = time.perf_counter()
+    index = BM25Index()
+    for location in locations:
+        index.upsert(location.id, location_terms(location))
+    build_s = time.perf_counter() - start
+
+    update_samples = timed(lambda: index.upsert(0, location_terms(locations[0])), 100)
+
+    out.write(f"{len(locations)} locations: BM25 build={build_s:.2f}s")
+    report(out, "single-location update", update_samples)
+    scan_queries = queries[: max(5, len(queries) // 10)]
+    query_iter = iter(range(10 ** 9))
+    report(out, "scan + str() blobs (before)", timed(lambda: scan(scan_queries[next(query_iter) % len(scan_queries)]), len(scan_queries)))
+    query_iter = iter(range(10 ** 9))
+    report(out, 
+        "bm25 inverted index (after)",
+        timed(lambda: index.search(tokenize(queries[next(query_iter) % len(queries)]), 8), len(queries)),
+    )
+
+
+def bench_retrieval_eval(out, options):
+    """Recall@k of each retriever and of the fused ranking on a labelled query set, plus fused latency."""
+    from core.comment_utils import normalize_geo_label
+    from core.models import ScrapedReel
+    from ..frame_retriever import search_frames
+    from ..reel_index import reel_index
+    from ..retriever import fused_search, semantic_search
+
+    k = options["k"]
+    with open(options["eval_file"], encoding="utf-8") as f:
+        cases = json.load(f)
+
+    def location_names(reel_ids):
+        reels = ScrapedReel.objects.select_related("location").in_bulk(reel_ids)
+        return {normalize_geo_label(reels[i].location.name) for i in reel_ids if i in reels and reels[i].location}
+
+    retrievers = {
+        "dense": lambda q: location_names([meta["reel_id"] for meta in semantic_search(q, k=k)]),
+        "frame": lambda q: location_names([hit["reel_id"] for hit in search_frames(q, k=k)]),
+        "lexical": lambda q: location_names([reel_id for reel_id, _ in reel_index.search(q, k=k)]),
+        "fused": lambda q: {
+            normalize_geo_label(reel.location.name) for reel, _, _ in fused_search(q, k=k) if reel.location
+        },
+    }
+
+    recalls = {name: [] for name in retrievers}
+    for case in cases:
+        expected = {normalize_geo_label(name) for name in case["expected_locations"]}
+        for name, retrieve in retrievers.items():
+            found = retrieve(case["query"])
+            recalls[name].append(len(expected & found) / len(expected))
+
+    out.write(f"{len(cases)} labelled queries, recall@{k} by expected location:")
+    for name, values in recalls.items():
+        out.write(f"  {name:<28} recall={np.mean(values):.3f}")
+
+    case_iter = iter(range(10 ** 9))
+    report(out, "fused_search latency", timed(lambda: fused_search(cases[next(case_iter) % len(cases)]["query"], k=k), len(cases)))
+
+
+def bench_chunking(out, options):
+    """Index size, recall@k and latency of one vector per reel vs. chunked multi-vector documents."""
+    from core.comment_utils import normalize_geo_label
+    from core.models import ScrapedReel
+    from ..chunking import build_reel_chunks, max_chunks_per_reel
+    from ..document_builder import build_reel_document
+    from ..embedder import embed_documents, embed_text
+
+    k = options["k"]
+    with open(options["eval_file"], encoding="utf-8") as f:
+        cases = json.load(f)
+    query_vectors = np.vstack([embed_text(case["query"]) for case in cases]).astype("float32")
+
+    reels = list(
+        ScrapedReel.objects.filter(is_processed=True).select_related("location").order_by("id")[: options["max_reels"]]
+    )
+    out.write(f"{len(reels)} reels, {len(cases)} labelled queries, max {max_chunks_per_reel()} chunks/reel:")
+
+    modes = (
+        ("document", lambda reel: [build_reel_document(reel)], 1),
+        ("chunked", build_reel_chunks, 4),
+    )
+    for mode, build, overfetch in modes:
+        owners = []
+        texts = []
+        for reel in reels:
+            documents = build(reel)
+            texts.extend(documents)
+            owners.extend([reel] * len(documents))
+        if not texts:
+            out.write("  no processed reels to index")
+            return
+
+        vectors = embed_documents(texts)
+        index = faiss.IndexFlatIP(vectors.shape[1])
+        index.add(vectors)
+
+        def top_reels(position):
+            _, labels = index.search(query_vectors[position:position + 1], k * overfetch)
+            pooled = []
+            for label in labels[0]:
+                reel = owners[label] if label >= 0 else None
+                if reel is not None and reel not in pooled:
+                    pooled.append(reel)
+            return pooled[:k]
+
+        recalls = []
+        for position, case in enumerate(cases):
+            expected = {normalize_geo_label(name) for name in case["expected_locations"]}
+            found = {normalize_geo_label(reel.location.name) for reel in top_reels(position) if reel.location}
+            recalls.append(len(expected & found) / len(expected))
+
+        query_iter = iter(range(10 ** 9))
+        samples = timed(lambda: top_reels(next(query_iter) % len(cases)), len(cases) * 5)
+        out.write(
+            f"  {mode:<9} vectors={index.ntotal:8d}  size={index.ntotal * index.d * 4 / (1024 * 1024):7.1f}MB  "
+            f"recall@{k}={np.mean(recalls):.3f}  p50={percentile(samples, 50):.3f}ms  p99={percentile(samples, 99):.3f}ms"
+        )
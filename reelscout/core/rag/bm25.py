@@ -0,0 +1,110 @@
+# bm25.py
+"""
+In-memory inverted index with Okapi BM25 scoring.
+
+Documents are {term: weight} maps (weights let callers count a name match
+more than a fact match). Postings are {term: {doc_id: weight}}, so a search
+only touches the documents that contain a query term, and add/remove are
+O(terms in the document), which keeps incremental updates cheap.
+"""
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+# Words that show up in most queries and documents and carry no place information.
+STOPWORDS = frozenset(
+    "a an and are at be best can for from how i in is it me near of on or place places show the "
+    "there this to visit what when where which who with".split()
+)
+
+
+def _stem(token):
+    # Plural folding only ("waterfalls" -> "waterfall"); applied to documents and queries alike.
+    if len(token) > 4 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    return [
+        _stem(token) for token in _TOKEN_RE.findall(str(text or "").lower())
+        if len(token) >= 2 and token not in STOPWORDS
+    ]
+
+
+class BM25Index:
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._docs = {}
+        self._lengths = {}
+        self._postings = {}
+        self._total_length = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._docs
+
+    def doc_ids(self):
+        return list(self._docs)
+
+    def _remove_locked(self, doc_id):
+        terms = self._docs.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(doc_id)
+
+    def upsert(self, doc_id, term_weights):
+        """Insert or replace a document; term_weights maps term -> weighted frequency."""
+        term_weights = {term: float(weight) for term, weight in term_weights.items() if weight > 0}
+        with self._lock:
+            self._remove_locked(doc_id)
+            if not term_weights:
+                return
+            self._docs[doc_id] = term_weights
+            length = sum(term_weights.values())
+            self._lengths[doc_id] = length
+            self._total_length += length
+            for term, weight in term_weights.items():
+                self._postings.setdefault(term, {})[doc_id] = weight
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove_locked(doc_id)
+
+    def search(self, query_terms, k=10, doc_filter=None):
+        """Return [(doc_id, score)] for the k best documents containing any query term."""
+        query_terms = Counter(query_terms)
+        scores = {}
+        with self._lock:
+            doc_count = len(self._docs)
+            if not doc_count:
+                return []
+            average_length = self._total_length / doc_count
+
+            for term, query_weight in query_terms.items():
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, tf in posting.items():
+                    if doc_filter is not None and doc_id not in doc_filter:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + query_weight * idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
@@ -0,0 +1,115 @@
+# chunking.py
+"""
+Chunked ("multi-vector") text documents for reels.
+
+build_reel_document squashes a whole reel into one blob, and MiniLM only
+reads its first 256 word pieces, so long transcripts and facts never reach the
+index. In chunked mode (RAG_TEXT_INDEX_MODE = "chunked") each reel is embedded
+as several short chunks instead: summary, caption, facts, comments and
+overlapping transcript windows, each prefixed with the reel's location header.
+
+Chunk vectors are stored under id reel_id * CHUNK_STRIDE + chunk_number, so the
+owning reel is id // CHUNK_STRIDE, and every chunk row in the metadata store
+carries reel_id. At query time hits are max-pooled per reel (see
+retriever.semantic_search). Switching modes needs a full rebuild.
+"""
+from django.conf import settings
+
+# Upper bound on chunks per reel; RAG_MAX_CHUNKS_PER_REEL must stay below it.
+CHUNK_STRIDE = 64
+
+# ~180 words stays under MiniLM's 256 word-piece limit with the header.
+WINDOW_WORDS = 180
+WINDOW_OVERLAP = 30
+
+
+def chunked_mode():
+    return getattr(settings, "RAG_TEXT_INDEX_MODE", "document") == "chunked"
+
+
+def max_chunks_per_reel():
+    return max(1, min(getattr(settings, "RAG_MAX_CHUNKS_PER_REEL", 16), CHUNK_STRIDE))
+
+
+def chunk_id(reel_id, chunk_number):
+    return reel_id * CHUNK_STRIDE + chunk_number
+
+
+def chunk_id_range(reel_id):
+    """[first, last) ids a reel's chunks can occupy."""
+    return reel_id * CHUNK_STRIDE, (reel_id + 1) * CHUNK_STRIDE
+
+
+def reel_id_of(entry_id):
+    return entry_id // CHUNK_STRIDE
+
+
+def _windows(text, size=WINDOW_WORDS, overlap=WINDOW_OVERLAP):
+    words = str(text or "").split()
+    if not words:
+        return []
+    step = max(size - overlap, 1)
+    return [" ".join(words[start:start + size]) for start in range(0, max(len(words) - overlap, 1), step)]
+
+
+def _kv_lines(payload):
+    if not isinstance(payload, dict):
+        return ""
+    return "\n".join(
+        f"{str(key).replace('_', ' ')}: {value}"
+        for key, value in payload.items()
+        if str(key).strip() and str(value).strip()
+    )
+
+
+def build_reel_chunks(reel, max_chunks=None):
+    """
+    Return the reel's chunk texts, most informative sections first, capped at
+    max_chunks (RAG_MAX_CHUNKS_PER_REEL by default).
+    """
+    max_chunks = max_chunks or max_chunks_per_reel()
+
+    location = reel.location
+    location_name = location.name if location else ""
+    district = location.district if location else ""
+    posted_date = reel.posted_at.strftime('%Y-%m-%d') if reel.posted_at else "Unknown Date"
+    header = f"Location: {location_name}\nDistrict: {district}\nDate Posted: {posted_date}"
+
+    sections = []
+
+    if reel.ai_summary:
+        sections.append(("Summary", reel.ai_summary))
+
+    for window in _windows(reel.raw_caption):
+        sections.append(("Caption", window))
+
+    if location:
+        facts = "\n".join(part for part in (_kv_lines(location.general_info), _kv_lines(location.known_facts)) if part)
+        for window in _windows(facts):
+            sections.append(("Facts", window))
+
+    comments = reel.normalized_comments if isinstance(reel.normalized_comments, list) else []
+    comment_text = " | ".join(
+        str(comment.get("text", "")).strip()
+        for comment in comments
+        if isinstance(comment, dict) and str(comment.get("text", "")).strip()
+    )
+    for window in _windows(comment_text):
+        sections.append(("Community Comments", window))
+
+    for window in _windows(reel.transcript_text):
+        sections.append(("Transcript", window))
+
+    if not sections:
+        sections.append(("Summary", ""))
+
+    # Keep the first window of every section kind before any second windows,
+    # so the cap drops tail transcript windows rather than whole sections.
+    first_seen = []
+    rest = []
+    kinds = set()
+    for label, text in sections:
+        (rest if label in kinds else first_seen).append((label, text))
+        kinds.add(label)
+
+    return [f"{header}\n{label} (As of {posted_date}):\n{text}".strip() for label, text in (first_seen + rest)[:max_chunks]]
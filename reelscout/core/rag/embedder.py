@@ -1,17 +1,81 @@
-from sentence_transformers import SentenceTransformer
+import threading
+
 import numpy as np
 
-# Load embedding model once
-model = SentenceTransformer("all-MiniLM-L6-v2")
+from .batcher import MicroBatcher, batching_enabled
+from .embedding_cache import embedding_cache, text_digest
+from .model_loader import cache_key, load_model
+from .rag_server import rag_client
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Loaded on first use (or by warmup.warm_up), not at import time.
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """Return the embedding model, loading it once; safe to call from several threads."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = load_model(MODEL_NAME)
+    return _model
 
 
 def embed_text(text: str):
     """
     Convert text into a vector embedding.
+    Concurrent callers are batched into one encode call (see batcher).
     """
     if not text:
         text = ""
 
-    embedding = model.encode(text, normalize_embeddings=True)
+    if batching_enabled():
+        return text_batcher.encode(text)
+
+    return _embed_queries([text])[0]
+
+
+def _embed_queries(texts):
+    """
+    Query embeddings come from the shared daemon when one is configured (see
+    rag_server). Documents never do: a large batch would time out there and
+    mark the daemon down for live queries too.
+    """
+    texts = [text or "" for text in texts]
+
+    remote = rag_client.embed("text", texts)
+    if remote is not None:
+        return remote
+
+    return embed_texts(texts, batch_size=len(texts))
+
+
+def embed_texts(texts, batch_size=64):
+    """
+    Embed many texts in one encode call, in process. Returns a float32 array, one row per text.
+    """
+    texts = [text or "" for text in texts]
+
+    embeddings = get_model().encode(texts, batch_size=batch_size, normalize_embeddings=True)
+
+    return np.asarray(embeddings, dtype="float32")
+
+
+text_batcher = MicroBatcher(_embed_queries, name="text-embed")
+
+
+def embed_documents(texts, batch_size=64):
+    """
+    Like embed_texts, but reuses cached vectors for texts embedded before.
+    Use for index documents; queries go through embed_text.
+    """
+    texts = [text or "" for text in texts]
 
-    return np.array(embedding)
\ No newline at end of file
+    return embedding_cache.embed(
+        cache_key(MODEL_NAME, get_model()),
+        [text_digest(text) for text in texts],
+        lambda positions: embed_texts([texts[position] for position in positions], batch_size=batch_size),
+    )
@@ -0,0 +1,157 @@
+# embedding_cache.py
+"""
+Persistent embedding cache keyed by (model, sha256 of the input), where
+model also names the inference backend (see model_loader.cache_key).
+
+Text is hashed as UTF-8, images by their file bytes, so an unchanged reel
+document or frame is never re-encoded by a rebuild or re-index. Entries carry
+a last-used timestamp; once the table grows past max_entries the least
+recently used rows are evicted.
+
+The file lives at RAG_EMBEDDING_CACHE_PATH (by default next to manage.py), so
+web workers, the RAG server and management commands share one cache whatever
+directory they start in.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+CACHE_NAME = "embedding_cache.sqlite3"
+
+# Evict a little below the limit so eviction does not run after every insert.
+EVICT_HEADROOM = 0.9
+
+
+def text_digest(text):
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def bytes_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def default_cache_path():
+    return getattr(settings, "RAG_EMBEDDING_CACHE_PATH", None) or os.path.join(settings.BASE_DIR, CACHE_NAME)
+
+
+class EmbeddingCache:
+
+    def __init__(self, path=None, max_entries=None):
+        self._path = path
+        self.max_entries = max_entries or getattr(settings, "RAG_EMBEDDING_CACHE_MAX_ENTRIES", 100_000)
+        self.reused = 0
+        self.computed = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+
+    @property
+    def path(self):
+        return self._path or default_cache_path()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, digest TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL, "
+            "PRIMARY KEY (model, digest)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        conn.commit()
+
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get_many(self, model, digests):
+        """Return {digest: vector} for cached digests and mark them as recently used."""
+        digests = list(dict.fromkeys(digests))
+        if not digests:
+            return {}
+
+        conn = self._connection()
+        found = {}
+        # Stay under SQLite's bound-parameter limit.
+        for start in range(0, len(digests), 500):
+            chunk = digests[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            rows = conn.execute(
+                f"SELECT digest, vector FROM embeddings WHERE model = ? AND digest IN ({placeholders})",
+                [model] + chunk,
+            ).fetchall()
+            for digest, blob in rows:
+                found[digest] = np.frombuffer(blob, dtype="float32")
+
+        if found:
+            now = time.time()
+            with conn:
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND digest = ?",
+                    [(now, model, digest) for digest in found],
+                )
+        return found
+
+    def put_many(self, model, vectors):
+        """Store {digest: vector}, evicting least recently used rows past max_entries."""
+        if not vectors:
+            return
+
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, digest, vector, last_used) VALUES (?, ?, ?, ?)",
+                [
+                    (model, digest, np.asarray(vector, dtype="float32").tobytes(), now)
+                    for digest, vector in vectors.items()
+                ],
+            )
+
+            count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE (model, digest) IN "
+                    "(SELECT model, digest FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - int(self.max_entries * EVICT_HEADROOM),),
+                )
+
+    def embed(self, model, digests, compute):
+        """
+        Return a float32 array with one vector per digest. compute(positions)
+        is called once with the positions of the cache misses and must return
+        their vectors in that order.
+        """
+        if not digests:
+            return np.zeros((0, 0), dtype="float32")
+
+        cached = self.get_many(model, digests)
+        missing = [position for position, digest in enumerate(digests) if digest not in cached]
+
+        computed = {}
+        if missing:
+            vectors = np.asarray(compute(missing), dtype="float32")
+            computed = {digests[position]: vector for position, vector in zip(missing, vectors)}
+            self.put_many(model, computed)
+
+        with self._stats_lock:
+            self.reused += len(digests) - len(missing)
+            self.computed += len(missing)
+
+        lookup = {**cached, **computed}
+        return np.vstack([lookup[digest] for digest in digests]).astype("float32")
+
+    def stats(self):
+        return {"reused": self.reused, "computed": self.computed}
+
+
+embedding_cache = EmbeddingCache()
@@ -1,31 +1,69 @@
-import faiss
-import pickle
 import numpy as np
 
-from core.models import ScrapedReel
-from .embedder import embed_text
+from core.models import ReelFrame
+from .index_store import frame_index
+from .query_cache import query_embeddings
+from .rag_server import rag_client
 
+# Frames fetched per requested reel, so several frames of one reel still leave room for others.
+FRAME_OVERFETCH = 4
 
-def search_frames(query, k=5):
-    index = faiss.read_index("frame_index.faiss")
 
-    with open("frame_metadata.pkl", "rb") as f:
-        metadata = pickle.load(f)
-    from .image_embedder import embed_image_text
-    query_vector = embed_image_text(query)
+def frame_index_hits(query, k, reel_ids=None):
+    """[(distance, metadata)] from this process's frame index (the RAG server answers with this too)."""
+    snapshot = frame_index.get()
+    if snapshot is None:
+        return []
+
+    from .image_embedder import MODEL_NAME, embed_image_text
+    query_vector = query_embeddings.get(MODEL_NAME, query, embed_image_text)
 
     query_vector = np.array([query_vector]).astype("float32")
 
-    distances, indices = index.search(query_vector, k)
+    return snapshot.search(query_vector, k, reel_ids=reel_ids)
+
+
+def search_frames(query, k=5, reel_ids=None):
+    """
+    Search the CLIP frame index and aggregate hits per reel, optionally only
+    the frames of reel_ids.
+
+    Returns up to k dicts ordered by score:
+    {"reel_id": int, "score": float, "timestamps": [float, ...]}
+    where score is the best frame similarity for that reel. Reels are not
+    loaded here; the caller hydrates them together with its other candidates
+    (see retriever._fuse).
+    """
+    frame_hits = rag_client.search("frame", query, k * FRAME_OVERFETCH, reel_ids)
+    if frame_hits is None:
+        frame_hits = frame_index_hits(query, k * FRAME_OVERFETCH, reel_ids)
+
+    hits = {}
+    missing_timestamps = []
 
-    reels = []
+    for distance, meta in frame_hits:
+        score = 1.0 / (1.0 + distance)
 
-    for idx in indices[0]:
+        hit = hits.setdefault(meta["reel_id"], {"reel_id": meta["reel_id"], "score": score, "timestamps": [], "frame_ids": []})
+        hit["score"] = max(hit["score"], score)
+        hit["frame_ids"].append(meta["frame_id"])
+        if "timestamp" in meta:
+            hit["timestamps"].append(meta["timestamp"])
+        else:
+            missing_timestamps.append(meta["frame_id"])
 
-        meta = metadata[idx]
+    if not hits:
+        return []
 
-        reel = ScrapedReel.objects.get(id=meta["reel_id"])
+    # Older metadata files have no timestamps; fill them in with one query.
+    if missing_timestamps:
+        timestamps = dict(ReelFrame.objects.filter(id__in=missing_timestamps).values_list("id", "timestamp"))
+        for hit in hits.values():
+            hit["timestamps"] = [timestamps[fid] for fid in hit["frame_ids"] if fid in timestamps] or hit["timestamps"]
 
-        reels.append(reel)
+    ranked = sorted(hits.values(), key=lambda item: item["score"], reverse=True)[:k]
 
-    return reels
\ No newline at end of file
+    return [
+        {"reel_id": hit["reel_id"], "score": hit["score"], "timestamps": sorted(hit["timestamps"])}
+        for hit in ranked
+    ]
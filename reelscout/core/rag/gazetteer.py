@@ -0,0 +1,215 @@
+# gazetteer.py
+"""
+Multi-pattern matcher for location names, aliases and districts in queries.
+
+An Aho-Corasick automaton over every normalized name/alias/district finds all
+mentions in one pass over the query, whatever the number of locations. Queries
+and patterns go through normalize_geo_label and are matched word by word, so
+punctuation and case do not matter and a mention must cover whole words ("ela"
+does not match inside "elaborate").
+
+It also keeps location categories ("Waterfall", "Beach") per normalized label,
+so retrieval can scope a search to the districts and categories a query names
+(see search_filters).
+
+The automaton is built once per process and cached in location_gazetteer.
+Location saves/deletes invalidate it (see core/signals.py); other processes
+notice changes through a cheap count/last_updated fingerprint check.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.db.models import Count, Max
+
+from core.comment_utils import normalize_geo_label
+from core.models import Location
+from .bm25 import tokenize
+
+NAME = "name"
+ALIAS = "alias"
+DISTRICT = "district"
+
+class AhoCorasick:
+    """
+    Aho-Corasick over sequences of hashable symbols. The gazetteer feeds it
+    word tokens rather than characters: word boundaries come for free and the
+    trie has a node per word instead of per letter.
+    """
+
+    def __init__(self):
+        # Transitions live in one dict keyed by (node, symbol); far smaller than a dict per node.
+        self._goto = {}
+        self._fail = [0]
+        self._outputs = {}
+        self._dict_link = [0]
+        self._values = []
+
+    def add(self, pattern, value):
+        node = 0
+        for symbol in pattern:
+            child = self._goto.get((node, symbol))
+            if child is None:
+                child = len(self._fail)
+                self._goto[(node, symbol)] = child
+                self._fail.append(0)
+                self._dict_link.append(0)
+            node = child
+        self._outputs.setdefault(node, []).append(len(self._values))
+        self._values.append((len(pattern), value))
+
+    def build(self):
+        """Compute failure and output links breadth first; call once after the last add()."""
+        children = defaultdict(list)
+        for (node, symbol), child in self._goto.items():
+            children[node].append((symbol, child))
+
+        queue = deque(child for _, child in children.get(0, ()))
+
+        while queue:
+            node = queue.popleft()
+            for symbol, child in children.get(node, ()):
+                queue.append(child)
+
+                fallback = self._fail[node]
+                while fallback and (fallback, symbol) not in self._goto:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto.get((fallback, symbol), 0)
+
+                # Nearest node on the failure chain that ends a pattern.
+                failure = self._fail[child]
+                self._dict_link[child] = failure if failure in self._outputs else self._dict_link[failure]
+        return self
+
+    def iter_matches(self, sequence):
+        """Yield (start, end, value) for every pattern occurrence in sequence."""
+        node = 0
+        goto = self._goto
+        fail = self._fail
+        for position, symbol in enumerate(sequence):
+            while node and (node, symbol) not in goto:
+                node = fail[node]
+            node = goto.get((node, symbol), 0)
+
+            match_node = node if node in self._outputs else self._dict_link[node]
+            while match_node:
+                for pattern_id in self._outputs[match_node]:
+                    length, value = self._values[pattern_id]
+                    yield position + 1 - length, position + 1, value
+                match_node = self._dict_link[match_node]
+
+
+class Gazetteer:
+
+    def __init__(self, rows):
+        """rows: iterable of (location_id, name, district, alternate_names, category)."""
+        self.automaton = AhoCorasick()
+        self.district_members = defaultdict(list)
+        # Normalized label -> raw spellings stored on Location rows, for exact ORM filters.
+        self.district_names = defaultdict(set)
+        self.category_names = defaultdict(set)
+
+        for location_id, name, district, aliases, category in rows:
+            label = normalize_geo_label(name)
+            if label:
+                self.automaton.add(label.split(), (NAME, location_id))
+            for alias in aliases if isinstance(aliases, list) else []:
+                alias_label = normalize_geo_label(alias)
+                if alias_label and alias_label != label:
+                    self.automaton.add(alias_label.split(), (ALIAS, location_id))
+            district_label = normalize_geo_label(district)
+            if district_label:
+                self.district_members[district_label].append(location_id)
+                self.district_names[district_label].add(district)
+            category_label = normalize_geo_label(category)
+            if category_label:
+                self.category_names[category_label].add(category)
+
+        # Stemmed like BM25, so "waterfalls" names the "Waterfall" category.
+        self.category_terms = {
+            label: frozenset(tokenize(label)) for label in self.category_names if tokenize(label)
+        }
+
+        for district_label in self.district_members:
+            self.automaton.add(district_label.split(), (DISTRICT, district_label))
+        self.automaton.build()
+
+    def find(self, query):
+        """All mentions as [(kind, location_id_or_district, matched_text)]."""
+        tokens = normalize_geo_label(query).split()
+        return [
+            (kind, target, " ".join(tokens[start:end]))
+            for start, end, (kind, target) in self.automaton.iter_matches(tokens)
+        ]
+
+    def location_ids(self, query, limit=None):
+        """
+        Ids of locations mentioned in the query: named/aliased locations first
+        (longest mention first), then the members of any mentioned district.
+        """
+        ordered = self.named_location_ids(query)
+        seen = set(ordered)
+        for district in self.mentioned_districts(query):
+            for location_id in sorted(self.district_members[district]):
+                if location_id not in seen:
+                    seen.add(location_id)
+                    ordered.append(location_id)
+        return ordered[:limit] if limit else ordered
+
+    def named_location_ids(self, query):
+        """Ids of locations whose name or alias appears in the query, longest mention first."""
+        named = {}
+        for kind, target, matched in self.find(query):
+            if kind != DISTRICT:
+                named[target] = max(named.get(target, 0), len(matched))
+        return sorted(named, key=lambda location_id: (-named[location_id], location_id))
+
+    def mentioned_districts(self, query):
+        return list(dict.fromkeys(target for kind, target, _ in self.find(query) if kind == DISTRICT))
+
+    def mentioned_categories(self, query):
+        query_terms = set(tokenize(query))
+        return sorted(label for label, terms in self.category_terms.items() if terms <= query_terms)
+
+    def detect(self, query):
+        """The single best location id for the query, or None."""
+        ids = self.location_ids(query, limit=1)
+        return ids[0] if ids else None
+
+
+class GazetteerHolder:
+
+    def __init__(self, check_interval=30.0):
+        self.check_interval = check_interval
+        self._gazetteer = None
+        self._fingerprint = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _current_fingerprint(self):
+        stats = Location.objects.aggregate(count=Count("id"), latest=Max("last_updated"))
+        return stats["count"], stats["latest"]
+
+    def get(self):
+        if self._gazetteer is not None and time.monotonic() - self._last_check < self.check_interval:
+            return self._gazetteer
+
+        with self._lock:
+            if self._gazetteer is not None and time.monotonic() - self._last_check < self.check_interval:
+                return self._gazetteer
+
+            fingerprint = self._current_fingerprint()
+            self._last_check = time.monotonic()
+            if self._gazetteer is None or fingerprint != self._fingerprint:
+                started = time.perf_counter()
+                rows = Location.objects.values_list("id", "name", "district", "alternate_names", "category").iterator()
+                self._gazetteer = Gazetteer(rows)
+                self._fingerprint = fingerprint
+                print(f"🗺️ Location gazetteer built for {fingerprint[0]} locations in {time.perf_counter() - started:.2f}s")
+            return self._gazetteer
+
+    def invalidate(self):
+        self._last_check = 0.0
+
+
+location_gazetteer = GazetteerHolder()
@@ -1,18 +1,92 @@
-from sentence_transformers import SentenceTransformer
+import io
+import threading
+
 from PIL import Image
+import numpy as np
+
+from .batcher import MicroBatcher, batching_enabled
+from .embedding_cache import bytes_digest, embedding_cache
+from .model_loader import cache_key, load_model
+from .rag_server import rag_client
+
+MODEL_NAME = "clip-ViT-B-32"
+
+# Loaded on first use (or by warmup.warm_up), not at import time.
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """Return the CLIP model, loading it once; safe to call from several threads."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = load_model(MODEL_NAME, onnx_capable=False)
+    return _model
 
-model = SentenceTransformer("clip-ViT-B-32")
+
+def load_image(image_path):
+    """
+    Read and decode an image for embedding.
+    Returns (sha256 of the file bytes, RGB image), or (None, None) if the file is missing or unreadable.
+    """
+    try:
+        with open(image_path, "rb") as f:
+            data = f.read()
+        return bytes_digest(data), Image.open(io.BytesIO(data)).convert("RGB")
+    except (OSError, ValueError):
+        return None, None
 
 def embed_image(image_path):
 
     image = Image.open(image_path).convert("RGB")
 
-    embedding = model.encode(image)
+    embedding = get_model().encode(image)
+
+    return np.asarray(embedding, dtype="float32")
+
+def embed_images(images, batch_size=32):
+    """Embed already-decoded PIL images in one encode call."""
+
+    embeddings = get_model().encode(list(images), batch_size=batch_size)
+
+    return np.asarray(embeddings, dtype="float32")
 
-    return embedding
+def embed_loaded_images(digests, images, batch_size=32):
+    """Embed images from load_image, reusing cached vectors for unchanged files."""
+
+    return embedding_cache.embed(
+        cache_key(MODEL_NAME, get_model()),
+        list(digests),
+        lambda positions: embed_images([images[position] for position in positions], batch_size=batch_size),
+    )
 
 def embed_image_text(text):
 
-    embedding = model.encode([text])
+    if batching_enabled():
+        return image_text_batcher.encode(text)
+
+    return _embed_queries([text])[0]
+
+def _embed_queries(texts):
+    """Query embeddings come from the shared daemon when one is configured; batches stay in process."""
+
+    texts = [text or "" for text in texts]
+
+    remote = rag_client.embed("clip_text", texts)
+    if remote is not None:
+        return remote
+
+    return embed_image_texts(texts, batch_size=len(texts))
+
+def embed_image_texts(texts, batch_size=64):
+    """Embed many texts into CLIP space in one encode call, in process."""
+
+    texts = [text or "" for text in texts]
+
+    embeddings = get_model().encode(texts, batch_size=batch_size)
+
+    return np.asarray(embeddings, dtype="float32")
 
-    return embedding[0]
\ No newline at end of file
+image_text_batcher = MicroBatcher(_embed_queries, name="clip-text-embed")
@@ -0,0 +1,242 @@
+# index_factory.py
+"""
+Index backends for full rebuilds.
+
+    flat     exact L2 (IndexFlatL2), the default for small corpora and for frames
+    flat_ip  exact inner product; text vectors are normalized, so ranking matches L2
+    hnsw     graph index (IndexHNSWFlat); fast, no training, but cannot remove ids
+    fp16     exhaustive scan over float16 codes; half the memory of flat
+    sq8      exhaustive scan over 8-bit scalar-quantized codes; a quarter of flat
+    ivfpq    inverted lists + product quantization; trained, compact, approximate
+
+"auto" picks by corpus size (see RAG_HNSW_MIN_VECTORS / RAG_IVFPQ_MIN_VECTORS).
+Every backend is wrapped in IndexIDMap2, so labels stay reel/frame ids.
+
+Inner-product indexes return similarities; IndexSnapshot converts them to
+squared L2 (2 - 2 * ip for unit vectors) so callers always see distances.
+Backends that cannot remove ids keep stale vectors until the next compaction:
+HNSW has no removal, and IVF lists keep their own sequential ids, which
+IndexIDMap2 cannot renumber after a removal, so removing from IVF would shift
+the labels of unrelated entries. Removed ids are gone from the metadata store,
+so searches skip them; an upserted id is stored twice, and searches score it
+by its newest vector (see superseded_ids and IndexSnapshot).
+
+Quantized backends (fp16, sq8, ivfpq) keep their float32 vectors in a
+vector_store sidecar on disk, and the top candidates of every search are
+re-ranked exactly against them (see IndexSnapshot). "auto" only picks ivfpq;
+fp16 and sq8 are opt-in through RAG_INDEX_BACKEND / RAG_FRAME_INDEX_BACKEND.
+"""
+import math
+
+import faiss
+import numpy as np
+from django.conf import settings
+
+BACKENDS = ("flat", "flat_ip", "hnsw", "fp16", "sq8", "ivfpq")
+
+# Backends that store lossy codes; searches re-rank their candidates exactly.
+QUANTIZED_BACKENDS = ("fp16", "sq8", "ivfpq")
+
+# Backends that need normalized vectors to rank like L2.
+INNER_PRODUCT_BACKENDS = ("flat_ip",)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def choose_backend(count, normalized, backend=None):
+    """Resolve "auto" (or None) to a concrete backend for `count` vectors."""
+    backend = backend or _setting("RAG_INDEX_BACKEND", "auto")
+    if backend != "auto":
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown index backend: {backend}")
+        if backend in INNER_PRODUCT_BACKENDS and not normalized:
+            return "flat"
+        return backend
+
+    if count >= _setting("RAG_IVFPQ_MIN_VECTORS", 1_000_000):
+        return "ivfpq"
+    if count >= _setting("RAG_HNSW_MIN_VECTORS", 50_000):
+        return "hnsw"
+    return "flat_ip" if normalized else "flat"
+
+
+def _pq_subquantizers(dimension):
+    # Aim for 8 dimensions per sub-quantizer; m must divide d.
+    for m in range(max(dimension // 8, 1), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+def _ivf_lists(count):
+    # ~4 * sqrt(n) lists, but keep at least 39 training points per centroid.
+    return max(1, min(int(4 * math.sqrt(count)), count // 39))
+
+
+def build_index(vectors, ids, backend):
+    """Build an ID-mapped index of the given backend from all vectors, training it if needed."""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    ids = np.asarray(ids, dtype="int64")
+    dimension = vectors.shape[1]
+
+    if backend == "flat":
+        inner = faiss.IndexFlatL2(dimension)
+    elif backend == "flat_ip":
+        inner = faiss.IndexFlatIP(dimension)
+    elif backend == "hnsw":
+        inner = faiss.IndexHNSWFlat(dimension, _setting("RAG_HNSW_M", 32))
+        inner.hnsw.efConstruction = _setting("RAG_HNSW_EF_CONSTRUCTION", 80)
+    elif backend == "fp16":
+        inner = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16)
+    elif backend == "sq8":
+        inner = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit)
+    elif backend == "ivfpq":
+        nlist = _ivf_lists(len(vectors))
+        quantizer = faiss.IndexFlatL2(dimension)
+        inner = faiss.IndexIVFPQ(quantizer, dimension, nlist, _pq_subquantizers(dimension), 8)
+    else:
+        raise ValueError(f"Unknown index backend: {backend}")
+
+    if not inner.is_trained:
+        rng = np.random.default_rng(0)
+        # IVF needs ~256 points per list; sq8 only learns per-dimension ranges.
+        sample_size = min(len(vectors), 256 * inner.nlist if hasattr(inner, "nlist") else 65536)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        inner.train(sample)
+
+    index = faiss.IndexIDMap2(inner)
+    index.add_with_ids(vectors, ids)
+    configure_for_search(index)
+    return index
+
+
+def rebuild_from(index, backend, normalized=False):
+    """
+    Re-pack an ID-mapped index into `backend` ("auto" resolves by size).
+    Used to turn the flat index a rebuild streams into the final backend.
+    """
+    ids = np.unique(faiss.vector_to_array(index.id_map)).astype("int64")
+    if not len(ids):
+        return index
+    backend = choose_backend(len(ids), normalized, backend)
+    if backend == backend_name(index):
+        return index
+    return build_index(_live_vectors(index, ids), ids, backend)
+
+
+def id_vectors(index):
+    """(ids, vectors) of an ID-mapped flat index, one row per id; re-added ids give their latest vector."""
+    ids = faiss.vector_to_array(index.id_map).astype("int64")
+    vectors = _inner(index).reconstruct_n(0, index.ntotal)
+    _, last_from_end = np.unique(ids[::-1], return_index=True)
+    positions = len(ids) - 1 - last_from_end
+    return ids[positions], vectors[positions]
+
+
+def _live_vectors(index, ids):
+    # reconstruct() goes through the id -> position map, so re-added ids give their latest vector.
+    return np.vstack([index.reconstruct(int(entry_id)) for entry_id in ids])
+
+
+def repack(index, live_ids, vector_store=None):
+    """
+    Build a fresh index of the same backend holding only live_ids (for backends
+    without removal). IVF cannot reconstruct its vectors; they come from the
+    float32 vector_store instead, and ids missing there are dropped.
+    """
+    present = set(faiss.vector_to_array(index.id_map).tolist())
+    ids = np.array(sorted(int(entry_id) for entry_id in live_ids if int(entry_id) in present), dtype="int64")
+    if supports_reconstruct(index):
+        vectors = _live_vectors(index, ids) if len(ids) else None
+    else:
+        if vector_store is None:
+            raise ValueError(f"Repacking a {backend_name(index)} index needs its float32 vector store")
+        stored = vector_store.get_many(ids.tolist())
+        ids = np.array([entry_id for entry_id in ids.tolist() if entry_id in stored], dtype="int64")
+        vectors = np.vstack([stored[entry_id] for entry_id in ids.tolist()]) if len(ids) else None
+    if not len(ids):
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(index.d))
+    return build_index(vectors, ids, backend_name(index))
+
+
+def superseded_ids(index):
+    """
+    Ids stored more than once, i.e. upserted again on a backend without removal.
+    The latest copy is current; older copies stay until compaction.
+    """
+    if supports_removal(index) or not hasattr(index, "id_map"):
+        return set()
+    ids, counts = np.unique(faiss.vector_to_array(index.id_map), return_counts=True)
+    return set(ids[counts > 1].tolist())
+
+
+def _inner(index):
+    return faiss.downcast_index(index.index) if hasattr(index, "id_map") else faiss.downcast_index(index)
+
+
+def backend_name(index):
+    inner = _inner(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(inner, faiss.IndexScalarQuantizer):
+        return "fp16" if inner.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    if isinstance(inner, faiss.IndexFlat) and inner.metric_type == faiss.METRIC_INNER_PRODUCT:
+        return "flat_ip"
+    return "flat"
+
+
+def configure_for_search(index):
+    """Apply query-time knobs (efSearch / nprobe) to a loaded index."""
+    inner = _inner(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = _setting("RAG_HNSW_EF_SEARCH", 64)
+    elif isinstance(inner, faiss.IndexIVF):
+        inner.nprobe = _setting("RAG_IVF_NPROBE", 16)
+    return index
+
+
+def search_parameters(index, selector):
+    """
+    Per-query parameters restricted to `selector`. The type must match the
+    backend, and efSearch / nprobe are copied over so a filtered search
+    behaves like an unfiltered one.
+    """
+    inner = _inner(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = inner.hnsw.efSearch
+    elif isinstance(inner, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF()
+        params.nprobe = inner.nprobe
+    else:
+        params = faiss.SearchParameters()
+    params.sel = selector
+    return params
+
+
+def supports_reconstruct(index):
+    # IVF lists need a direct map to reconstruct, which loaded indexes do not have.
+    return not isinstance(_inner(index), faiss.IndexIVF)
+
+
+def is_quantized(index):
+    return backend_name(index) in QUANTIZED_BACKENDS
+
+
+def is_inner_product(index):
+    return index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+
+def supports_removal(index):
+    # Removing from IVF under IndexIDMap2 desynchronizes the id map (see module docstring).
+    return not isinstance(_inner(index), (faiss.IndexHNSW, faiss.IndexIVF))
+
+
+def remove_ids(index, ids):
+    """Remove ids where the backend allows it; HNSW and IVF keep them until compaction."""
+    if ids and supports_removal(index):
+        index.remove_ids(np.array(sorted(ids), dtype="int64"))
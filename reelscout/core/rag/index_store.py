@@ -0,0 +1,459 @@
+# index_store.py
+"""
+Process-level holders for the FAISS indexes used at query time.
+
+Each holder loads its index + metadata once, then re-checks a version file
+(falling back to file mtimes) every few seconds. A changed version is loaded
+on the side and swapped in with a single reference assignment, so queries
+keep using the previous snapshot while a reload is in progress.
+
+Indexes are ID-mapped: FAISS labels are ScrapedReel.id (text) or
+ReelFrame.id (frames) and metadata lives in a SQLite sidecar keyed by that id
+(see metadata_store), queried once per search for the hit ids. Upserts and
+removals still sitting in the writer's WAL (see index_writer) are collapsed
+into a small pending block that is searched brute force next to the main
+index and masks any superseded ids in it. The main index can be any backend
+from index_factory.
+
+Searches can be restricted to a set of reels (district/category filters, see
+search_filters). The reels' entries are looked up in the metadata store; small
+subsets are ranked exactly over vectors reconstructed once per snapshot, larger
+ones through a FAISS ID selector, so the top k comes from the subset itself
+rather than from filtering a global top k.
+
+Quantized indexes (fp16 / sq8 / ivfpq) over-fetch RAG_RERANK_FACTOR times the
+candidates and re-rank them with float32 vectors read from a vector_store
+sidecar, so only compressed codes stay resident.
+"""
+import base64
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+from django.conf import settings
+
+from .index_factory import (
+    configure_for_search,
+    is_inner_product,
+    is_quantized,
+    search_parameters,
+    superseded_ids,
+    supports_reconstruct,
+)
+from .metadata_store import FRAME_COLUMNS, TEXT_COLUMNS, MetadataStore
+from .vector_store import VectorStore
+
+
+INDEX_PATH = "rag_index.faiss"
+META_PATH = "rag_metadata.sqlite3"
+FRAME_INDEX_PATH = "frame_index.faiss"
+FRAME_META_PATH = "frame_metadata.sqlite3"
+VECTORS_PATH = "rag_vectors.sqlite3"
+FRAME_VECTORS_PATH = "frame_vectors.sqlite3"
+
+# Pickled metadata from before the SQLite sidecar; imported on the first write.
+LEGACY_META_PATH = "rag_metadata.pkl"
+LEGACY_FRAME_META_PATH = "frame_metadata.pkl"
+
+# Filtered searches over at most this many entries are ranked exactly; larger
+# subsets use an ID selector on the main index.
+SUBSET_EXACT_MAX = 20000
+# Reconstructed subset vectors kept per snapshot (~150 MB of 384-d vectors).
+SUBSET_CACHE_MAX_VECTORS = 100000
+SCOPE_CACHE_SIZE = 64
+
+text_metadata = MetadataStore(META_PATH, TEXT_COLUMNS)
+frame_metadata = MetadataStore(FRAME_META_PATH, FRAME_COLUMNS)
+text_vectors = VectorStore(VECTORS_PATH)
+frame_vectors = VectorStore(FRAME_VECTORS_PATH)
+
+
+def version_path(index_path):
+    return f"{index_path}.version"
+
+
+def wal_path(index_path):
+    return f"{index_path}.wal"
+
+
+def encode_vector(vector):
+    return base64.b64encode(np.asarray(vector, dtype="float32").tobytes()).decode("ascii")
+
+
+def decode_vector(payload):
+    return np.frombuffer(base64.b64decode(payload), dtype="float32")
+
+
+def read_wal(path):
+    """Return the parsed WAL records, skipping a torn trailing line if a write is in progress."""
+    records = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return records
+
+
+def collapse_wal(records):
+    """
+    Reduce WAL records to their final state.
+    Returns (upserts, touched): upserts maps id -> (vector, meta) for ids whose
+    last op is an upsert; touched is every id the WAL changes.
+    """
+    upserts = {}
+    touched = set()
+    for record in records:
+        entry_id = record.get("id")
+        if entry_id is None:
+            continue
+        touched.add(entry_id)
+        if record.get("op", "upsert") == "remove":
+            upserts.pop(entry_id, None)
+        else:
+            upserts[entry_id] = (decode_vector(record["vector"]), record.get("meta") or {})
+    return upserts, touched
+
+
+def bump_index_version(index_path):
+    """Write a new version token next to the index so holders reload it."""
+    path = version_path(index_path)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        f.write(f"{time.time_ns()}-{os.getpid()}")
+    os.replace(tmp_path, path)
+
+
+def write_index_atomic(index, path):
+    """Write to a temp file and rename over the target so mapped readers never see a torn file."""
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def write_metadata_atomic(metadata, path):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(metadata, f)
+    os.replace(tmp_path, path)
+
+
+def read_index(path):
+    """Memory-map the index when FAISS supports it for this index type."""
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except (RuntimeError, AttributeError):
+        return faiss.read_index(path)
+
+
+def _rerank_factor():
+    return max(1, getattr(settings, "RAG_RERANK_FACTOR", 4))
+
+
+class IndexSnapshot:
+    def __init__(self, index, metadata, version, pending=None, touched=None, vectors=None, superseded=None):
+        self.index = index
+        self.inner_product = index is not None and is_inner_product(index)
+        # Full-precision vectors for re-ranking, only for quantized indexes.
+        self.vectors = (
+            vectors if index is not None and vectors is not None and is_quantized(index) and vectors.exists() else None
+        )
+        self.metadata = metadata if metadata is not None else {}
+        self.version = version
+        self.touched = touched or set()
+        # Ids re-upserted on a backend without removal (HNSW, IVF): the index holds
+        # older copies too, and only the newest vector may score them.
+        if superseded is None:
+            superseded = superseded_ids(index) if index is not None else set()
+        self.superseded = superseded
+
+        pending = pending or {}
+        self.pending_ids = list(pending)
+        self.pending_metadata = [pending[entry_id][1] for entry_id in self.pending_ids]
+        self.pending_vectors = (
+            np.vstack([pending[entry_id][0] for entry_id in self.pending_ids]).astype("float32")
+            if pending else None
+        )
+
+        # Filtered searches repeat the same few scopes: reel ids -> entry ids,
+        # and entry-id bytes -> (vectors, squared norms).
+        self._scopes = OrderedDict()
+        self._subsets = OrderedDict()
+        self._subset_vectors = 0
+        self._subset_lock = threading.Lock()
+
+    def _lookup_many(self, labels):
+        if isinstance(self.metadata, MetadataStore):
+            return self.metadata.get_many(labels)
+        # Legacy pickles: positional list, or dict keyed by id.
+        if isinstance(self.metadata, list):
+            return {label: self.metadata[label] for label in labels if 0 <= label < len(self.metadata)}
+        return {label: self.metadata[label] for label in labels if label in self.metadata}
+
+    def entry_ids_for_reels(self, reel_ids):
+        """Sorted ids of the index entries (reels, chunks or frames) that belong to reel_ids."""
+        key = frozenset(reel_ids)
+        with self._subset_lock:
+            entry_ids = self._scopes.get(key)
+            if entry_ids is not None:
+                self._scopes.move_to_end(key)
+                return entry_ids
+
+        entry_ids = self._entry_ids(key)
+        with self._subset_lock:
+            self._scopes[key] = entry_ids
+            while len(self._scopes) > SCOPE_CACHE_SIZE:
+                self._scopes.popitem(last=False)
+        return entry_ids
+
+    def _entry_ids(self, reel_ids):
+        if isinstance(self.metadata, MetadataStore):
+            entry_ids = self.metadata.ids_where_in("reel_id", sorted(reel_ids))
+        elif isinstance(self.metadata, list):
+            entry_ids = [position for position, meta in enumerate(self.metadata) if meta.get("reel_id") in reel_ids]
+        else:
+            entry_ids = [entry_id for entry_id, meta in self.metadata.items() if meta.get("reel_id") in reel_ids]
+        return np.unique(np.asarray(entry_ids, dtype="int64"))
+
+    def _subset(self, entry_ids):
+        key = entry_ids.tobytes()
+        with self._subset_lock:
+            cached = self._subsets.get(key)
+            if cached is not None:
+                self._subsets.move_to_end(key)
+                return cached
+
+        # Raises RuntimeError for ids the index does not hold yet (the store runs ahead of the snapshot).
+        vectors = np.vstack([self.index.reconstruct(int(entry_id)) for entry_id in entry_ids]).astype("float32")
+        cached = (vectors, np.einsum("ij,ij->i", vectors, vectors))
+
+        with self._subset_lock:
+            if key not in self._subsets:
+                self._subsets[key] = cached
+                self._subset_vectors += len(entry_ids)
+            while self._subset_vectors > SUBSET_CACHE_MAX_VECTORS and len(self._subsets) > 1:
+                _, (evicted, _) = self._subsets.popitem(last=False)
+                self._subset_vectors -= len(evicted)
+        return cached
+
+    def _search_subset(self, query_vectors, fetch, entry_ids):
+        vectors, norms = self._subset(entry_ids)
+        query = query_vectors[0]
+        distances = norms - 2.0 * (vectors @ query) + float(query @ query)
+        order = np.argsort(distances)[:fetch]
+        return distances[order][None, :], entry_ids[order][None, :]
+
+    def _rerank(self, query, distances, labels, k):
+        """Recompute the candidates' distances from float32 vectors; ids without one keep their estimate."""
+        estimates = {}
+        for distance, label in zip(distances, labels):
+            label = int(label)
+            if label >= 0 and label not in estimates:
+                estimates[label] = float(distance)
+        exact = self.vectors.get_many(list(estimates))
+        for label, vector in exact.items():
+            diff = vector - query
+            estimates[label] = float(diff @ diff)
+        ranked = sorted(estimates.items(), key=lambda item: item[1])[:k]
+        return (
+            np.array([[distance for _, distance in ranked]], dtype="float32"),
+            np.array([[label for label, _ in ranked]], dtype="int64"),
+        )
+
+    def _search_main(self, query_vectors, fetch, entry_ids):
+        if self.vectors is not None:
+            # The sidecar holds each id's newest vector, so re-ranking also settles superseded copies.
+            distances, labels = self._search_codes(query_vectors, fetch * _rerank_factor(), entry_ids)
+            return self._rerank(query_vectors[0], distances[0], labels[0], fetch)
+        distances, labels = self._search_codes(query_vectors, fetch, entry_ids)
+        if self.superseded and supports_reconstruct(self.index):
+            distances = self._newest_distances(query_vectors[0], distances, labels)
+        return distances, labels
+
+    def _newest_distances(self, query, distances, labels):
+        """Re-score superseded ids by their newest vector; an older copy may have matched instead."""
+        distances = distances.copy()
+        for position, label in enumerate(labels[0]):
+            label = int(label)
+            if label in self.superseded:
+                # IndexIDMap2 reconstructs an id from its most recently added copy.
+                diff = self.index.reconstruct(label) - query
+                distances[0][position] = float(diff @ diff)
+        return distances
+
+    def _search_codes(self, query_vectors, fetch, entry_ids):
+        if entry_ids is None:
+            distances, labels = self.index.search(query_vectors, fetch)
+        else:
+            # Quantized subsets are re-ranked anyway, so reconstructing their codes is not worth caching.
+            if len(entry_ids) <= SUBSET_EXACT_MAX and supports_reconstruct(self.index) and self.vectors is None:
+                try:
+                    return self._search_subset(query_vectors, fetch, entry_ids)
+                except RuntimeError:
+                    pass
+            selector = faiss.IDSelectorBatch(len(entry_ids), faiss.swig_ptr(entry_ids))
+            distances, labels = self.index.search(
+                query_vectors, fetch, params=search_parameters(self.index, selector)
+            )
+
+        if self.inner_product:
+            # Unit vectors: squared L2 = 2 - 2 * ip, so every backend reports distances.
+            distances = 2.0 - 2.0 * distances
+        return distances, labels
+
+    def search(self, query_vectors, k, reel_ids=None):
+        """
+        Search the main index plus pending WAL entries, optionally only the
+        entries of reel_ids.
+        Returns [(distance, metadata), ...] for the first query, closest first.
+        """
+        hits = []
+
+        entry_ids = None
+        if reel_ids is not None:
+            reel_ids = set(reel_ids)
+            entry_ids = self.entry_ids_for_reels(reel_ids)
+
+        if self.index is not None and self.index.ntotal and (entry_ids is None or len(entry_ids)):
+            # Over-fetch so ids superseded by the WAL, and older copies of
+            # re-upserted ids, do not shrink the result.
+            fetch = k + len(self.touched) + min(len(self.superseded), k)
+            distances, labels = self._search_main(query_vectors, fetch, entry_ids)
+
+            candidates = []
+            seen = set()
+            for distance, label in zip(distances[0], labels[0]):
+                label = int(label)
+                # Copies of a superseded id all carry its newest distance by now; keep one.
+                if label < 0 or label in self.touched or label in seen:
+                    continue
+                seen.add(label)
+                candidates.append((float(distance), label))
+            candidates.sort()
+            found = self._lookup_many([label for _, label in candidates])
+            for distance, label in candidates:
+                if label in found:
+                    hits.append((distance, found[label]))
+
+        if self.pending_vectors is not None:
+            diffs = self.pending_vectors - query_vectors[0]
+            pending_distances = np.einsum("ij,ij->i", diffs, diffs)
+            ranked = [
+                idx for idx in np.argsort(pending_distances)
+                if reel_ids is None or self.pending_metadata[idx].get("reel_id") in reel_ids
+            ]
+            for idx in ranked[:k]:
+                hits.append((float(pending_distances[idx]), self.pending_metadata[idx]))
+
+        hits.sort(key=lambda item: item[0])
+        return hits[:k]
+
+
+class IndexHolder:
+
+    def __init__(self, index_path, store, legacy_meta_path=None, check_interval=2.0, vector_store=None):
+        self.index_path = index_path
+        self.store = store
+        self.vector_store = vector_store
+        self.legacy_meta_path = legacy_meta_path
+        self.wal_path = wal_path(index_path)
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+
+    def _index_version(self):
+        try:
+            with open(version_path(self.index_path)) as f:
+                token = f.read().strip()
+            if token:
+                return token
+        except OSError:
+            pass
+
+        try:
+            index_stat = os.stat(self.index_path)
+        except OSError:
+            return None
+        return (index_stat.st_mtime_ns, index_stat.st_size)
+
+    def _wal_version(self):
+        try:
+            wal_stat = os.stat(self.wal_path)
+        except OSError:
+            return None
+        if not wal_stat.st_size:
+            return None
+        return (wal_stat.st_ino, wal_stat.st_mtime_ns, wal_stat.st_size)
+
+    def _load(self, version, previous):
+        index_version, _ = version
+        superseded = None
+        if previous is not None and previous.version[0] == index_version:
+            # Only the WAL moved; keep the resident index.
+            index, metadata, superseded = previous.index, previous.metadata, previous.superseded
+        elif index_version is not None:
+            index = configure_for_search(read_index(self.index_path))
+            metadata = self._open_metadata()
+        else:
+            index, metadata = None, {}
+
+        pending, touched = collapse_wal(read_wal(self.wal_path))
+        return IndexSnapshot(
+            index, metadata, version, pending, touched, vectors=self.vector_store, superseded=superseded
+        )
+
+    def _open_metadata(self):
+        if self.store.exists():
+            return self.store
+        if self.legacy_meta_path and os.path.exists(self.legacy_meta_path):
+            with open(self.legacy_meta_path, "rb") as f:
+                return pickle.load(f)
+        return {}
+
+    def _maybe_reload(self):
+        # Only the first load waits; later reloads are skipped by anyone who
+        # finds another thread already reloading and served the old snapshot.
+        if not self._reload_lock.acquire(blocking=self._snapshot is None):
+            return
+        try:
+            self._last_check = time.monotonic()
+            version = (self._index_version(), self._wal_version())
+            if version == (None, None):
+                return
+            previous = self._snapshot
+            if previous is not None and previous.version == version:
+                return
+            try:
+                snapshot = self._load(version, previous)
+            except Exception as e:
+                print(f"⚠️ Failed to load {self.index_path}: {e}")
+                return
+            self._snapshot = snapshot
+        finally:
+            self._reload_lock.release()
+
+    def get(self):
+        """Return the current IndexSnapshot, or None when no index has been built yet."""
+        if self._snapshot is None or time.monotonic() - self._last_check >= self.check_interval:
+            self._maybe_reload()
+        return self._snapshot
+
+    def invalidate(self):
+        self._last_check = 0.0
+
+
+text_index = IndexHolder(INDEX_PATH, text_metadata, LEGACY_META_PATH, vector_store=text_vectors)
+frame_index = IndexHolder(FRAME_INDEX_PATH, frame_metadata, LEGACY_FRAME_META_PATH, vector_store=frame_vectors)
@@ -1,46 +1,54 @@
-import os
-import faiss
-import pickle
-import numpy as np
-
-from .embedder import embed_text
+from .chunking import build_reel_chunks, chunk_id, chunk_id_range, chunked_mode
+from .embedder import embed_documents
 from .document_builder import build_reel_document
+from .index_writer import text_writer
 
 
-INDEX_PATH = "rag_index.faiss"
-META_PATH = "rag_metadata.pkl"
+def _reel_metadata(reel):
+    return {
+        "reel_id": reel.id,
+        "short_code": reel.short_code,
+        "location": reel.location.name if reel.location else None
+    }
 
 
 def add_reel_to_index(reel):
 
+    if chunked_mode():
+        _add_reel_chunks(reel)
+        return
+
     doc = build_reel_document(reel)
 
-    vector = embed_text(doc)
+    # Cached by document hash: saves that leave the document unchanged skip the model.
+    vector = embed_documents([doc])[0]
 
-    vector = np.array([vector]).astype("float32")
+    # Logged to the WAL under the index lock; folded into the FAISS file in batches.
+    # Keyed by reel id, so reprocessing a reel replaces its vector instead of adding another.
+    text_writer.upsert([reel.id], [vector], [_reel_metadata(reel)])
 
-    # Check if the index exists before trying to read it
-    if not os.path.exists(INDEX_PATH):
-        print(f"⚠️ {INDEX_PATH} not found. Creating a new text index...")
-        dimension = vector.shape[1]
-        index = faiss.IndexFlatL2(dimension)
-        metadata = []
-    else:
-        index = faiss.read_index(INDEX_PATH)
-        with open(META_PATH, "rb") as f:
-            metadata = pickle.load(f)
+    print(f"✅ Added reel {reel.short_code} to RAG index")
 
-    index.add(vector)
 
-    faiss.write_index(index, INDEX_PATH)
+def _add_reel_chunks(reel):
 
-    metadata.append({
-        "reel_id": reel.id,
-        "short_code": reel.short_code,
-        "location": reel.location.name if reel.location else None
-    })
+    chunks = build_reel_chunks(reel)
+    vectors = embed_documents(chunks)
+    ids = [chunk_id(reel.id, number) for number in range(len(chunks))]
+
+    # A shorter document leaves chunk ids from the previous version behind; drop them.
+    stale = text_writer.ids_between(*chunk_id_range(reel.id)) - set(ids)
+    if stale:
+        text_writer.remove(sorted(stale))
 
-    with open(META_PATH, "wb") as f:
-        pickle.dump(metadata, f)
+    text_writer.upsert(ids, vectors, [_reel_metadata(reel)] * len(ids))
 
-    print(f"✅ Added reel {reel.short_code} to RAG index")
\ No newline at end of file
+    print(f"✅ Added reel {reel.short_code} to RAG index ({len(ids)} chunks)")
+
+
+def remove_reel_from_index(reel_id):
+    """Drop every vector of a reel, in either index mode."""
+    if chunked_mode():
+        text_writer.remove(sorted(text_writer.ids_between(*chunk_id_range(reel_id))))
+    else:
+        text_writer.remove([reel_id])
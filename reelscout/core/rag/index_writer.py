@@ -0,0 +1,298 @@
+# index_writer.py
+"""
+Append-only, lock-safe writer for the ID-mapped FAISS indexes.
+
+Upserts and removals are appended to a write-ahead log next to the index (one
+JSON line per op) under an exclusive file lock, and folded into the FAISS
+file and the SQLite metadata store in batches (plus the float32 vector
+sidecar while the index is quantized, see vector_store). The FAISS file is
+written to a temp file and renamed into place, so readers never see a torn
+index. Until a batch is folded, readers
+pick up the pending WAL ops directly (see IndexHolder), so changes are
+visible immediately.
+"""
+import json
+import os
+import pickle
+import time
+
+import faiss
+import numpy as np
+from django.conf import settings
+
+from .index_factory import id_vectors, is_quantized, remove_ids, repack, supports_removal
+from .index_store import (
+    FRAME_INDEX_PATH,
+    INDEX_PATH,
+    LEGACY_FRAME_META_PATH,
+    LEGACY_META_PATH,
+    bump_index_version,
+    collapse_wal,
+    encode_vector,
+    frame_metadata,
+    frame_vectors,
+    read_wal,
+    text_metadata,
+    text_vectors,
+    wal_path,
+    write_index_atomic,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """Exclusive inter-process lock on a sidecar .lock file."""
+
+    def __init__(self, path):
+        self.path = f"{path}.lock"
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a+")
+        if fcntl:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if fcntl:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+
+
+def new_id_index(dimension):
+    return faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+
+
+class IndexWriter:
+
+    def __init__(self, index_path, store, id_key, legacy_meta_path=None, batch_size=None, max_delay=None,
+                 vector_store=None):
+        self.index_path = index_path
+        self.store = store
+        self.vector_store = vector_store
+        self.id_key = id_key
+        self.legacy_meta_path = legacy_meta_path
+        self.wal_path = wal_path(index_path)
+        self.batch_size = batch_size or getattr(settings, "RAG_INDEX_FLUSH_BATCH", 16)
+        self.max_delay = max_delay if max_delay is not None else getattr(settings, "RAG_INDEX_FLUSH_MAX_DELAY", 30.0)
+
+    def _lock(self):
+        return FileLock(self.index_path)
+
+    def _rewrite_wal(self, records):
+        tmp_path = f"{self.wal_path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        os.replace(tmp_path, self.wal_path)
+
+    def _log(self, records):
+        """Durably log ops, then fold the log into the index if the batch is full or old."""
+        if not records:
+            return
+
+        with self._lock():
+            self._log_locked(records)
+
+    def _log_locked(self, records):
+        with open(self.wal_path, "a", encoding="utf-8") as f:
+            f.write("\n".join(json.dumps(record) for record in records) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        pending = read_wal(self.wal_path)
+        if len(pending) >= self.batch_size or time.time() - pending[0]["ts"] >= self.max_delay:
+            self._flush_locked(pending)
+
+    def upsert(self, ids, vectors, metadata_rows):
+        """Insert or replace the vectors for the given ids."""
+        now = time.time()
+        self._log([
+            {"ts": now, "op": "upsert", "id": int(entry_id), "vector": encode_vector(vector), "meta": meta}
+            for entry_id, vector, meta in zip(ids, vectors, metadata_rows)
+        ])
+
+    def remove(self, ids):
+        """Remove ids; ids that are neither indexed nor pending (e.g. frames dropped before indexing) are skipped."""
+        ids = {int(entry_id) for entry_id in ids}
+        if not ids:
+            return
+
+        with self._lock():
+            ids = self._known_locked(ids)
+            if not ids:
+                return
+            now = time.time()
+            self._log_locked([{"ts": now, "op": "remove", "id": entry_id} for entry_id in sorted(ids)])
+
+    def _known_locked(self, ids):
+        if not self.store.exists():
+            # Legacy pickled metadata is only imported on the first flush; keep every id.
+            return ids if os.path.exists(self.index_path) else set()
+        known = set(self.store.get_many(ids))
+        upserts, _ = collapse_wal(read_wal(self.wal_path))
+        return known | (ids & set(upserts))
+
+    def ids_between(self, first, last):
+        """Ids in [first, last) that are indexed or pending in the WAL."""
+        ids = set(self.store.ids_between(first, last)) if self.store.exists() else set()
+        upserts, touched = collapse_wal(read_wal(self.wal_path))
+        ids -= touched - set(upserts)
+        ids.update(entry_id for entry_id in upserts if first <= entry_id < last)
+        return ids
+
+    def flush(self):
+        with self._lock():
+            return self._flush_locked(read_wal(self.wal_path))
+
+    def _to_id_mapped(self, index, metadata):
+        """Convert a legacy positional index (list metadata); the last entry per id wins."""
+        vectors = index.reconstruct_n(0, index.ntotal)
+        latest = {}
+        for position, meta in enumerate(metadata):
+            latest[int(meta[self.id_key])] = position
+
+        mapped = new_id_index(index.d)
+        if latest:
+            ids = np.array(list(latest), dtype="int64")
+            mapped.add_with_ids(vectors[[latest[entry_id] for entry_id in latest]], ids)
+        return mapped, {entry_id: metadata[position] for entry_id, position in latest.items()}
+
+    def _load_locked(self):
+        """Load the index for writing, importing legacy pickled metadata into the store once."""
+        if not os.path.exists(self.index_path):
+            return None
+
+        index = faiss.read_index(self.index_path)
+        if not self.store.exists() and self.legacy_meta_path and os.path.exists(self.legacy_meta_path):
+            with open(self.legacy_meta_path, "rb") as f:
+                metadata = pickle.load(f)
+            if isinstance(metadata, list):
+                index, metadata = self._to_id_mapped(index, metadata)
+            self.store.apply(upserts=metadata, replace_all=True)
+            write_index_atomic(index, self.index_path)
+        return index
+
+    def _flush_locked(self, records):
+        if not records:
+            return 0
+
+        upserts, touched = collapse_wal(records)
+        index = self._load_locked()
+
+        if index is None:
+            if not upserts:
+                self._rewrite_wal([])
+                return 0
+            index = new_id_index(next(iter(upserts.values()))[0].shape[0])
+
+        # HNSW and IVF cannot remove ids: the stale vectors stay until compaction.
+        # Removed ids are skipped at search time because their rows go below, and
+        # re-upserted ids are scored by their newest copy (see superseded_ids).
+        remove_ids(index, touched)
+
+        if upserts:
+            ids = np.array(list(upserts), dtype="int64")
+            vectors = np.vstack([upserts[entry_id][0] for entry_id in upserts]).astype("float32")
+            index.add_with_ids(vectors, ids)
+
+        # Rows first: a reader on the old index then just skips removed ids.
+        self.store.apply(
+            upserts={entry_id: upserts[entry_id][1] for entry_id in upserts},
+            removals=touched - set(upserts),
+        )
+        if self.vector_store is not None and is_quantized(index):
+            self.vector_store.apply(
+                upserts=[(entry_id, upserts[entry_id][0]) for entry_id in upserts],
+                removals=touched - set(upserts),
+            )
+        write_index_atomic(index, self.index_path)
+
+        # Publish the new index before truncating the log: a reader in between
+        # then sees the new index plus already-folded ops (harmless), never the
+        # old index without the ops it is missing.
+        bump_index_version(self.index_path)
+        # Everything in the WAL is now in the index; start a fresh log.
+        self._rewrite_wal([])
+        return len(records)
+
+    def replace(self, index, metadata, started_at, source=None):
+        """
+        Swap in a fully rebuilt index. WAL entries logged after the rebuild
+        started are kept so concurrent ingests are not lost.
+        source is the flat float32 index the rebuild streamed into; a
+        quantized index needs it to fill the re-ranking sidecar.
+        """
+        with self._lock():
+            self.store.apply(upserts=metadata, replace_all=True)
+            if self.vector_store is not None:
+                if is_quantized(index):
+                    if source is None:
+                        raise ValueError("Replacing with a quantized index needs the float32 source index")
+                    ids, vectors = id_vectors(source)
+                    self.vector_store.apply(upserts=zip(ids, vectors), replace_all=True)
+                elif self.vector_store.exists():
+                    self.vector_store.apply(replace_all=True)
+            write_index_atomic(index, self.index_path)
+            # Version first, as in _flush_locked.
+            bump_index_version(self.index_path)
+            self._rewrite_wal([record for record in read_wal(self.wal_path) if record["ts"] >= started_at])
+
+    def compact(self, live_ids):
+        """
+        Fold the WAL and drop every id that is no longer in live_ids.
+        Returns (entries_before, entries_after).
+        """
+        live_ids = {int(entry_id) for entry_id in live_ids}
+        with self._lock():
+            self._flush_locked(read_wal(self.wal_path))
+            index = self._load_locked()
+            if index is None:
+                return 0, 0
+
+            before = index.ntotal
+            stored_ids = self.store.ids()
+            stale = [entry_id for entry_id in stored_ids if entry_id not in live_ids]
+            if stale:
+                self.store.apply(removals=stale)
+                if self.vector_store is not None and is_quantized(index):
+                    self.vector_store.apply(removals=stale)
+            if supports_removal(index):
+                remove_ids(index, stale)
+            else:
+                # Also drops the superseded copies left behind by upserts.
+                index = repack(
+                    index, [entry_id for entry_id in stored_ids if entry_id in live_ids], self.vector_store
+                )
+
+            write_index_atomic(index, self.index_path)
+            bump_index_version(self.index_path)
+            return before, index.ntotal
+
+
+text_writer = IndexWriter(
+    INDEX_PATH, text_metadata, id_key="reel_id", legacy_meta_path=LEGACY_META_PATH, vector_store=text_vectors
+)
+frame_writer = IndexWriter(
+    FRAME_INDEX_PATH, frame_metadata, id_key="frame_id", legacy_meta_path=LEGACY_FRAME_META_PATH,
+    vector_store=frame_vectors,
+)
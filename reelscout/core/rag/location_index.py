@@ -0,0 +1,139 @@
+# location_index.py
+"""
+BM25 index over Location rows for _select_relevant_locations.
+
+Each location becomes one weighted document: name and aliases count most,
+then district/area/category, then the keys and values of general_info,
+known_facts and nearby places. The index is built once per process and then
+kept current incrementally: Location signals upsert/remove single documents,
+and a count/last_updated fingerprint picks up rows changed by other processes.
+"""
+import threading
+import time
+from collections import Counter
+
+from django.db.models import Count, Max
+
+from core.models import Location
+from .bm25 import BM25Index, tokenize
+
+NAME_WEIGHT = 3
+PLACE_WEIGHT = 2
+FACT_WEIGHT = 1
+
+LOCATION_FIELDS = (
+    "id", "name", "alternate_names", "district", "specific_area", "category",
+    "general_info", "known_facts", "nearby_places", "last_updated",
+)
+
+
+def _flatten(value):
+    """Yield every key and scalar value in nested JSON."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield str(key).replace("_", " ")
+            yield from _flatten(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _flatten(item)
+    elif value is not None:
+        yield str(value)
+
+
+def location_terms(location):
+    terms = Counter()
+
+    def add(text, weight):
+        for token in tokenize(text):
+            terms[token] += weight
+
+    add(location.name, NAME_WEIGHT)
+    for alias in location.alternate_names if isinstance(location.alternate_names, list) else []:
+        add(alias, NAME_WEIGHT)
+
+    for value in (location.district, location.specific_area, location.category):
+        add(value, PLACE_WEIGHT)
+
+    for blob in (location.general_info, location.known_facts, location.nearby_places):
+        for text in _flatten(blob):
+            add(text, FACT_WEIGHT)
+
+    return terms
+
+
+class LocationIndex:
+
+    def __init__(self, check_interval=30.0):
+        self.check_interval = check_interval
+        self._index = None
+        self._fingerprint = None
+        self._latest = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _current_fingerprint(self):
+        stats = Location.objects.aggregate(count=Count("id"), latest=Max("last_updated"))
+        return stats["count"], stats["latest"]
+
+    def _build(self):
+        started = time.perf_counter()
+        index = BM25Index()
+        latest = None
+        for location in Location.objects.only(*LOCATION_FIELDS).iterator(chunk_size=2000):
+            index.upsert(location.id, location_terms(location))
+            if location.last_updated and (latest is None or location.last_updated > latest):
+                latest = location.last_updated
+        print(f"📚 Location BM25 index built for {len(index)} locations in {time.perf_counter() - started:.2f}s")
+        return index, latest
+
+    def _catch_up(self, fingerprint):
+        """Apply rows changed since the last check, and drop/add rows if the count moved."""
+        changed = Location.objects.only(*LOCATION_FIELDS)
+        if self._latest is not None:
+            changed = changed.filter(last_updated__gt=self._latest)
+        for location in changed.iterator(chunk_size=2000):
+            self._index.upsert(location.id, location_terms(location))
+            if location.last_updated and (self._latest is None or location.last_updated > self._latest):
+                self._latest = location.last_updated
+
+        count, _ = fingerprint
+        if count != len(self._index):
+            live_ids = set(Location.objects.values_list("id", flat=True))
+            for location_id in set(self._index.doc_ids()) - live_ids:
+                self._index.remove(location_id)
+            missing = live_ids - set(self._index.doc_ids())
+            for location in Location.objects.only(*LOCATION_FIELDS).filter(id__in=missing):
+                self._index.upsert(location.id, location_terms(location))
+
+    def get(self):
+        if self._index is not None and time.monotonic() - self._last_check < self.check_interval:
+            return self._index
+
+        with self._lock:
+            if self._index is not None and time.monotonic() - self._last_check < self.check_interval:
+                return self._index
+
+            fingerprint = self._current_fingerprint()
+            self._last_check = time.monotonic()
+            if self._index is None:
+                self._index, self._latest = self._build()
+            elif fingerprint != self._fingerprint:
+                self._catch_up(fingerprint)
+            self._fingerprint = fingerprint
+            return self._index
+
+    def search(self, query, k=10):
+        """[(location_id, score)] best first."""
+        return self.get().search(tokenize(query), k)
+
+    def upsert(self, location):
+        """Called from the Location post_save signal; a no-op until the index is first used."""
+        if self._index is not None:
+            self._index.upsert(location.id, location_terms(location))
+
+    def remove(self, location_id):
+        if self._index is not None:
+            self._index.remove(location_id)
+
+
+location_index = LocationIndex()
@@ -0,0 +1,129 @@
+# metadata_store.py
+"""
+SQLite sidecar for index metadata, keyed by vector id.
+
+Replaces the pickled metadata lists/dicts: rows are stored in typed columns
+under an INTEGER PRIMARY KEY (the SQLite rowid), so a lookup by id is a single
+rowid seek, reads go through SQLite's mmap I/O instead of unpickling the whole
+file, and writes only touch the affected rows. WAL journaling lets readers
+keep querying while the index writer updates rows.
+"""
+import os
+import sqlite3
+import threading
+
+MMAP_SIZE = 256 * 1024 * 1024
+
+TEXT_COLUMNS = (("reel_id", "INTEGER"), ("short_code", "TEXT"), ("location", "TEXT"))
+FRAME_COLUMNS = (("reel_id", "INTEGER"), ("frame_id", "INTEGER"), ("timestamp", "REAL"))
+
+
+class MetadataStore:
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = tuple(name for name, _ in columns)
+        self._column_types = tuple(columns)
+        self._local = threading.local()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _connection(self):
+        # One connection per thread (and per process, in case of a fork after first use).
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        column_sql = ", ".join(f"{name} {sql_type}" for name, sql_type in self._column_types)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY, {column_sql})")
+        if "reel_id" in self.columns:
+            # Filtered searches map reels to their chunk/frame entries.
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_reel_id ON entries (reel_id)")
+        conn.commit()
+
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _row_to_dict(self, row):
+        return dict(zip(self.columns, row[1:]))
+
+    def get(self, entry_id):
+        row = self._connection().execute(
+            f"SELECT id, {', '.join(self.columns)} FROM entries WHERE id = ?", (int(entry_id),)
+        ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def get_many(self, ids):
+        """Return {id: metadata} for the ids that exist, one query per 500 ids."""
+        ids = [int(entry_id) for entry_id in ids]
+        if not ids:
+            return {}
+        conn = self._connection()
+        found = {}
+        # Stay under SQLite's bound-parameter limit.
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            rows = conn.execute(
+                f"SELECT id, {', '.join(self.columns)} FROM entries WHERE id IN ({placeholders})", chunk
+            ).fetchall()
+            found.update((row[0], self._row_to_dict(row)) for row in rows)
+        return found
+
+    def ids(self):
+        return [row[0] for row in self._connection().execute("SELECT id FROM entries")]
+
+    def ids_where_in(self, column, values):
+        """Ids of rows whose `column` is one of values (e.g. every chunk/frame of some reels)."""
+        if column not in self.columns:
+            raise ValueError(f"Unknown metadata column: {column}")
+        values = list(values)
+        conn = self._connection()
+        ids = []
+        # Stay under SQLite's bound-parameter limit.
+        for start in range(0, len(values), 500):
+            chunk = values[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            ids.extend(
+                row[0] for row in conn.execute(f"SELECT id FROM entries WHERE {column} IN ({placeholders})", chunk)
+            )
+        return ids
+
+    def ids_between(self, first, last):
+        """Ids in [first, last), via the rowid range."""
+        return [
+            row[0] for row in self._connection().execute(
+                "SELECT id FROM entries WHERE id >= ? AND id < ?", (int(first), int(last))
+            )
+        ]
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def apply(self, upserts=None, removals=None, replace_all=False):
+        """
+        Apply row changes in one transaction.
+        upserts maps id -> metadata dict; removals is an iterable of ids.
+        """
+        conn = self._connection()
+        column_list = ", ".join(self.columns)
+        placeholders = ", ".join("?" for _ in range(len(self.columns) + 1))
+        with conn:
+            if replace_all:
+                conn.execute("DELETE FROM entries")
+            if removals:
+                conn.executemany("DELETE FROM entries WHERE id = ?", [(int(entry_id),) for entry_id in removals])
+            if upserts:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO entries (id, {column_list}) VALUES ({placeholders})",
+                    [
+                        (int(entry_id),) + tuple(meta.get(name) for name in self.columns)
+                        for entry_id, meta in upserts.items()
+                    ],
+                )
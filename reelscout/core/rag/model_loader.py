@@ -0,0 +1,100 @@
+# model_loader.py
+"""
+Load the SentenceTransformer models with the configured CPU inference backend.
+
+RAG_EMBEDDING_BACKEND:
+    torch   stock PyTorch weights (default)
+    onnx    ONNX Runtime through sentence-transformers' onnx backend; needs
+            sentence-transformers >= 3.2 and onnxruntime (optimum is used to
+            export models that ship no ONNX file). RAG_ONNX_MODEL_FILE picks a
+            prebuilt file, e.g. "onnx/model_qint8_avx512_vnni.onnx" for the
+            int8 MiniLM export.
+    int8    PyTorch with dynamic int8 quantization of every Linear layer.
+
+sentence-transformers only exports Transformer modules to ONNX, so the CLIP
+model falls back to int8 when onnx is requested. Any backend that fails to
+load falls back to torch, so a missing optional package never breaks search;
+benchmark_rag --suite embedder-backends checks cosine parity against torch.
+
+Vectors from different backends are close but not identical, so the
+embedding cache keys them by cache_key: the model name plus the backend the
+model actually loaded with (after any fallback), so vectors of one backend
+are never served to another.
+"""
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "int8")
+
+# Mean cosine similarity to torch below which a backend is considered off.
+PARITY_MIN_COSINE = 0.99
+
+
+def configured_backend():
+    backend = getattr(settings, "RAG_EMBEDDING_BACKEND", "torch")
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    return backend
+
+
+def resolved_backend(backend=None, onnx_capable=True):
+    """The backend load_model runs on: `backend` or the configured one, with onnx -> int8 for non-ONNX models."""
+    backend = backend or configured_backend()
+    if backend == "onnx" and not onnx_capable:
+        return "int8"
+    return backend
+
+
+def cache_key(model_name, model):
+    """
+    Embedding cache model key for model_name as loaded by load_model. torch
+    keeps the bare model name, so caches filled before backends existed stay valid.
+    """
+    backend = getattr(model, "embedding_backend", "torch")
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+def _quantize_dynamic(model):
+    import torch
+
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_model(model_name, backend=None, onnx_capable=True):
+    """
+    Return a SentenceTransformer for model_name running on `backend`
+    (RAG_EMBEDDING_BACKEND by default). model.embedding_backend records what
+    it actually runs on: "torch", "int8", or "onnx" / "onnx:<file>".
+    """
+    from sentence_transformers import SentenceTransformer
+
+    requested = backend or configured_backend()
+    backend = resolved_backend(requested, onnx_capable)
+    if backend != requested:
+        logger.warning("%s cannot run on ONNX Runtime; using int8 quantization instead", model_name)
+
+    if backend == "onnx":
+        model_kwargs = {}
+        onnx_file = getattr(settings, "RAG_ONNX_MODEL_FILE", None)
+        if onnx_file:
+            model_kwargs["file_name"] = onnx_file
+        try:
+            model = SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+            model.embedding_backend = f"onnx:{onnx_file}" if onnx_file else "onnx"
+            return model
+        except (ImportError, TypeError, ValueError, OSError) as e:
+            logger.warning("ONNX backend unavailable for %s (%s); using PyTorch", model_name, e)
+            backend = "torch"
+
+    model = SentenceTransformer(model_name, device="cpu") if backend == "int8" else SentenceTransformer(model_name)
+    if backend == "int8":
+        try:
+            model = _quantize_dynamic(model)
+        except (ImportError, AttributeError, RuntimeError) as e:
+            logger.warning("int8 quantization failed for %s (%s); using float32 weights", model_name, e)
+            backend = "torch"
+    model.embedding_backend = backend
+    return model
@@ -0,0 +1,69 @@
+# query_cache.py
+"""
+Bounded in-process LRU of query embeddings, shared by the text and frame retrievers.
+
+Keys are (model name, normalized query), so "Best waterfalls  in Idukki" and
+"best waterfalls in idukki" share an entry. Both MiniLM and CLIP lowercase
+their input, so embedding the normalized text gives the same vector.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+def normalize_query(text):
+    return " ".join(str(text or "").lower().split())
+
+
+class QueryEmbeddingCache:
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or getattr(settings, "RAG_QUERY_CACHE_SIZE", 1024)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, model, query, compute):
+        """Return the cached vector for (model, query), calling compute(normalized_query) on a miss."""
+        key = (model, normalize_query(query))
+
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+            self.misses += 1
+
+        # Computed outside the lock so a slow encode does not block cache hits.
+        vector = compute(key[1])
+        vector.setflags(write=False)
+
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return vector
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size": len(self._entries),
+                "max_size": self.max_entries,
+            }
+
+
+query_embeddings = QueryEmbeddingCache()
@@ -1,10 +1,19 @@
 # rag_pipeline.py
+import asyncio
 import json
 import os
-from groq import Groq
+import threading
 
-from .retriever import hybrid_search
-from core.models import Location
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .answer_cache import answer_cache
+from .answer_stream import AnswerStreamParser
+from .async_utils import in_thread
+from .gazetteer import location_gazetteer
+from .location_index import location_index
+from .retriever import ahybrid_search, hybrid_search
+from core.models import Location, ScrapedReel
 
 
 def _to_kv_lines(payload):
@@ -41,69 +50,63 @@ def _format_nearby_places(nearby_places):
     return ", ".join(parts) if parts else "None"
 
 
-def _tokenize(text):
-    cleaned = "".join(ch.lower() if ch.isalnum() else " " for ch in str(text or ""))
-    return [token for token in cleaned.split() if len(token) >= 3]
+# Added to the BM25 score of locations the query names outright (name or alias).
+MENTION_BOOST = 10.0
 
 
-def _location_match_score(location, query_text, query_tokens):
-    score = 0
+def _ranked_location_ids(query, limit=8):
+    # BM25 over names, aliases, districts and facts touches only the postings
+    # of the query terms; exact mentions from the gazetteer are boosted on top.
+    scores = dict(location_index.search(query, k=limit * 3))
+    for location_id in location_gazetteer.get().named_location_ids(query)[:limit]:
+        scores[location_id] = scores.get(location_id, 0.0) + MENTION_BOOST
 
-    fields = [
-        location.name,
-        location.district,
-        location.specific_area,
-        location.category,
-    ]
+    return sorted(scores, key=lambda location_id: scores[location_id], reverse=True)[:limit]
 
-    aliases = location.alternate_names if isinstance(location.alternate_names, list) else []
-    fields.extend(aliases[:10])
 
-    searchable_blob = " ".join(
-        [
-            str(location.general_info or {}),
-            str(location.known_facts or {}),
-            str(location.nearby_places or []),
-        ]
-    ).lower()
+def _merge_reel_locations(ranked, reels, limit=8):
+    # Ensure locations present in retrieved reels are included.
+    for reel in reels:
+        if reel.location and reel.location not in ranked:
+            ranked.append(reel.location)
+            if len(ranked) >= limit:
+                break
 
-    for field in fields:
-        value = str(field or "").strip().lower()
-        if not value:
-            continue
-        if value in query_text:
-            score += 8
-        elif any(token in value for token in query_tokens):
-            score += 2
+    return ranked[:limit]
 
-    for token in query_tokens:
-        if token in searchable_blob:
-            score += 1
 
-    return score
+def _select_relevant_locations(query, reels, limit=8):
+    top_ids = _ranked_location_ids(query, limit)
+    locations_by_id = Location.objects.in_bulk(top_ids)
+    ranked = [locations_by_id[location_id] for location_id in top_ids if location_id in locations_by_id]
+    return _merge_reel_locations(ranked, reels, limit)
+
+
+def _newest_reels_query(location_ids):
+    return ScrapedReel.objects.filter(location_id__in=location_ids).annotate(
+        row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F("location_id")],
+            order_by=[F("posted_at").desc(), F("created_at").desc()],
+        )
+    ).filter(row_number=1).select_related("location")
 
 
-def _select_relevant_locations(query, reels, limit=8):
-    query_text = str(query or "").strip().lower()
-    query_tokens = _tokenize(query_text)
+def _latest_reel_per_location(locations):
+    """Newest reel of each location, {location_id: reel}, in a single query."""
+    location_ids = [location.id for location in locations]
+    if not location_ids:
+        return {}
 
-    scored = []
-    for location in Location.objects.all():
-        score = _location_match_score(location, query_text, query_tokens)
-        if score > 0:
-            scored.append((score, location))
+    return {reel.location_id: reel for reel in _newest_reels_query(location_ids)}
 
-    scored.sort(key=lambda item: item[0], reverse=True)
-    ranked = [location for _, location in scored[:limit]]
 
-    # Ensure locations present in retrieved reels are included.
-    for reel in reels:
-        if reel.location and reel.location not in ranked:
-            ranked.append(reel.location)
-            if len(ranked) >= limit:
-                break
+async def _alatest_reel_per_location(locations):
+    location_ids = [location.id for location in locations]
+    if not location_ids:
+        return {}
 
-    return ranked[:limit]
+    return {reel.location_id: reel async for reel in _newest_reels_query(location_ids)}
 
 
 def _build_location_context(locations):
@@ -154,32 +157,50 @@ Transcript (As of {posted_date}):
     return "\n\n".join(parts)
 
 
-# Initialize the Groq client
-client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+# Created on first use (or by warmup.warm_up), not at import time
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from groq import Groq
+                _client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+    return _client
+
+
+CHAT_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+
+
+def _chat_messages(prompt, system_instruction=None):
+    messages = []
+
+    # Inject the Local Expert persona and context as the system prompt
+    if system_instruction:
+        messages.append({
+            "role": "system", 
+            "content": system_instruction
+        })
+
+    messages.append({
+        "role": "user", 
+        "content": prompt
+    })
+    return messages
+
 
 def _safe_generate(prompt, system_instruction=None):
     """
     Safely calls the Groq API to generate a response.
     """
     try:
-        messages = []
-        
-        # Inject the Local Expert persona and context as the system prompt
-        if system_instruction:
-            messages.append({
-                "role": "system", 
-                "content": system_instruction
-            })
-            
-        messages.append({
-            "role": "user", 
-            "content": prompt
-        })
-
         # Call the blazing fast Llama 3 70B model
-        chat_completion = client.chat.completions.create(
-            messages=messages,
-            model="meta-llama/llama-4-scout-17b-16e-instruct", 
+        chat_completion = get_client().chat.completions.create(
+            messages=_chat_messages(prompt, system_instruction),
+            model=CHAT_MODEL, 
             temperature=0.3, # Kept slightly lower for factual RAG answers
             max_tokens=1024,
             response_format={"type": "json_object"} # Forces strictly valid JSON
@@ -192,6 +213,60 @@ def _safe_generate(prompt, system_instruction=None):
         return None # Return None to trigger your fallback logic gracefully
 
 
+# AsyncGroq's connection pool belongs to the event loop that created it
+_async_client = None
+_async_client_loop = None
+
+
+def get_async_client():
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        from groq import AsyncGroq
+        _async_client = AsyncGroq(api_key=os.environ.get("GROQ_API_KEY"))
+        _async_client_loop = loop
+    return _async_client
+
+
+async def _asafe_generate(prompt, system_instruction=None):
+    """_safe_generate without holding a thread while Groq answers."""
+    try:
+        chat_completion = await get_async_client().chat.completions.create(
+            messages=_chat_messages(prompt, system_instruction),
+            model=CHAT_MODEL,
+            temperature=0.3,
+            max_tokens=1024,
+            response_format={"type": "json_object"}
+        )
+
+        return chat_completion.choices[0].message.content
+
+    except Exception as e:
+        print(f"⚠️ Groq API Error: {e}")
+        return None
+
+
+def _stream_generate(prompt, system_instruction=None):
+    """
+    Yield the reply's content deltas from a streaming Groq completion.
+    Unlike _safe_generate, API errors propagate so the caller knows the reply is cut short.
+    """
+    # Groq's JSON mode does not stream, so the prompt alone asks for JSON.
+    stream = get_client().chat.completions.create(
+        messages=_chat_messages(prompt, system_instruction),
+        model=CHAT_MODEL,
+        temperature=0.3,
+        max_tokens=1024,
+        stream=True,
+    )
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+
 def _clean_json_block(text):
     value = str(text or "").strip()
     if value.startswith("```"):
@@ -269,27 +344,55 @@ def _limit_specific_answer(answer):
     return ". ".join(sentence_candidates[:2]) + "."
 
 
-def run_rag(query, history=None):
-
-    # Ensure history exists
-    if history is None:
-        history = []
+def _answer_cache_vector(query):
+    """Query embedding for paraphrase lookups; retrieval has usually cached it already."""
+    if not answer_cache.enabled() or answer_cache.similarity <= 0:
+        return None
+    from .embedder import MODEL_NAME, embed_text
+    from .query_cache import query_embeddings
+    try:
+        return query_embeddings.get(MODEL_NAME, query, embed_text)
+    except Exception:
+        return None
 
-    # Convert conversation history into text
-    conversation_context = "\n".join(history)
 
-    # Retrieve relevant reels and related locations
+def _retrieve_context(query):
+    """(context_reels, relevant_locations) for the query, newest reels first."""
     try:
         reels = hybrid_search(query)
     except Exception:
         reels = []
     relevant_locations = _select_relevant_locations(query, reels)
+    context_reels = _with_representatives(reels, relevant_locations, _latest_reel_per_location(relevant_locations))
+    return context_reels, relevant_locations
 
+
+async def _aretrieve_context(query):
+    """_retrieve_context with reel retrieval and location ranking running concurrently."""
+
+    async def reels_or_empty():
+        try:
+            return await ahybrid_search(query)
+        except Exception:
+            return []
+
+    async def ranked_locations():
+        top_ids = await in_thread(_ranked_location_ids, query)
+        locations_by_id = await Location.objects.ain_bulk(top_ids)
+        return [locations_by_id[location_id] for location_id in top_ids if location_id in locations_by_id]
+
+    reels, ranked = await asyncio.gather(reels_or_empty(), ranked_locations())
+    relevant_locations = _merge_reel_locations(ranked, reels)
+    representatives = await _alatest_reel_per_location(relevant_locations)
+    return _with_representatives(reels, relevant_locations, representatives), relevant_locations
+
+
+def _with_representatives(reels, relevant_locations, representatives):
     # Add one representative reel per relevant location when semantic retrieval misses it.
     context_reels = list(reels)
     seen_reel_ids = {reel.id for reel in context_reels}
     for location in relevant_locations:
-        candidate = location.reels.order_by("-posted_at", "-created_at").first()
+        candidate = representatives.get(location.id)
         if candidate and candidate.id not in seen_reel_ids:
             context_reels.append(candidate)
             seen_reel_ids.add(candidate.id)
@@ -301,10 +404,15 @@ def run_rag(query, history=None):
         key=lambda x: x.posted_at.timestamp() if x.posted_at else 0, 
         reverse=True
     )
+    return context_reels
+
+
+def _build_system_prompt(history, context_reels, relevant_locations, answer_style):
+    # Convert conversation history into text
+    conversation_context = "\n".join(history)
 
     reel_context = _build_reel_context(context_reels[:3])
     location_context = _build_location_context(relevant_locations[:3])
-    answer_style = _infer_answer_style(query)
 
     # Cleanly format the system instructions and data context
     system_prompt = f"""
@@ -349,37 +457,40 @@ def run_rag(query, history=None):
       ]
     }}
     """
+    return system_prompt
 
-    # Pass the query as the user prompt, and the giant instruction block as the system prompt
-    text = _safe_generate(prompt=query, system_instruction=system_prompt)
 
-    if not text:
-        if relevant_locations:
-            top = relevant_locations[:3]
-            if answer_style == "specific":
-                fallback_answer = f"I found matching ReelScout data for {top[0].name}."
-            else:
-                fallback_answer = "I found location data in ReelScout. Here are the best matches: " + ", ".join(
-                    [f"{loc.name} ({loc.district or 'District unknown'})" for loc in top]
-                )
-            return {
-                "answer": fallback_answer,
-                "locations": [
-                    {
-                        "name": loc.name,
-                        "district": loc.district or "",
-                        "reason": "Matched from ReelScout location data"
-                    }
-                    for loc in top
-                ],
-                "reels": context_reels[:8]
-            }
+def _fallback_result(relevant_locations, context_reels, answer_style):
+    """Answer built from retrieval alone when the LLM returned nothing."""
+    if relevant_locations:
+        top = relevant_locations[:3]
+        if answer_style == "specific":
+            fallback_answer = f"I found matching ReelScout data for {top[0].name}."
+        else:
+            fallback_answer = "I found location data in ReelScout. Here are the best matches: " + ", ".join(
+                [f"{loc.name} ({loc.district or 'District unknown'})" for loc in top]
+            )
         return {
-            "answer": "I couldn't fetch enough data right now. Please try again.",
-            "locations": [],
-            "reels": []
+            "answer": fallback_answer,
+            "locations": [
+                {
+                    "name": loc.name,
+                    "district": loc.district or "",
+                    "reason": "Matched from ReelScout location data"
+                }
+                for loc in top
+            ],
+            "reels": context_reels[:8]
         }
+    return {
+        "answer": "I couldn't fetch enough data right now. Please try again.",
+        "locations": [],
+        "reels": []
+    }
+
 
+def _finalize_answer(text, query, history, context_reels, relevant_locations, answer_style, cache_vector, cache=True):
+    """Parse the model's JSON reply, normalize its recommendations and (unless cache=False) cache the result."""
     text = _clean_json_block(text)
 
     # Try parsing Groq JSON
@@ -426,8 +537,126 @@ def run_rag(query, history=None):
     if answer_style == "specific":
         answer_text = _limit_specific_answer(answer_text)
 
+    if cache and answer_cache.enabled():
+        answer_cache.put(
+            query,
+            history,
+            context_reels[:8],
+            relevant_locations,
+            {"answer": answer_text, "locations": normalized_recommendations[:5]},
+            cache_vector,
+        )
+
     return {
         "answer": answer_text,
         "locations": normalized_recommendations[:5],
         "reels": context_reels[:8]
-    }
\ No newline at end of file
+    }
+
+
+def run_rag(query, history=None):
+
+    # Ensure history exists
+    if history is None:
+        history = []
+
+    # Retrieve relevant reels and related locations
+    context_reels, relevant_locations = _retrieve_context(query)
+
+    cache_vector = _answer_cache_vector(query)
+    if answer_cache.enabled():
+        cached = answer_cache.get(query, history, context_reels[:8], relevant_locations, cache_vector)
+        if cached is not None:
+            return dict(cached, reels=context_reels[:8])
+
+    answer_style = _infer_answer_style(query)
+    system_prompt = _build_system_prompt(history, context_reels, relevant_locations, answer_style)
+
+    # Pass the query as the user prompt, and the giant instruction block as the system prompt
+    text = _safe_generate(prompt=query, system_instruction=system_prompt)
+
+    if not text:
+        return _fallback_result(relevant_locations, context_reels, answer_style)
+
+    return _finalize_answer(text, query, history, context_reels, relevant_locations, answer_style, cache_vector)
+
+
+async def arun_rag(query, history=None):
+    """
+    run_rag for async views. Reel retrieval (dense, frame and BM25 legs) and
+    location ranking run concurrently, database reads use the async ORM and
+    the Groq call is awaited, so one process can hold many chat sessions.
+    Returns the same dict as run_rag.
+    """
+    if history is None:
+        history = []
+
+    context_reels, relevant_locations = await _aretrieve_context(query)
+
+    cache_vector = await in_thread(_answer_cache_vector, query)
+    if answer_cache.enabled():
+        cached = answer_cache.get(query, history, context_reels[:8], relevant_locations, cache_vector)
+        if cached is not None:
+            return dict(cached, reels=context_reels[:8])
+
+    answer_style = _infer_answer_style(query)
+    system_prompt = _build_system_prompt(history, context_reels, relevant_locations, answer_style)
+
+    text = await _asafe_generate(prompt=query, system_instruction=system_prompt)
+
+    if not text:
+        return _fallback_result(relevant_locations, context_reels, answer_style)
+
+    return _finalize_answer(text, query, history, context_reels, relevant_locations, answer_style, cache_vector)
+
+
+def stream_rag(query, history=None):
+    """
+    run_rag as a sequence of events for the streaming chat endpoint:
+
+        {"type": "context", "locations": [...], "reels": [...]}   as soon as retrieval is done
+        {"type": "token", "text": "..."}                          answer text as the model writes it
+        {"type": "done", "answer", "locations", "reels"}          the same dict run_rag returns
+
+    The done event carries the authoritative answer: "specific" answers are
+    still trimmed to two sentences after the stream, and a reply that is not
+    JSON is only recovered there.
+    """
+    if history is None:
+        history = []
+
+    context_reels, relevant_locations = _retrieve_context(query)
+    yield {"type": "context", "locations": relevant_locations, "reels": context_reels[:8]}
+
+    cache_vector = _answer_cache_vector(query)
+    if answer_cache.enabled():
+        cached = answer_cache.get(query, history, context_reels[:8], relevant_locations, cache_vector)
+        if cached is not None:
+            yield {"type": "token", "text": cached["answer"]}
+            yield dict(cached, type="done", reels=context_reels[:8])
+            return
+
+    answer_style = _infer_answer_style(query)
+    system_prompt = _build_system_prompt(history, context_reels, relevant_locations, answer_style)
+
+    parser = AnswerStreamParser()
+    complete = True
+    try:
+        for delta in _stream_generate(prompt=query, system_instruction=system_prompt):
+            text = parser.feed(delta)
+            if text:
+                yield {"type": "token", "text": text}
+    except Exception as e:
+        print(f"⚠️ Groq API Error: {e}")
+        complete = False
+
+    if not parser.text():
+        result = _fallback_result(relevant_locations, context_reels, answer_style)
+        yield {"type": "token", "text": result["answer"]}
+    else:
+        # A reply cut short by an error is still shown, but never cached.
+        result = _finalize_answer(
+            parser.text(), query, history, context_reels, relevant_locations, answer_style, cache_vector,
+            cache=complete,
+        )
+    yield dict(result, type="done")
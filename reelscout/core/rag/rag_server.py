@@ -0,0 +1,111 @@
+# rag_server.py
+"""
+Client for the optional shared embedding/search daemon (manage.py run_rag_server).
+
+Each gunicorn worker would otherwise load MiniLM, CLIP and both FAISS indexes
+itself. With RAG_SERVER_URL set (e.g. http://127.0.0.1:8765), the retrievers
+and embedders send their work to one local daemon that owns the models and
+indexes instead. When the daemon is unreachable or errors, every call returns
+None and the caller falls back to the in-process path; the daemon is then
+skipped for RETRY_AFTER seconds so a dead server does not add a timeout to
+every request.
+
+Only query embeddings (embed_text / embed_image_text) go to the daemon.
+Document and image embedding for ingest, rebuilds and compaction always runs
+in process: large batches would hit RAG_SERVER_TIMEOUT and take the daemon
+away from live queries for RETRY_AFTER seconds.
+"""
+import base64
+import threading
+import time
+
+import numpy as np
+import requests
+from django.conf import settings
+
+DEFAULT_PORT = 8765
+
+# Seconds to stay on the in-process path after a failed call.
+RETRY_AFTER = 10.0
+
+
+def encode_array(array):
+    array = np.ascontiguousarray(array, dtype="float32")
+    return {"shape": list(array.shape), "data": base64.b64encode(array.tobytes()).decode("ascii")}
+
+
+def decode_array(payload):
+    return np.frombuffer(base64.b64decode(payload["data"]), dtype="float32").reshape(payload["shape"])
+
+
+class RagServerClient:
+
+    def __init__(self, url=None, timeout=None):
+        self._url = url
+        self._timeout = timeout
+        self._local = threading.local()
+        self._down_until = 0.0
+        # Set inside the daemon itself, so it never calls out to itself.
+        self.serving = False
+
+    @property
+    def url(self):
+        return self._url or getattr(settings, "RAG_SERVER_URL", None)
+
+    @property
+    def timeout(self):
+        return self._timeout or getattr(settings, "RAG_SERVER_TIMEOUT", 2.0)
+
+    def enabled(self):
+        return bool(self.url) and not self.serving and time.monotonic() >= self._down_until
+
+    def _session(self):
+        # requests.Session is not thread-safe; one keep-alive session per thread.
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _post(self, path, payload):
+        if not self.enabled():
+            return None
+        try:
+            response = self._session().post(f"{self.url.rstrip('/')}{path}", json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            self._down_until = time.monotonic() + RETRY_AFTER
+            print(f"⚠️ RAG server unavailable ({e}); using in-process models for {RETRY_AFTER:.0f}s")
+            return None
+
+    def search(self, index_name, query, k, reel_ids=None):
+        """[(distance, metadata)] from the daemon's "text" or "frame" index, or None to fall back."""
+        result = self._post("/search", {
+            "index": index_name,
+            "query": query,
+            "k": k,
+            "reel_ids": sorted(reel_ids) if reel_ids is not None else None,
+        })
+        if result is None:
+            return None
+        return [(distance, meta) for distance, meta in result["hits"]]
+
+    def embed(self, model, texts):
+        """Float32 rows for texts from the daemon's "text" or "clip_text" model, or None to fall back."""
+        result = self._post("/embed", {"model": model, "texts": list(texts)})
+        if result is None:
+            return None
+        return decode_array(result["vectors"])
+
+    def health(self):
+        if not self.url:
+            return None
+        try:
+            response = self._session().get(f"{self.url.rstrip('/')}/health", timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError):
+            return None
+
+
+rag_client = RagServerClient()
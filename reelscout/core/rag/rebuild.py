@@ -0,0 +1,278 @@
+# rebuild.py
+"""
+Streaming full rebuilds of the text and frame indexes.
+
+Rows are read in id order with iterator() so memory stays flat, embedded in
+batches (one encode call per batch), and frame images are decoded in a thread
+pool a few batches ahead of the encoder. Every few batches the partial index,
+its metadata and the last processed id are checkpointed next to the index, so
+an interrupted rebuild can pick up where it stopped with resume=True.
+"""
+import json
+import os
+import pickle
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import faiss
+import numpy as np
+from django.conf import settings
+
+from core.models import ReelFrame, ScrapedReel
+from .chunking import build_reel_chunks, chunk_id, chunked_mode
+from .document_builder import build_reel_document
+from .embedding_cache import embedding_cache
+from .index_factory import backend_name, rebuild_from
+from .index_store import write_index_atomic, write_metadata_atomic
+from .index_writer import frame_writer, new_id_index, text_writer
+
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_WORKERS = 4
+DEFAULT_CHECKPOINT_EVERY = 20
+
+
+class Checkpoint:
+    """Partial rebuild state kept in <index>.rebuild/ until the new index is swapped in."""
+
+    def __init__(self, index_path):
+        self.dir = f"{index_path}.rebuild"
+        self.index_path = os.path.join(self.dir, "partial.faiss")
+        self.meta_path = os.path.join(self.dir, "partial.pkl")
+        self.state_path = os.path.join(self.dir, "state.json")
+
+    def load(self):
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            index = faiss.read_index(self.index_path) if state.get("has_index") else None
+            with open(self.meta_path, "rb") as f:
+                metadata = pickle.load(f)
+        except (OSError, ValueError, RuntimeError, pickle.UnpicklingError):
+            return None
+        return index, metadata, state
+
+    def save(self, index, metadata, state):
+        os.makedirs(self.dir, exist_ok=True)
+        if index is not None:
+            write_index_atomic(index, self.index_path)
+        write_metadata_atomic(metadata, self.meta_path)
+
+        # State last: it only ever points at files that are already on disk.
+        tmp_path = f"{self.state_path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump(dict(state, has_index=index is not None), f)
+        os.replace(tmp_path, self.state_path)
+
+    def clear(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _print_progress(done, total, rate):
+    eta = (total - done) / rate if rate and total > done else 0
+    print(f"   {done}/{total}  {rate:.1f}/s  eta {eta:.0f}s")
+
+
+def _rebuild(writer, rows_after, count_after, embed_batch, label, batch_size, resume, checkpoint_every, progress,
+             backend, normalized):
+    """
+    Shared driver: rows_after(last_id) yields rows with id > last_id in id order,
+    embed_batch(rows) returns (ids, vectors, metadata_rows) for the rows it could embed.
+    Vectors are streamed into a flat index, then packed (and trained) into `backend`.
+    """
+    checkpoint = Checkpoint(writer.index_path)
+    saved = checkpoint.load() if resume else None
+
+    if saved:
+        index, metadata, state = saved
+        last_id, done, started_at = state["last_id"], state["done"], state["started_at"]
+        print(f"↩️ Resuming {label} rebuild after id {last_id} ({done} done)")
+    else:
+        checkpoint.clear()
+        index, metadata = None, {}
+        last_id, done, started_at = 0, 0, time.time()
+
+    total = done + count_after(last_id)
+    cache_before = embedding_cache.stats()
+    run_start = time.perf_counter()
+    run_done = 0
+
+    for batch_number, batch in enumerate(_batched(rows_after(last_id), batch_size), start=1):
+        ids, vectors, rows = embed_batch(batch)
+
+        if ids:
+            if index is None:
+                index = new_id_index(vectors.shape[1])
+            index.add_with_ids(vectors, np.array(ids, dtype="int64"))
+            metadata.update(zip(ids, rows))
+
+        last_id = batch[-1].id
+        done += len(batch)
+        run_done += len(batch)
+        progress(done, total, run_done / max(time.perf_counter() - run_start, 1e-9))
+
+        if batch_number % checkpoint_every == 0:
+            checkpoint.save(index, metadata, {"last_id": last_id, "done": done, "started_at": started_at})
+
+    if index is None:
+        print(f"⚠️ No {label} found to index")
+        checkpoint.clear()
+        return 0
+
+    flat_count = index.ntotal
+    packed = rebuild_from(index, backend, normalized=normalized)
+    if backend_name(packed) != "flat":
+        print(f"🧮 Packed {flat_count} vectors into a {backend_name(packed)} index")
+
+    # The flat index still holds full-precision vectors for a quantized index's re-ranking sidecar.
+    writer.replace(packed, metadata, started_at, source=index)
+    index = packed
+    checkpoint.clear()
+
+    elapsed = time.perf_counter() - run_start
+    cache_after = embedding_cache.stats()
+    print(f"✅ {label.capitalize()} index rebuilt: {index.ntotal} vectors ({run_done} rows in {elapsed:.1f}s)")
+    print(
+        f"♻️ Embeddings reused: {cache_after['reused'] - cache_before['reused']}, "
+        f"computed: {cache_after['computed'] - cache_before['computed']}"
+    )
+    return index.ntotal
+
+
+def rebuild_text_index(batch_size=DEFAULT_BATCH_SIZE, chunk_size=DEFAULT_CHUNK_SIZE, resume=False,
+                       checkpoint_every=DEFAULT_CHECKPOINT_EVERY, progress=_print_progress, backend=None):
+    from .embedder import embed_documents
+
+    processed = ScrapedReel.objects.filter(is_processed=True)
+
+    def rows_after(last_id):
+        return (
+            processed.filter(id__gt=last_id)
+            .select_related("location")
+            .order_by("id")
+            .iterator(chunk_size=chunk_size)
+        )
+
+    chunked = chunked_mode()
+
+    def embed_batch(reels):
+        ids = []
+        texts = []
+        rows = []
+        for reel in reels:
+            row = {
+                "reel_id": reel.id,
+                "short_code": reel.short_code,
+                "location": reel.location.name if reel.location else None,
+            }
+            # Chunked mode: one vector per chunk, all sharing the reel's metadata row.
+            documents = build_reel_chunks(reel) if chunked else [build_reel_document(reel)]
+            for number, document in enumerate(documents):
+                ids.append(chunk_id(reel.id, number) if chunked else reel.id)
+                texts.append(document)
+                rows.append(row)
+        vectors = embed_documents(texts, batch_size=batch_size)
+        return ids, vectors, rows
+
+    return _rebuild(
+        text_writer,
+        rows_after,
+        lambda last_id: processed.filter(id__gt=last_id).count(),
+        embed_batch,
+        "reels",
+        batch_size,
+        resume,
+        checkpoint_every,
+        progress,
+        backend,
+        normalized=True,
+    )
+
+
+def _with_decoded_images(frames, pool, lookahead):
+    """Yield (frame, (digest, image)) pairs while up to `lookahead` images decode in the pool."""
+    from .image_embedder import load_image
+
+    pending = deque()
+    for frame in frames:
+        pending.append((frame, pool.submit(load_image, frame.image.path)))
+        if len(pending) >= lookahead:
+            queued_frame, future = pending.popleft()
+            yield queued_frame, future.result()
+    while pending:
+        queued_frame, future = pending.popleft()
+        yield queued_frame, future.result()
+
+
+class _DecodedFrame:
+    """A frame row with its decoded image attached, so the driver can still read .id."""
+
+    __slots__ = ("id", "frame", "digest", "image")
+
+    def __init__(self, frame, loaded):
+        self.id = frame.id
+        self.frame = frame
+        self.digest, self.image = loaded
+
+
+def rebuild_frame_index(batch_size=DEFAULT_BATCH_SIZE, chunk_size=DEFAULT_CHUNK_SIZE, workers=DEFAULT_WORKERS,
+                        resume=False, checkpoint_every=DEFAULT_CHECKPOINT_EVERY, progress=_print_progress,
+                        backend=None):
+    from .image_embedder import embed_loaded_images
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+
+        def rows_after(last_id):
+            frames = (
+                ReelFrame.objects.filter(id__gt=last_id)
+                .only("id", "reel_id", "timestamp", "image")
+                .order_by("id")
+                .iterator(chunk_size=chunk_size)
+            )
+            for frame, loaded in _with_decoded_images(frames, pool, lookahead=batch_size * 2):
+                yield _DecodedFrame(frame, loaded)
+
+        def embed_batch(items):
+            usable = [item for item in items if item.image is not None]
+            for item in items:
+                if item.image is None:
+                    print(f"⚠️ Skipping frame {item.id}: image missing or unreadable")
+            if not usable:
+                return [], None, []
+
+            vectors = embed_loaded_images(
+                [item.digest for item in usable], [item.image for item in usable], batch_size=batch_size
+            )
+            rows = [
+                {"reel_id": item.frame.reel_id, "frame_id": item.id, "timestamp": item.frame.timestamp}
+                for item in usable
+            ]
+            return [item.id for item in usable], vectors, rows
+
+        return _rebuild(
+            frame_writer,
+            rows_after,
+            lambda last_id: ReelFrame.objects.filter(id__gt=last_id).count(),
+            embed_batch,
+            "frames",
+            batch_size,
+            resume,
+            checkpoint_every,
+            progress,
+            backend or getattr(settings, "RAG_FRAME_INDEX_BACKEND", None),
+            # CLIP image vectors are not normalized, so frames stay on L2 backends.
+            normalized=False,
+        )
@@ -0,0 +1,147 @@
+# reel_index.py
+"""
+BM25 index over processed reels: the lexical leg of the fusion retriever.
+
+Each reel is one weighted document built from its location, summary, caption,
+transcript and the precomputed normalized_comments. Reel saves/deletes update
+single documents (see core/signals.py); reels added, edited or deleted by
+other processes are picked up through a count/max(id)/max(updated_at)
+fingerprint, re-reading only the reels updated since the last check. A
+location save or delete re-reads its reels and bumps their updated_at, since
+their documents carry the location's name, aliases and category.
+"""
+import threading
+import time
+from collections import Counter
+
+from django.db.models import Count, Max
+
+from core.models import ScrapedReel
+from .bm25 import BM25Index, tokenize
+
+LOCATION_WEIGHT = 3
+SUMMARY_WEIGHT = 2
+TEXT_WEIGHT = 1
+
+REEL_FIELDS = (
+    "id", "updated_at", "raw_caption", "transcript_text", "ai_summary", "normalized_comments",
+    "extracted_district", "extracted_specific_area", "location__name", "location__district",
+    "location__category", "location__alternate_names",
+)
+
+
+def reel_terms(reel):
+    terms = Counter()
+
+    def add(text, weight):
+        for token in tokenize(text):
+            terms[token] += weight
+
+    location = reel.location
+    if location:
+        add(location.name, LOCATION_WEIGHT)
+        for alias in location.alternate_names if isinstance(location.alternate_names, list) else []:
+            add(alias, LOCATION_WEIGHT)
+        add(location.district, SUMMARY_WEIGHT)
+        add(location.category, SUMMARY_WEIGHT)
+
+    add(reel.extracted_district, SUMMARY_WEIGHT)
+    add(reel.extracted_specific_area, SUMMARY_WEIGHT)
+    add(reel.ai_summary, SUMMARY_WEIGHT)
+    add(reel.raw_caption, TEXT_WEIGHT)
+    add(reel.transcript_text, TEXT_WEIGHT)
+
+    for comment in reel.normalized_comments if isinstance(reel.normalized_comments, list) else []:
+        if isinstance(comment, dict):
+            add(comment.get("normalized"), TEXT_WEIGHT)
+
+    return terms
+
+
+def _indexed_reels():
+    return ScrapedReel.objects.filter(is_processed=True).select_related("location").only(*REEL_FIELDS)
+
+
+class ReelIndex:
+
+    def __init__(self, check_interval=30.0):
+        self.check_interval = check_interval
+        self._index = None
+        self._fingerprint = None
+        self._latest = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _current_fingerprint(self):
+        stats = ScrapedReel.objects.filter(is_processed=True).aggregate(
+            count=Count("id"), last_id=Max("id"), latest=Max("updated_at")
+        )
+        return stats["count"], stats["last_id"], stats["latest"]
+
+    def _build(self):
+        started = time.perf_counter()
+        index = BM25Index()
+        latest = None
+        for reel in _indexed_reels().iterator(chunk_size=1000):
+            index.upsert(reel.id, reel_terms(reel))
+            if reel.updated_at and (latest is None or reel.updated_at > latest):
+                latest = reel.updated_at
+        print(f"📚 Reel BM25 index built for {len(index)} reels in {time.perf_counter() - started:.2f}s")
+        return index, latest
+
+    def _catch_up(self):
+        """Apply reels edited since the last check, and drop/add reels whose processed state moved."""
+        changed = _indexed_reels()
+        if self._latest is not None:
+            # gte: a reel committed later with the same timestamp is not missed.
+            changed = changed.filter(updated_at__gte=self._latest)
+        for reel in changed.iterator(chunk_size=1000):
+            self._index.upsert(reel.id, reel_terms(reel))
+            if reel.updated_at and (self._latest is None or reel.updated_at > self._latest):
+                self._latest = reel.updated_at
+
+        live_ids = set(ScrapedReel.objects.filter(is_processed=True).values_list("id", flat=True))
+        indexed_ids = set(self._index.doc_ids())
+        for reel_id in indexed_ids - live_ids:
+            self._index.remove(reel_id)
+        for reel in _indexed_reels().filter(id__in=live_ids - indexed_ids):
+            self._index.upsert(reel.id, reel_terms(reel))
+
+    def get(self):
+        if self._index is not None and time.monotonic() - self._last_check < self.check_interval:
+            return self._index
+
+        with self._lock:
+            if self._index is not None and time.monotonic() - self._last_check < self.check_interval:
+                return self._index
+
+            fingerprint = self._current_fingerprint()
+            self._last_check = time.monotonic()
+            if self._index is None:
+                self._index, self._latest = self._build()
+            elif fingerprint != self._fingerprint:
+                self._catch_up()
+            self._fingerprint = fingerprint
+            return self._index
+
+    def search(self, query, k=10, reel_ids=None):
+        """[(reel_id, score)] best first, optionally only among reel_ids."""
+        return self.get().search(tokenize(query), k, doc_filter=reel_ids)
+
+    def upsert(self, reel):
+        """Called from the ScrapedReel post_save signal; a no-op until the index is first used."""
+        if self._index is not None:
+            self._index.upsert(reel.id, reel_terms(reel))
+
+    def refresh(self, reel_ids):
+        """Re-read reels from the database, e.g. after their location was renamed; a no-op until first use."""
+        if self._index is not None:
+            for reel in _indexed_reels().filter(id__in=list(reel_ids)):
+                self._index.upsert(reel.id, reel_terms(reel))
+
+    def remove(self, reel_id):
+        if self._index is not None:
+            self._index.remove(reel_id)
+
+
+reel_index = ReelIndex()
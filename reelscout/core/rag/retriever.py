@@ -1,90 +1,245 @@
-import faiss
-import pickle
+import asyncio
+
 import numpy as np
+from .async_utils import in_thread
 from .frame_retriever import search_frames
-from .embedder import embed_text
+from .embedder import MODEL_NAME, embed_text
+from .gazetteer import location_gazetteer
+from .index_store import text_index
+from .query_cache import query_embeddings
+from .rag_server import rag_client
+from .bm25 import tokenize
+from .chunking import chunked_mode
+from .reel_index import reel_index
+from .search_filters import query_scope, scope_reel_ids
+from core.comment_utils import normalize_geo_label
 from core.models import ScrapedReel, Location
 
-INDEX_PATH = "rag_index.faiss"
-META_PATH = "rag_metadata.pkl"
+# Chunk hits fetched per requested reel in chunked mode.
+CHUNK_OVERFETCH = 4
 
 
 def detect_location(query):
     """
     Detect location or district mentioned in the query.
+    A named location wins over a district mention.
     """
 
-    query = query.lower()
+    location_id = location_gazetteer.get().detect(query)
 
-    locations = Location.objects.all()
+    if location_id is None:
+        return None
 
-    for loc in locations:
+    return Location.objects.filter(id=location_id).first()
 
-        if loc.name and loc.name.lower() in query:
-            return loc
 
-        if loc.district and loc.district.lower() in query:
-            return loc
+def text_index_hits(query, k, reel_ids=None):
+    """[(distance, metadata)] from this process's text index (the RAG server answers with this too)."""
 
-    return None
+    # Resident FAISS index + metadata, reloaded only when a new version is written
+    snapshot = text_index.get()
+    if snapshot is None:
+        return []
 
+    query_vector = query_embeddings.get(MODEL_NAME, query, embed_text)
 
-def semantic_search(query, k=10):
+    query_vector = np.array([query_vector]).astype("float32")
 
-    # Load FAISS index
-    index = faiss.read_index(INDEX_PATH)
+    return snapshot.search(query_vector, k, reel_ids=reel_ids)
 
-    # Load metadata
-    with open(META_PATH, "rb") as f:
-        metadata = pickle.load(f)
 
-    query_vector = embed_text(query)
+def semantic_search(query, k=10, reel_ids=None):
+    """Closest text-index hits, one per reel; reel_ids restricts the search to those reels."""
 
-    query_vector = np.array([query_vector]).astype("float32")
+    # Chunked indexes hold several vectors per reel: fetch more, then max-pool
+    # per reel (hits arrive closest first, so the first hit per reel is its best chunk).
+    fetch = k * CHUNK_OVERFETCH if chunked_mode() else k
 
-    distances, indices = index.search(query_vector, k)
+    hits = rag_client.search("text", query, fetch, reel_ids)
+    if hits is None:
+        hits = text_index_hits(query, fetch, reel_ids)
 
     results = []
+    seen_reels = set()
 
-    for idx in indices[0]:
-        if idx < len(metadata):
-            results.append(metadata[idx])
+    for _, meta in hits:
+        if meta["reel_id"] in seen_reels:
+            continue
+        seen_reels.add(meta["reel_id"])
+        results.append(meta)
+        if len(results) >= k:
+            break
 
     return results
 
 
-def hybrid_search(query):
+# Reciprocal rank fusion constant: larger values flatten the gap between ranks.
+RRF_K = 60
+
+DEFAULT_WEIGHTS = {"dense": 1.0, "frame": 0.6, "lexical": 0.8}
+
+
+def fused_search(query, k=5, weights=None, district_boost=0.25, category_boost=0.15, depth=20,
+                 districts=None, categories=None):
     """
-    Hybrid search:
-    1. Detect location
-    2. Run semantic search
-    3. Filter by location if detected
+    Run dense text, CLIP frame and BM25 retrieval and merge them with
+    weighted reciprocal rank fusion.
+
+    districts / categories restrict every retriever to reels in those
+    districts and location categories. When neither is given, the districts
+    and categories named in the query are used as a scope instead; if the
+    scope yields fewer than k reels, the rest is filled from an unscoped
+    search, ranked after the in-scope reels.
+
+    Reels whose district is mentioned in the query are scaled by
+    (1 + district_boost); reels whose location category appears in the query
+    (e.g. "waterfalls") by (1 + category_boost).
+
+    Returns up to k (reel, score, source) tuples, best first. source names
+    the retrievers that found the reel, strongest contribution first
+    (e.g. "dense+lexical").
     """
+    weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+
+    if districts is not None or categories is not None:
+        reel_ids = scope_reel_ids(districts or (), categories or ())
+        if reel_ids is not None and not reel_ids:
+            return []
+        return _fuse(query, weights, district_boost, category_boost, depth, reel_ids)[:k]
+
+    reel_ids = scope_reel_ids(*query_scope(query))
+    if not reel_ids:
+        return _fuse(query, weights, district_boost, category_boost, depth)[:k]
+
+    results = _fuse(query, weights, district_boost, category_boost, depth, reel_ids)[:k]
+    if len(results) < k:
+        found = {reel.id for reel, _, _ in results}
+        results += [
+            result for result in _fuse(query, weights, district_boost, category_boost, depth)
+            if result[0].id not in found
+        ][:k - len(results)]
+    return results
+
 
-    detected_location = detect_location(query)
+def _fuse(query, weights, district_boost, category_boost, depth, reel_ids=None):
+    """All fused candidates as (reel, score, source), best first."""
+    rankings = {
+        "dense": [meta["reel_id"] for meta in semantic_search(query, k=depth, reel_ids=reel_ids)],
+        "frame": [hit["reel_id"] for hit in search_frames(query, k=depth, reel_ids=reel_ids)],
+        "lexical": [reel_id for reel_id, _ in reel_index.search(query, k=depth, reel_ids=reel_ids)],
+    }
 
-    semantic_results = semantic_search(query)
+    scores, contributions = _rrf(rankings, weights)
+    if not scores:
+        return []
 
-    reels = []
+    # One query for every candidate, with locations joined in.
+    reels_by_id = ScrapedReel.objects.select_related("location").in_bulk(list(scores))
 
-    for r in semantic_results:
+    return _rank(query, scores, contributions, reels_by_id, district_boost, category_boost)
 
-        try:
-            reel = ScrapedReel.objects.get(id=r["reel_id"])
 
-            if detected_location:
+def _rrf(rankings, weights):
+    """Weighted reciprocal rank fusion of {source: [reel_id, ...]} into (scores, contributions)."""
+    scores = {}
+    contributions = {}
+    for source, reel_ids in rankings.items():
+        for rank, reel_id in enumerate(dict.fromkeys(reel_ids), start=1):
+            share = weights.get(source, 0.0) / (RRF_K + rank)
+            if share <= 0:
+                continue
+            scores[reel_id] = scores.get(reel_id, 0.0) + share
+            contributions.setdefault(reel_id, {})[source] = share
+    return scores, contributions
 
-                if reel.location and reel.location.district == detected_location.district:
-                    reels.append(reel)
 
-            else:
-                reels.append(reel)
+def _rank(query, scores, contributions, reels_by_id, district_boost, category_boost):
+    """Apply the district/category boosts and return (reel, score, source), best first."""
+    districts = set(location_gazetteer.get().mentioned_districts(query))
+    query_terms = set(tokenize(query))
 
-        except ScrapedReel.DoesNotExist:
+    results = []
+    for reel_id, score in scores.items():
+        reel = reels_by_id.get(reel_id)
+        if reel is None:
             continue
 
-    frame_results = search_frames(query)
+        location = reel.location
+        reel_districts = {
+            normalize_geo_label(value)
+            for value in (location.district if location else None, reel.extracted_district)
+            if value
+        }
+        if districts and reel_districts & districts:
+            score *= 1 + district_boost
+        if location and location.category and query_terms & set(tokenize(location.category)):
+            score *= 1 + category_boost
+
+        sources = sorted(contributions[reel_id], key=contributions[reel_id].get, reverse=True)
+        results.append((reel, score, "+".join(sources)))
+
+    results.sort(key=lambda item: item[1], reverse=True)
+    return results
+
+
+def hybrid_search(query, k=5):
+    """Ranked reels from fused_search, without scores."""
+
+    return [reel for reel, _, _ in fused_search(query, k=k)]
+
+
+async def afused_search(query, k=5, weights=None, district_boost=0.25, category_boost=0.15, depth=20,
+                        districts=None, categories=None):
+    """
+    fused_search for async callers: the dense, frame and lexical retrievers
+    run concurrently on worker threads and the candidate reels are loaded
+    with the async ORM. Same arguments and results as fused_search.
+    """
+    weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+
+    if districts is not None or categories is not None:
+        reel_ids = await in_thread(scope_reel_ids, districts or (), categories or ())
+        if reel_ids is not None and not reel_ids:
+            return []
+        return (await _afuse(query, weights, district_boost, category_boost, depth, reel_ids))[:k]
+
+    reel_ids = await in_thread(lambda: scope_reel_ids(*query_scope(query)))
+    if not reel_ids:
+        return (await _afuse(query, weights, district_boost, category_boost, depth))[:k]
+
+    results = (await _afuse(query, weights, district_boost, category_boost, depth, reel_ids))[:k]
+    if len(results) < k:
+        found = {reel.id for reel, _, _ in results}
+        results += [
+            result for result in await _afuse(query, weights, district_boost, category_boost, depth)
+            if result[0].id not in found
+        ][:k - len(results)]
+    return results
+
+
+async def _afuse(query, weights, district_boost, category_boost, depth, reel_ids=None):
+    dense, frames, lexical = await asyncio.gather(
+        in_thread(semantic_search, query, k=depth, reel_ids=reel_ids),
+        in_thread(search_frames, query, k=depth, reel_ids=reel_ids),
+        in_thread(reel_index.search, query, k=depth, reel_ids=reel_ids),
+    )
+    rankings = {
+        "dense": [meta["reel_id"] for meta in dense],
+        "frame": [hit["reel_id"] for hit in frames],
+        "lexical": [reel_id for reel_id, _ in lexical],
+    }
+
+    scores, contributions = _rrf(rankings, weights)
+    if not scores:
+        return []
+
+    reels_by_id = await ScrapedReel.objects.select_related("location").ain_bulk(list(scores))
+
+    # The gazetteer may (re)load from the database, which cannot happen on the event loop.
+    return await in_thread(_rank, query, scores, contributions, reels_by_id, district_boost, category_boost)
+
 
-    all_reels = list(set(reels + frame_results))
+async def ahybrid_search(query, k=5):
+    """Ranked reels from afused_search, without scores."""
 
-    return all_reels[:5]
\ No newline at end of file
+    return [reel for reel, _, _ in await afused_search(query, k=k)]
@@ -0,0 +1,60 @@
+# search_filters.py
+"""
+District / category scopes for filtered retrieval.
+
+A scope is the set of processed reels whose location (or extracted district)
+is in one of the requested districts and whose location category is one of the
+requested categories. Retrievers pass the reel ids down to IndexSnapshot.search
+and BM25Index.search, so the top k is ranked inside the scope instead of being
+filtered out of a global top k.
+
+Districts and categories are matched on normalize_geo_label, through the raw
+spellings the gazetteer has seen on Location rows.
+"""
+from django.db.models import Q
+
+from core.comment_utils import normalize_geo_label
+from core.models import ScrapedReel
+from .gazetteer import location_gazetteer
+
+
+def _labels(values):
+    if isinstance(values, str):
+        values = [values]
+    return {label for label in (normalize_geo_label(value) for value in values or ()) if label}
+
+
+def scope_reel_ids(districts=(), categories=()):
+    """
+    Ids of processed reels in any of `districts` and any of `categories`
+    (either may be a single name or a list). Returns None when both are
+    empty, meaning "no filter", and an empty set when nothing matches.
+    """
+    districts = _labels(districts)
+    categories = _labels(categories)
+    if not districts and not categories:
+        return None
+
+    gazetteer = location_gazetteer.get()
+    reels = ScrapedReel.objects.filter(is_processed=True)
+
+    if districts:
+        district_names = {name for label in districts for name in gazetteer.district_names.get(label, ())}
+        match = Q(location__district__in=district_names) if district_names else Q(pk__in=[])
+        for label in districts:
+            match |= Q(extracted_district__iexact=label)
+        reels = reels.filter(match)
+
+    if categories:
+        category_names = {name for label in categories for name in gazetteer.category_names.get(label, ())}
+        if not category_names:
+            return set()
+        reels = reels.filter(location__category__in=category_names)
+
+    return set(reels.values_list("id", flat=True))
+
+
+def query_scope(query):
+    """(districts, categories) named in the query, as normalized labels."""
+    gazetteer = location_gazetteer.get()
+    return gazetteer.mentioned_districts(query), gazetteer.mentioned_categories(query)
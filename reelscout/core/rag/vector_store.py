@@ -0,0 +1,85 @@
+# vector_store.py
+"""
+Full-precision vectors for quantized indexes, keyed by vector id.
+
+fp16 / sq8 / ivfpq indexes keep only compressed codes in memory. Their
+float32 vectors live in this SQLite sidecar instead, and IndexSnapshot reads
+back only the candidates of a query to re-rank them exactly. Lookups are rowid
+seeks through SQLite's mmap I/O, so the vectors stay in the page cache rather
+than in every worker's heap.
+
+The writer keeps the sidecar in step with the index only while the index is
+quantized (see index_writer).
+"""
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+MMAP_SIZE = 256 * 1024 * 1024
+
+
+class VectorStore:
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _connection(self):
+        # One connection per thread (and per process, in case of a fork after first use).
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        conn.execute("CREATE TABLE IF NOT EXISTS vectors (id INTEGER PRIMARY KEY, vector BLOB NOT NULL)")
+        conn.commit()
+
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get_many(self, ids):
+        """Return {id: float32 vector} for the ids that exist, one query per 500 ids."""
+        ids = [int(entry_id) for entry_id in ids]
+        if not ids:
+            return {}
+        conn = self._connection()
+        found = {}
+        # Stay under SQLite's bound-parameter limit.
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            rows = conn.execute(f"SELECT id, vector FROM vectors WHERE id IN ({placeholders})", chunk).fetchall()
+            found.update((row[0], np.frombuffer(row[1], dtype="float32")) for row in rows)
+        return found
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    def apply(self, upserts=None, removals=None, replace_all=False):
+        """
+        Apply vector changes in one transaction.
+        upserts is an iterable of (id, vector) pairs; removals an iterable of ids.
+        """
+        conn = self._connection()
+        with conn:
+            if replace_all:
+                conn.execute("DELETE FROM vectors")
+            if removals:
+                conn.executemany("DELETE FROM vectors WHERE id = ?", [(int(entry_id),) for entry_id in removals])
+            if upserts:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO vectors (id, vector) VALUES (?, ?)",
+                    (
+                        (int(entry_id), np.asarray(vector, dtype="float32").tobytes())
+                        for entry_id, vector in upserts
+                    ),
+                )
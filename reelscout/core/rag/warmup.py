@@ -0,0 +1,52 @@
+# warmup.py
+"""
+Opt-in warm-up for serving processes.
+
+Models, the Groq client and the index holders all load lazily on first use,
+which keeps manage.py commands and migrations fast. A web worker would
+otherwise pay that cost on its first chat request, so wsgi.py/asgi.py call
+warm_up() when RAG_WARMUP is enabled.
+
+Workers that use the shared RAG server (RAG_SERVER_URL) only check that it is
+up; loading the models and indexes there is what the server avoids.
+"""
+import time
+
+
+def _check_server():
+    from .rag_server import rag_client
+
+    if rag_client.health() is None:
+        raise RuntimeError(f"no response from {rag_client.url}")
+
+
+def warm_up():
+    from . import embedder, image_embedder
+    from .index_store import frame_index, text_index
+    from .rag_pipeline import get_client
+    from .rag_server import rag_client
+
+    if rag_client.enabled():
+        steps = (
+            ("rag server", _check_server),
+            ("groq client", get_client),
+        )
+    else:
+        steps = (
+            ("text model", lambda: embedder.embed_text("warm up")),
+            ("image model", lambda: image_embedder.embed_image_text("warm up")),
+            ("text index", text_index.get),
+            ("frame index", frame_index.get),
+            ("groq client", get_client),
+        )
+
+    started = time.perf_counter()
+    for label, step in steps:
+        step_started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            print(f"⚠️ Warm-up of {label} failed: {e}")
+            continue
+        print(f"🔥 Warmed {label} in {time.perf_counter() - step_started:.2f}s")
+    print(f"🔥 Warm-up finished in {time.perf_counter() - started:.2f}s")
@@ -12,7 +12,7 @@ from apify_client import ApifyClient
 from .models import ScrapedReel, ReelFrame, Location
 from .video_engine import VideoEngine
 from .gemini_service import GeminiService
-from core.rag.index_updater import add_reel_to_index
+from .comment_utils import build_normalized_comments, normalize_geo_label
 from core.rag.add_frames_to_index import add_frames_to_index
 
 def haversine_distance(lat1, lon1, lat2, lon2):
@@ -48,14 +48,6 @@ def _normalize_location_name(value):
     tokens = [token_map.get(token, token) for token in text.split()]
     return " ".join(tokens)
 
-def _normalize_geo_label(value):
-    text = str(value or "").strip().lower()
-    if not text:
-        return ""
-    text = re.sub(r"[^a-z0-9\s]", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
-
 def _clean_text_value(value):
     text = str(value or "").strip()
     return text or None
@@ -207,11 +199,18 @@ def _iter_comment_texts(comments_dump):
         if text:
             yield text
 
+def _iter_normalized_comment_labels(normalized_comments):
+    if not isinstance(normalized_comments, list):
+        return
+    for entry in normalized_comments:
+        if isinstance(entry, dict) and entry.get("normalized"):
+            yield entry["normalized"]
+
 def _add_vote(scores, labels, value, weight=1):
     label = _clean_text_value(value)
     if not label:
         return
-    normalized = _normalize_geo_label(label)
+    normalized = normalize_geo_label(label)
     if not normalized:
         return
     scores[normalized] = scores.get(normalized, 0) + weight
@@ -232,7 +231,7 @@ def _contains_geo_mention(text, candidate):
 def _extract_area_hints_from_names(names, canonical_location_name=None):
     hints = []
     seen = set()
-    canonical_norm = _normalize_geo_label(canonical_location_name)
+    canonical_norm = normalize_geo_label(canonical_location_name)
     strip_tokens = {
         "temple", "church", "mosque", "fort", "waterfall", "falls", "lake",
         "dam", "beach", "cave", "hill", "hills", "viewpoint", "view", "point",
@@ -243,7 +242,7 @@ def _extract_area_hints_from_names(names, canonical_location_name=None):
         if not name:
             continue
 
-        tokens = [token for token in _normalize_geo_label(name).split() if token not in strip_tokens]
+        tokens = [token for token in normalize_geo_label(name).split() if token not in strip_tokens]
         if not tokens:
             continue
 
@@ -311,20 +310,14 @@ def _pick_consensus_geo_value(
         return _clean_text_value(current_value)
 
     for existing_reel in existing_reels:
-        normalized_comments = [
-            _normalize_geo_label(comment_text)
-            for comment_text in _iter_comment_texts(existing_reel.comments_dump)
-        ]
+        normalized_comments = list(_iter_normalized_comment_labels(existing_reel.normalized_comments))
         for candidate in candidates:
             if len(candidate) < 4:
                 continue
             if any(_contains_geo_mention(comment, candidate) for comment in normalized_comments):
                 comment_scores[candidate] = comment_scores.get(candidate, 0) + comment_weight
 
-    incoming_normalized_comments = [
-        _normalize_geo_label(comment_text)
-        for comment_text in _iter_comment_texts(incoming_comments)
-    ]
+    incoming_normalized_comments = list(_iter_normalized_comment_labels(incoming_comments))
     for candidate in candidates:
         if len(candidate) < 4:
             continue
@@ -338,7 +331,7 @@ def _pick_consensus_geo_value(
     best_total = max(total_scores.values())
     top_candidates = [candidate for candidate, score in total_scores.items() if score == best_total]
 
-    current_normalized = _normalize_geo_label(current_value)
+    current_normalized = normalize_geo_label(current_value)
     if current_normalized in top_candidates:
         selected = current_normalized
     else:
@@ -405,6 +398,7 @@ def get_or_process_reel(reel_url, prepared_comments=None):
     }
     if has_prepared_comments:
         reel_defaults["comments_dump"] = prepared_comments
+        reel_defaults["normalized_comments"] = build_normalized_comments(prepared_comments)
 
     reel, created = ScrapedReel.objects.update_or_create(
         short_code=short_code,
@@ -542,7 +536,7 @@ def get_or_process_reel(reel_url, prepared_comments=None):
 
                         existing_reels = list(
                             location_obj.reels.exclude(id=reel.id).only(
-                                "comments_dump",
+                                "normalized_comments",
                                 "extracted_district",
                                 "extracted_specific_area",
                                 "instagram_location_name",
@@ -582,7 +576,7 @@ def get_or_process_reel(reel_url, prepared_comments=None):
                             existing_reels=existing_reels,
                             incoming_values=[(district, 4)],
                             current_value=location_obj.district,
-                            incoming_comments=reel.comments_dump,
+                            incoming_comments=reel.normalized_comments,
                             reel_field="extracted_district",
                         )
                         if consensus_district != _clean_text_value(location_obj.district):
@@ -601,7 +595,7 @@ def get_or_process_reel(reel_url, prepared_comments=None):
                             existing_reels=existing_reels,
                             incoming_values=incoming_specific_area_values,
                             current_value=location_obj.specific_area,
-                            incoming_comments=reel.comments_dump,
+                            incoming_comments=reel.normalized_comments,
                             reel_field="extracted_specific_area",
                             fallback_fields=["instagram_location_name"],
                         )
@@ -650,10 +644,7 @@ def get_or_process_reel(reel_url, prepared_comments=None):
                 reel.extracted_known_facts = known_facts
                 
                 reel.is_processed = True
-                reel.save()
-
-                add_reel_to_index(reel)
-                add_frames_to_index(reel)
+                reel.save() # Triggers the post_save signal that upserts the reel into the text index
 
                 print(f"✅ TRANSCRIPT: {reel.transcript_text[:50]}...")
                 print(f"📍 LINKED TO LOCATION: {reel.location.name if reel.location else 'None'}")
@@ -671,7 +662,7 @@ def get_or_process_reel(reel_url, prepared_comments=None):
                         os.remove(reel.video_file.path)
                     reel.video_file = None
                 
-                reel.save() # Save the nullified file fields
+                reel.save(update_fields=["audio_file", "video_file"]) # Save the nullified file fields
                 
                 # 2. Delete Unused Frames (Keep the AI-selected ones)
                 # Convert the selected timestamps to a set of rounded floats for accurate matching
@@ -684,6 +675,9 @@ def get_or_process_reel(reel_url, prepared_comments=None):
                         deleted_frames_count += 1
                         
                 print(f"✨ Cleanup complete! Retained {len(selected_ts)} local frames, deleted {deleted_frames_count} unused frames, video, and audio.")
+
+                # Index only the frames that survived cleanup
+                add_frames_to_index(reel)
                 # 👆 --- END MEDIA CLEANUP --- 👆
 
             except Exception as e:
@@ -0,0 +1,146 @@
+# signals.py
+"""
+Keep the vector and BM25 indexes, the location gazetteer and the chat answer
+cache in step with reel, frame and location rows.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Location, ReelFrame, ScrapedReel
+
+# Fields that feed build_reel_document, the index metadata or the reel BM25
+# document. Saves that only touch other fields (e.g. media cleanup) skip re-indexing.
+INDEXED_REEL_FIELDS = {
+    "is_processed",
+    "short_code",
+    "location",
+    "posted_at",
+    "raw_caption",
+    "transcript_text",
+    "ai_summary",
+    "comments_dump",
+    "normalized_comments",
+    "extracted_district",
+    "extracted_specific_area",
+}
+
+# Location fields that reel_index.reel_terms puts into each of its reels' BM25 documents.
+INDEXED_LOCATION_FIELDS = {"name", "alternate_names", "district", "category"}
+
+
+def _refresh_reels(reel_ids):
+    """
+    Re-read reels whose BM25 document changed through their location. Bumping
+    updated_at makes the reel indexes of other processes catch up as well.
+    """
+    from core.rag.reel_index import reel_index
+    reel_ids = list(reel_ids)
+    if not reel_ids:
+        return
+    ScrapedReel.objects.filter(id__in=reel_ids).update(updated_at=timezone.now())
+    reel_index.refresh(reel_ids)
+
+
+@receiver(post_save, sender=ScrapedReel)
+def upsert_reel_in_index(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Re-embeds a processed reel whenever its indexed content is saved, once the save commits."""
+    if raw:
+        return
+    if update_fields is not None and not INDEXED_REEL_FIELDS.intersection(update_fields):
+        return
+
+    from core.rag.answer_cache import answer_cache
+    reel_id = instance.id
+    transaction.on_commit(lambda: answer_cache.invalidate(reel_id=reel_id))
+    if not instance.is_processed:
+        return
+
+    def index_reel():
+        from core.rag.index_updater import add_reel_to_index
+        from core.rag.reel_index import reel_index
+        try:
+            add_reel_to_index(instance)
+            reel_index.upsert(instance)
+        except Exception as e:
+            print(f"⚠️ Failed to index reel {instance.short_code}: {e}")
+
+    # A rolled-back save must not leave the reel indexed.
+    transaction.on_commit(index_reel)
+
+
+@receiver(post_delete, sender=ScrapedReel)
+def remove_reel_from_index(sender, instance, **kwargs):
+    from core.rag.answer_cache import answer_cache
+    reel_id = instance.id
+    short_code = instance.short_code
+
+    def unindex_reel():
+        from core.rag.index_updater import remove_reel_from_index as remove_reel_vectors
+        from core.rag.reel_index import reel_index
+        answer_cache.invalidate(reel_id=reel_id)
+        try:
+            remove_reel_vectors(reel_id)
+            reel_index.remove(reel_id)
+        except Exception as e:
+            print(f"⚠️ Failed to remove reel {short_code} from index: {e}")
+
+    transaction.on_commit(unindex_reel)
+
+
+@receiver(post_delete, sender=ReelFrame)
+def remove_frame_from_index(sender, instance, **kwargs):
+    """
+    Frames dropped in media cleanup (or cascaded from a reel delete) stop being
+    searchable. Cleanup runs before the surviving frames are indexed, so most of
+    its deletes hit frames that were never indexed; the writer skips those
+    without logging anything.
+    """
+    frame_id = instance.id
+
+    def unindex_frame():
+        from core.rag.index_writer import frame_writer
+        try:
+            frame_writer.remove([frame_id])
+        except Exception as e:
+            print(f"⚠️ Failed to remove frame {frame_id} from index: {e}")
+
+    transaction.on_commit(unindex_frame)
+
+
+@receiver(post_save, sender=Location)
+def refresh_location_search(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Names, aliases, districts or facts may have changed; update the query-time indexes on commit."""
+    if raw:
+        return
+    from core.rag.answer_cache import answer_cache
+    from core.rag.gazetteer import location_gazetteer
+    from core.rag.location_index import location_index
+    location_id = instance.id
+    transaction.on_commit(location_gazetteer.invalidate)
+    transaction.on_commit(lambda: answer_cache.invalidate(location_id=location_id))
+    transaction.on_commit(lambda: location_index.upsert(instance))
+    if update_fields is None or INDEXED_LOCATION_FIELDS.intersection(update_fields):
+        transaction.on_commit(
+            lambda: _refresh_reels(ScrapedReel.objects.filter(location_id=location_id).values_list("id", flat=True))
+        )
+
+
+@receiver(pre_delete, sender=Location)
+def remember_location_reels(sender, instance, **kwargs):
+    # The reels lose their location before post_delete runs; note which they are.
+    instance._reel_ids = list(instance.reels.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=Location)
+def drop_location_from_search(sender, instance, **kwargs):
+    from core.rag.answer_cache import answer_cache
+    from core.rag.gazetteer import location_gazetteer
+    from core.rag.location_index import location_index
+    location_id = instance.id
+    transaction.on_commit(location_gazetteer.invalidate)
+    transaction.on_commit(lambda: answer_cache.invalidate(location_id=location_id))
+    transaction.on_commit(lambda: location_index.remove(location_id))
+    reel_ids = getattr(instance, "_reel_ids", [])
+    transaction.on_commit(lambda: _refresh_reels(reel_ids))
@@ -0,0 +1,472 @@
+import asyncio
+import importlib.util
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import skipUnless
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+from django.conf import settings
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from core.models import Location, ScrapedReel
+from core.rag import embedder
+from core.rag.answer_cache import AnswerCache
+from core.rag.async_utils import iterate_in_thread
+from core.rag.gazetteer import location_gazetteer
+from core.rag.index_factory import BACKENDS, build_index
+from core.rag.index_store import IndexHolder
+from core.rag.index_writer import IndexWriter, new_id_index
+from core.rag.location_index import LocationIndex
+from core.rag.metadata_store import TEXT_COLUMNS, MetadataStore
+from core.rag.embedding_cache import EmbeddingCache
+from core.rag.model_loader import PARITY_MIN_COSINE, cache_key, load_model
+from core.rag.rag_pipeline import _latest_reel_per_location, _select_relevant_locations
+from core.rag.reel_index import ReelIndex
+from core.rag.retriever import fused_search, hybrid_search
+from core.rag.vector_store import VectorStore
+
+
+def _unit_vectors(count, dimension, seed):
+    vectors = np.random.default_rng(seed).standard_normal((count, dimension)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _meta(reel_id):
+    return {"reel_id": reel_id, "short_code": f"reel{reel_id}", "location": None}
+
+
+class IndexBackendUpdateTests(SimpleTestCase):
+    """Upserts and removals must never change which reel an unrelated vector maps to."""
+
+    COUNT = 3000
+    DIMENSION = 32
+
+    def _open(self, directory):
+        index_path = os.path.join(directory, "index.faiss")
+        store = MetadataStore(os.path.join(directory, "metadata.sqlite3"), TEXT_COLUMNS)
+        vectors = VectorStore(os.path.join(directory, "vectors.sqlite3"))
+        writer = IndexWriter(index_path, store, id_key="reel_id", batch_size=10_000, max_delay=1e9, vector_store=vectors)
+        holder = IndexHolder(index_path, store, vector_store=vectors)
+        return writer, holder
+
+    def _reel_ids(self, holder, vector, k=10):
+        holder.invalidate()
+        return [(distance, meta["reel_id"]) for distance, meta in holder.get().search(vector[None, :], k)]
+
+    def _assert_consistent(self, holder, vectors, moved, removed):
+        for probe in (11, 2000, self.COUNT):
+            self.assertEqual(self._reel_ids(holder, vectors[probe - 1])[0][1], probe)
+
+        self.assertEqual(self._reel_ids(holder, moved)[0][1], 1)
+        # The old embedding of reel 1 must not find it through its stale copy.
+        for distance, reel_id in self._reel_ids(holder, vectors[0]):
+            if reel_id == 1:
+                self.assertGreater(distance, 1e-3)
+
+        self.assertNotIn(removed, [reel_id for _, reel_id in self._reel_ids(holder, vectors[removed - 1])])
+
+    def test_upsert_and_remove_on_every_backend(self):
+        vectors = _unit_vectors(self.COUNT, self.DIMENSION, seed=0)
+        ids = np.arange(1, self.COUNT + 1, dtype="int64")
+        moved = _unit_vectors(1, self.DIMENSION, seed=1)[0]
+        removed = 5
+
+        for backend in BACKENDS:
+            with self.subTest(backend=backend), tempfile.TemporaryDirectory() as directory:
+                writer, holder = self._open(directory)
+                source = new_id_index(self.DIMENSION)
+                source.add_with_ids(vectors, ids)
+                writer.replace(
+                    build_index(vectors, ids, backend),
+                    {int(reel_id): _meta(int(reel_id)) for reel_id in ids},
+                    started_at=time.time(),
+                    source=source,
+                )
+
+                writer.upsert([1], [moved], [_meta(1)])
+                writer.remove([removed])
+                # Still pending in the WAL, then folded into the index.
+                self._assert_consistent(holder, vectors, moved, removed)
+                writer.flush()
+                self._assert_consistent(holder, vectors, moved, removed)
+
+                writer.compact([reel_id for reel_id in ids.tolist() if reel_id != removed])
+                self._assert_consistent(holder, vectors, moved, removed)
+
+
+class SidecarStoreTests(SimpleTestCase):
+    """Lookups of more ids than SQLite binds in one statement still return every row."""
+
+    def test_get_many_beyond_the_parameter_limit(self):
+        ids = list(range(1, 2001))
+        with tempfile.TemporaryDirectory() as directory:
+            store = MetadataStore(os.path.join(directory, "metadata.sqlite3"), TEXT_COLUMNS)
+            store.apply(upserts={entry_id: _meta(entry_id) for entry_id in ids}, replace_all=True)
+            vectors = VectorStore(os.path.join(directory, "vectors.sqlite3"))
+            vectors.apply(upserts=((entry_id, np.full(4, entry_id, dtype="float32")) for entry_id in ids))
+            # SQLite's compiled-in default; many builds raise it, so pin it here.
+            for sidecar in (store, vectors):
+                sidecar._connection().setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+
+            rows = store.get_many(ids + [0])
+            self.assertEqual(len(rows), len(ids))
+            self.assertEqual(rows[2000]["short_code"], "reel2000")
+            stored = vectors.get_many(ids + [0])
+            self.assertEqual(len(stored), len(ids))
+            self.assertEqual(stored[2000][0], 2000)
+
+
+class ChatRetrievalQueryCountTests(TestCase):
+    """
+    The chat retrieval path issues a fixed number of queries however many reels
+    and locations it returns; a per-reel or per-location lookup fails here.
+    """
+
+    QUERY = "waterfall trek in idukki"
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.locations = [
+            Location.objects.create(name=f"Falls {number}", district="Idukki", category="Waterfall")
+            for number in range(6)
+        ]
+        cls.reels = [
+            ScrapedReel.objects.create(
+                short_code=f"reel{number}",
+                original_url=f"https://www.instagram.com/reel/reel{number}/",
+                location=cls.locations[number % len(cls.locations)],
+                ai_summary="Waterfall trek in Idukki",
+                posted_at=now - timedelta(days=number),
+                is_processed=True,
+            )
+            for number in range(12)
+        ]
+
+    def setUp(self):
+        # Dense and frame indexes return every reel, without models or index files;
+        # search_frames itself runs, so its per-reel aggregation is counted too.
+        def dense(query, k=10, reel_ids=None):
+            return [{"reel_id": reel.id} for reel in self.reels if reel_ids is None or reel.id in reel_ids][:k]
+
+        def frames(query, k=5, reel_ids=None):
+            return [
+                (float(number), {"reel_id": reel.id, "frame_id": reel.id, "timestamp": 1.0})
+                for number, reel in enumerate(reversed(self.reels))
+                if reel_ids is None or reel.id in reel_ids
+            ][:k]
+
+        for target, value in (
+            ("core.rag.retriever.semantic_search", dense),
+            ("core.rag.frame_retriever.frame_index_hits", frames),
+            ("core.rag.retriever.reel_index", ReelIndex()),
+            ("core.rag.rag_pipeline.location_index", LocationIndex()),
+        ):
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        location_gazetteer.invalidate()
+
+        # Build the resident BM25 indexes and gazetteer outside the counted blocks.
+        fused_search(self.QUERY, k=10)
+        _select_relevant_locations(self.QUERY, [])
+
+    def test_fused_search(self):
+        # Scope reel ids, then every candidate reel with its location in one query.
+        with self.assertNumQueries(2):
+            results = fused_search(self.QUERY, k=10)
+        self.assertEqual(len(results), 10)
+
+        with self.assertNumQueries(0):
+            [(reel.location.name, reel.location.district) for reel, _, _ in results]
+
+    def test_hybrid_search(self):
+        with self.assertNumQueries(2):
+            reels = hybrid_search(self.QUERY, k=10)
+        self.assertEqual(len(reels), 10)
+
+    def test_select_relevant_locations(self):
+        reels = hybrid_search(self.QUERY, k=10)
+        with self.assertNumQueries(1):
+            locations = _select_relevant_locations(self.QUERY, reels)
+        self.assertEqual(len(locations), len(self.locations))
+
+    def test_latest_reel_per_location(self):
+        with self.assertNumQueries(1):
+            latest = _latest_reel_per_location(self.locations)
+            [(reel.location.name, reel.location.district) for reel in latest.values()]
+        self.assertEqual(len(latest), len(self.locations))
+        # reels[0..5] are the newest reel of each location.
+        self.assertEqual({reel.id for reel in latest.values()}, {reel.id for reel in self.reels[:6]})
+
+
+class ReelIndexCatchUpTests(TestCase):
+    """Reels edited by another process (no post_save here) reach the resident BM25 index."""
+
+    def test_edit_without_signal_is_picked_up(self):
+        location = Location.objects.create(name="Munnar", district="Idukki", category="Hill station")
+        reel = ScrapedReel.objects.create(
+            short_code="edited", original_url="https://www.instagram.com/reel/edited/",
+            location=location, ai_summary="Tea gardens at sunrise", is_processed=True,
+        )
+        index = ReelIndex(check_interval=0)
+        self.assertEqual([reel_id for reel_id, _ in index.search("waterfall")], [])
+
+        ScrapedReel.objects.filter(id=reel.id).update(
+            ai_summary="Hidden waterfall below the tea gardens", updated_at=timezone.now() + timedelta(seconds=1)
+        )
+        self.assertEqual([reel_id for reel_id, _ in index.search("waterfall")], [reel.id])
+
+
+class EmbeddingCachePathTests(SimpleTestCase):
+
+    def test_path_does_not_depend_on_the_working_directory(self):
+        cache = EmbeddingCache()
+        self.assertTrue(os.path.isabs(cache.path))
+        with override_settings(RAG_EMBEDDING_CACHE_PATH=None):
+            self.assertEqual(cache.path, os.path.join(settings.BASE_DIR, "embedding_cache.sqlite3"))
+
+
+class _FakeSentenceTransformer:
+    """Stands in for sentence_transformers.SentenceTransformer; ONNX loads fail unless onnx_available."""
+
+    onnx_available = False
+
+    def __init__(self, model_name, device=None, backend="torch", model_kwargs=None):
+        if backend == "onnx" and not self.onnx_available:
+            raise ImportError("onnxruntime is not installed")
+
+
+class EmbeddingCacheKeyTests(SimpleTestCase):
+    """Cache keys name the backend a model actually loaded with, after any fallback."""
+
+    def setUp(self):
+        module = MagicMock(SentenceTransformer=_FakeSentenceTransformer)
+        patcher = patch.dict(sys.modules, {"sentence_transformers": module})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _key(self, backend, onnx_capable=True):
+        return cache_key("model", load_model("model", backend=backend, onnx_capable=onnx_capable))
+
+    @patch("core.rag.model_loader._quantize_dynamic", side_effect=lambda model: model)
+    def test_key_names_the_loaded_backend(self, quantize):
+        self.assertEqual(self._key("torch"), "model")
+        self.assertEqual(self._key("int8"), "model@int8")
+        with patch.object(_FakeSentenceTransformer, "onnx_available", True):
+            with override_settings(RAG_ONNX_MODEL_FILE=None):
+                self.assertEqual(self._key("onnx"), "model@onnx")
+            with override_settings(RAG_ONNX_MODEL_FILE="onnx/model_qint8_avx512_vnni.onnx"):
+                self.assertEqual(self._key("onnx"), "model@onnx:onnx/model_qint8_avx512_vnni.onnx")
+
+        # CLIP cannot run on ONNX Runtime and loads int8 instead.
+        with self.assertLogs("core.rag.model_loader", "WARNING"):
+            self.assertEqual(self._key("onnx", onnx_capable=False), "model@int8")
+
+    def test_onnx_fallback_is_keyed_as_torch(self):
+        with self.assertLogs("core.rag.model_loader", "WARNING") as logs:
+            self.assertEqual(self._key("onnx"), "model")
+        self.assertIn("ONNX backend unavailable", logs.output[0])
+
+    @patch("core.rag.model_loader._quantize_dynamic", side_effect=RuntimeError("no quantized engine"))
+    def test_int8_fallback_is_keyed_as_torch(self, quantize):
+        with self.assertLogs("core.rag.model_loader", "WARNING") as logs:
+            self.assertEqual(self._key("int8"), "model")
+        self.assertIn("int8 quantization failed", logs.output[0])
+
+
+@skipUnless(importlib.util.find_spec("sentence_transformers"), "sentence-transformers is not installed")
+class EmbedderBackendParityTests(SimpleTestCase):
+    """Every embedder backend stays within PARITY_MIN_COSINE of torch."""
+
+    TEXTS = [
+        "waterfall trek in idukki",
+        "quiet beach stay near varkala with cliff views",
+        "best time to visit munnar tea gardens",
+        "houseboat cruise on the alleppey backwaters",
+    ]
+
+    def _unit(self, vectors):
+        vectors = np.asarray(vectors, dtype="float32")
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def _assert_parity(self, model_name, onnx_capable):
+        try:
+            expected = self._unit(load_model(model_name, backend="torch").encode(self.TEXTS))
+        except OSError as e:
+            self.skipTest(f"{model_name} is not available offline ({e})")
+
+        for backend in ("onnx", "int8"):
+            with self.subTest(model=model_name, backend=backend):
+                model = load_model(model_name, backend=backend, onnx_capable=onnx_capable)
+                cosines = np.einsum("ij,ij->i", self._unit(model.encode(self.TEXTS)), expected)
+                self.assertGreaterEqual(float(cosines.mean()), PARITY_MIN_COSINE)
+
+    def test_text_embedder(self):
+        from core.rag import embedder
+
+        self._assert_parity(embedder.MODEL_NAME, onnx_capable=True)
+
+    def test_clip_text_embedder(self):
+        from core.rag import image_embedder
+
+        self._assert_parity(image_embedder.MODEL_NAME, onnx_capable=False)
+
+
+class ReelIndexLocationTests(TestCase):
+    """A renamed location's reels are found by the new name, here and in other processes."""
+
+    def setUp(self):
+        self.location = Location.objects.create(name="Kanthalloor", district="Idukki", category="Village")
+        self.reel = ScrapedReel.objects.create(
+            short_code="orchard", original_url="https://www.instagram.com/reel/orchard/",
+            location=self.location, ai_summary="Apple orchards in winter", is_processed=True,
+        )
+        # The signal handlers update this index; the other one only catches up from the database.
+        self.local = ReelIndex(check_interval=1e9)
+        self.other = ReelIndex(check_interval=0)
+        patcher = patch("core.rag.reel_index.reel_index", self.local)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for index in (self.local, self.other):
+            self.assertEqual(index.search("pazhathottam"), [])
+
+    def _found(self, index, query):
+        return [reel_id for reel_id, _ in index.search(query)]
+
+    def test_rename(self):
+        self.location.name = "Pazhathottam"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.location.save()
+        for index in (self.local, self.other):
+            self.assertEqual(self._found(index, "pazhathottam"), [self.reel.id])
+
+    def test_delete(self):
+        for index in (self.local, self.other):
+            self.assertEqual(self._found(index, "kanthalloor"), [self.reel.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.location.delete()
+        for index in (self.local, self.other):
+            self.assertEqual(self._found(index, "kanthalloor"), [])
+
+
+class AnswerCacheFingerprintTests(TestCase):
+    """An edit to a context reel or location made elsewhere (no signal here) misses the cache."""
+
+    QUERY = "waterfall trek in idukki"
+
+    def setUp(self):
+        self.location = Location.objects.create(name="Thommankuthu", district="Idukki", category="Waterfall")
+        self.reel = ScrapedReel.objects.create(
+            short_code="falls", original_url="https://www.instagram.com/reel/falls/",
+            location=self.location, ai_summary="Seven-step waterfall", is_processed=True,
+        )
+        self.cache = AnswerCache(max_entries=10, ttl=60)
+        self.cache.put(self.QUERY, [], [self.reel], [self.location], {"answer": "Go", "locations": []})
+
+    def _lookup(self):
+        # Retrieval loads the rows afresh for every query.
+        reel = ScrapedReel.objects.get(id=self.reel.id)
+        location = Location.objects.get(id=self.location.id)
+        return self.cache.get(self.QUERY, [], [reel], [location])
+
+    def test_unchanged_context_hits(self):
+        self.assertEqual(self._lookup(), {"answer": "Go", "locations": []})
+
+    def test_reel_edit_misses(self):
+        ScrapedReel.objects.filter(id=self.reel.id).update(
+            ai_summary="Closed for the monsoon", updated_at=self.reel.updated_at + timedelta(seconds=1)
+        )
+        self.assertIsNone(self._lookup())
+
+    def test_location_edit_misses(self):
+        Location.objects.filter(id=self.location.id).update(
+            name="Thommankuthu Falls", last_updated=self.location.last_updated + timedelta(seconds=1)
+        )
+        self.assertIsNone(self._lookup())
+
+
+class RagServerRoutingTests(SimpleTestCase):
+    """Only query embeddings go to the shared daemon; document batches stay in process."""
+
+    def setUp(self):
+        self.remote = MagicMock(side_effect=lambda model, texts: np.ones((len(texts), 4), dtype="float32"))
+        model = MagicMock(embedding_backend="torch")
+        model.encode.side_effect = lambda texts, **kwargs: np.zeros((len(texts), 4), dtype="float32")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        for patcher in (
+            patch("core.rag.embedder.rag_client.embed", self.remote),
+            patch("core.rag.embedder.get_model", return_value=model),
+            patch("core.rag.embedder.embedding_cache", EmbeddingCache(os.path.join(directory.name, "cache.sqlite3"))),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @override_settings(RAG_EMBED_BATCHING=False)
+    def test_query_uses_the_daemon(self):
+        self.assertEqual(embedder.embed_text("waterfalls").tolist(), [1.0] * 4)
+        self.remote.assert_called_once_with("text", ["waterfalls"])
+
+    def test_documents_stay_in_process(self):
+        vectors = embedder.embed_documents([f"document {number}" for number in range(100)])
+        self.assertEqual(vectors.shape, (100, 4))
+        self.assertFalse(vectors.any())
+        self.remote.assert_not_called()
+
+
+class ChatStreamTests(SimpleTestCase):
+    """/api/chat/stream/ sends each event as it is produced, under WSGI and ASGI."""
+
+    def setUp(self):
+        def stream_rag(query, history):
+            yield {"type": "token", "text": "Try "}
+            yield {"type": "token", "text": "Thommankuthu."}
+            yield {"type": "done", "answer": "Try Thommankuthu.", "locations": [], "reels": []}
+
+        patcher = patch("core.views.stream_rag", stream_rag)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_iterate_in_thread_yields_before_the_generator_finishes(self):
+        first_sent = threading.Event()
+
+        def events():
+            yield "first"
+            # Blocks until the consumer has the first item; a buffering consumer never gets it.
+            if not first_sent.wait(timeout=5):
+                raise AssertionError("the first item was held back")
+            yield "second"
+
+        async def consume():
+            received = []
+            async for item in iterate_in_thread(events()):
+                received.append(item)
+                first_sent.set()
+            return received
+
+        self.assertEqual(asyncio.run(consume()), ["first", "second"])
+
+    def test_wsgi(self):
+        response = self.client.post("/api/chat/stream/", {"message": "waterfalls"}, content_type="application/json")
+        self.assertFalse(response.is_async)
+        events = b"".join(response.streaming_content).decode()
+        self.assertEqual(events.count("event: token"), 2)
+        self.assertIn("event: done", events)
+
+    async def test_asgi(self):
+        response = await AsyncClient().post(
+            "/api/chat/stream/", {"message": "waterfalls"}, content_type="application/json"
+        )
+        self.assertTrue(response.is_async)
+        events = "".join([part.decode() async for part in response.streaming_content])
+        self.assertEqual(events.count("event: token"), 2)
+        self.assertIn("event: done", events)
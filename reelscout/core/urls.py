@@ -1,6 +1,6 @@
 from django.urls import path
 from .views import home, search_reel, save_comments_from_browser, location_detail, LocationListAPI, LocationDetailAPI, add_location_note, update_nearby_places
-from .views import chat
+from .views import chat, chat_async, chat_stream, rag_stats
 
 urlpatterns = [
     path('', home, name='home'),
@@ -12,4 +12,7 @@ urlpatterns = [
     path('api/locations/<slug:slug>/notes/', add_location_note, name='api-location-note-add'),
     path('api/locations/<slug:slug>/nearby-places/', update_nearby_places, name='api-location-nearby-places-update'),
     path("api/chat/", chat),
+    path("api/chat/stream/", chat_stream),
+    path("api/chat/async/", chat_async),
+    path("api/rag/stats/", rag_stats),
 ]
@@ -1,13 +1,23 @@
 # views.py
+import json
 import re
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
-from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, renderer_classes
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.response import Response
 from .services import get_or_process_reel
+from .comment_utils import build_normalized_comments
 from .models import ScrapedReel, Location, LocationRevision
 from rest_framework import generics
 from .serializers import LocationSerializer
-from core.rag.rag_pipeline import run_rag
+from core.rag.rag_pipeline import arun_rag, run_rag, stream_rag
+from core.rag.answer_cache import answer_cache
+from core.rag.async_utils import iterate_in_thread
+from core.rag.embedding_cache import embedding_cache
+from core.rag.query_cache import query_embeddings
 
 
 def home(request):
@@ -310,6 +320,7 @@ def save_comments_from_browser(request):
 
         reel = ScrapedReel.objects.get(short_code=short_code)
         reel.comments_dump = clean_and_rank_comments(raw_comments)
+        reel.normalized_comments = build_normalized_comments(reel.comments_dump)
         reel.save()
 
         return Response({
@@ -398,6 +409,31 @@ def add_location_note(request, slug):
 # CHATBOT ENDPOINT
 # -------------------------------
 
+def _location_cards(query, locations, reels):
+    reel_data = []
+
+    if _should_show_location_cards(query):
+        # Only show cards for recommendation-style requests.
+        for loc in locations[:5]:
+
+            for reel in reels:
+
+                if reel.location and reel.location.name == loc.get("name"):
+
+                    reel_data.append({
+                        "location": reel.location.name,
+                        "district": reel.location.district,
+                        "summary": reel.ai_summary,
+                        "short_code": reel.short_code,
+                        "lat": reel.location.latitude,
+                        "lng": reel.location.longitude
+                    })
+
+                    break
+
+    return reel_data
+
+
 @api_view(["POST"])
 @authentication_classes([])
 @permission_classes([])
@@ -411,33 +447,133 @@ def chat(request):
 
     result = run_rag(query, history)
 
-    reels = result["reels"]
     recommended_locations = result["locations"]
-    show_cards = _should_show_location_cards(query)
 
-    reel_data = []
+    return Response({
+        "answer": result["answer"],
+        "locations": recommended_locations,
+        "results": _location_cards(query, recommended_locations, result["reels"])
+    })
 
-    if show_cards:
-        # Only show cards for recommendation-style requests.
-        for loc in recommended_locations[:5]:
 
-            for reel in reels:
+async def chat_async(request):
+    """
+    /api/chat/ as a native async view for ASGI servers (asgi.py): retrieval
+    legs run concurrently and the Groq call is awaited, so a worker is not
+    tied up per chat session. Same request and response as /api/chat/.
+    """
 
-                if reel.location and reel.location.name == loc.get("name"):
+    if request.method != "POST":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
 
-                    reel_data.append({
-                        "location": reel.location.name,
-                        "district": reel.location.district,
-                        "summary": reel.ai_summary,
-                        "short_code": reel.short_code,
-                        "lat": reel.location.latitude,
-                        "lng": reel.location.longitude
-                    })
+    try:
+        payload = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
 
-                    break
+    query = payload.get("message")
+    history = payload.get("history", [])
 
-    return Response({
+    if not query:
+        return JsonResponse({"error": "Message required"}, status=400)
+
+    result = await arun_rag(query, history)
+
+    recommended_locations = result["locations"]
+
+    return JsonResponse({
         "answer": result["answer"],
         "locations": recommended_locations,
-        "results": reel_data
+        "results": _location_cards(query, recommended_locations, result["reels"])
+    })
+
+
+# DRF's api_view cannot wrap coroutines; exempt the plain view from CSRF like the
+# other chat endpoints (set directly, the csrf_exempt decorator is sync-only before Django 5).
+chat_async.csrf_exempt = True
+
+
+class EventStreamRenderer(BaseRenderer):
+    # Lets clients that send "Accept: text/event-stream" through DRF's
+    # content negotiation; errors before the stream starts are still JSON.
+    media_type = "text/event-stream"
+    format = "event-stream"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder).encode("utf-8")
+
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, cls=DjangoJSONEncoder)}\n\n"
+
+
+def _chat_events(query, history):
+    for event in stream_rag(query, history):
+        if event["type"] == "context":
+            # Retrieval candidates, sent before the LLM is called; the final
+            # recommendations in "done" replace them.
+            locations = [
+                {"name": loc.name, "district": loc.district or ""}
+                for loc in event["locations"][:5]
+            ]
+            yield _sse("context", {
+                "locations": locations,
+                "results": _location_cards(query, locations, event["reels"]),
+            })
+        elif event["type"] == "token":
+            yield _sse("token", {"text": event["text"]})
+        else:
+            # Same payload as /api/chat/; "answer" is authoritative over the streamed tokens.
+            yield _sse("done", {
+                "answer": event["answer"],
+                "locations": event["locations"],
+                "results": _location_cards(query, event["locations"], event["reels"]),
+            })
+
+
+@api_view(["POST"])
+@authentication_classes([])
+@permission_classes([])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def chat_stream(request):
+    """
+    /api/chat/ over Server-Sent Events: a "context" event with the retrieved
+    locations and cards, "token" events with the answer as it is generated,
+    then a "done" event with the final answer and recommended_locations.
+    Under ASGI the events are produced on a worker thread and handed over as
+    an async iterator, which Django streams instead of buffering.
+    """
+
+    query = request.data.get("message")
+    history = request.data.get("history", [])
+
+    if not query:
+        return Response({"error": "Message required"}, status=400)
+
+    events = _chat_events(query, history)
+    if isinstance(request._request, ASGIRequest):
+        events = iterate_in_thread(events)
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream.
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@api_view(["GET"])
+@authentication_classes([])
+@permission_classes([])
+def rag_stats(request):
+
+    from core.rag.embedder import text_batcher
+    from core.rag.image_embedder import image_text_batcher
+
+    return Response({
+        "query_embeddings": query_embeddings.stats(),
+        "document_embeddings": embedding_cache.stats(),
+        "answers": answer_cache.stats(),
+        "embedding_batches": {
+            "text": text_batcher.stats(),
+            "clip_text": image_text_batcher.stats(),
+        },
     })
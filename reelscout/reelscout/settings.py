@@ -142,6 +142,58 @@ MEDIA_ROOT = BASE_DIR / 'reel'
 
 APIFY_TOKEN = os.getenv("APIFY_TOKEN")
 
+# RAG index writes are logged to a write-ahead log and folded into the FAISS files in batches
+RAG_INDEX_FLUSH_BATCH = int(os.getenv("RAG_INDEX_FLUSH_BATCH", "16"))
+RAG_INDEX_FLUSH_MAX_DELAY = float(os.getenv("RAG_INDEX_FLUSH_MAX_DELAY", "30"))
+
+# Document/frame embeddings are cached by content hash; least recently used entries are evicted past this size
+RAG_EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("RAG_EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+# Absolute, so web workers, the RAG server and management commands share one cache file
+RAG_EMBEDDING_CACHE_PATH = os.getenv("RAG_EMBEDDING_CACHE_PATH") or str(BASE_DIR / "embedding_cache.sqlite3")
+
+# Query embeddings kept in memory per process (LRU), shared by the text and frame retrievers
+RAG_QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "1024"))
+
+# Index backend used by full rebuilds: auto, flat, flat_ip, hnsw, fp16, sq8 or ivfpq (see core/rag/index_factory.py).
+# RAG_FRAME_INDEX_BACKEND overrides it for the CLIP frame index.
+RAG_INDEX_BACKEND = os.getenv("RAG_INDEX_BACKEND", "auto")
+RAG_FRAME_INDEX_BACKEND = os.getenv("RAG_FRAME_INDEX_BACKEND") or None
+RAG_HNSW_MIN_VECTORS = int(os.getenv("RAG_HNSW_MIN_VECTORS", "50000"))
+RAG_IVFPQ_MIN_VECTORS = int(os.getenv("RAG_IVFPQ_MIN_VECTORS", "1000000"))
+RAG_HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "64"))
+RAG_IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "16"))
+# Quantized backends (fp16, sq8, ivfpq) fetch k * this many candidates and re-rank them with float32 vectors
+RAG_RERANK_FACTOR = int(os.getenv("RAG_RERANK_FACTOR", "4"))
+
+# Text index granularity: "document" (one vector per reel) or "chunked" (one per section / transcript window,
+# max-pooled per reel at query time). Changing it requires rebuild_rag_index.
+RAG_TEXT_INDEX_MODE = os.getenv("RAG_TEXT_INDEX_MODE", "document")
+RAG_MAX_CHUNKS_PER_REEL = int(os.getenv("RAG_MAX_CHUNKS_PER_REEL", "16"))
+
+# CPU inference backend for the MiniLM and CLIP embedders: torch, onnx or int8 (see core/rag/model_loader.py).
+# onnx needs onnxruntime; RAG_ONNX_MODEL_FILE selects a prebuilt export such as onnx/model_qint8_avx512_vnni.onnx
+RAG_EMBEDDING_BACKEND = os.getenv("RAG_EMBEDDING_BACKEND", "torch")
+RAG_ONNX_MODEL_FILE = os.getenv("RAG_ONNX_MODEL_FILE") or None
+
+# Generated chat answers reused for the same query and retrieved context (per process, LRU + TTL).
+# RAG_ANSWER_CACHE_SIMILARITY > 0 also reuses answers for paraphrases at or above that cosine similarity.
+RAG_ANSWER_CACHE_SIZE = int(os.getenv("RAG_ANSWER_CACHE_SIZE", "512"))
+RAG_ANSWER_CACHE_TTL = float(os.getenv("RAG_ANSWER_CACHE_TTL", "3600"))
+RAG_ANSWER_CACHE_SIMILARITY = float(os.getenv("RAG_ANSWER_CACHE_SIMILARITY", "0"))
+
+# Concurrent query embeddings are collected for up to RAG_EMBED_MAX_WAIT_MS and encoded as one batch
+RAG_EMBED_BATCHING = os.getenv("RAG_EMBED_BATCHING", "1").lower() in ("1", "true", "yes")
+RAG_EMBED_MAX_BATCH = int(os.getenv("RAG_EMBED_MAX_BATCH", "32"))
+RAG_EMBED_MAX_WAIT_MS = float(os.getenv("RAG_EMBED_MAX_WAIT_MS", "3"))
+
+# Shared embedding/search daemon (manage.py run_rag_server), e.g. http://127.0.0.1:8765. Unset: every worker loads
+# its own models and indexes. Workers fall back to in-process search whenever the server is unreachable.
+RAG_SERVER_URL = os.getenv("RAG_SERVER_URL") or None
+RAG_SERVER_TIMEOUT = float(os.getenv("RAG_SERVER_TIMEOUT", "2"))
+
+# Load embedding models, indexes and the Groq client when the WSGI/ASGI app starts instead of on the first request
+RAG_WARMUP = os.getenv("RAG_WARMUP", "0").lower() in ("1", "true", "yes")
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:8080",
     "http://127.0.0.1:8080",